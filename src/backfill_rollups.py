@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Script para recalcular os agregados diários do dashboard (novos usuários,
+portais, reviews, explorações e curtidas) e a série diária de engajamento
+de cada portal a partir do histórico completo
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import app
+from src.utils.rollups import rebuild_rollups, get_totals
+from src.utils.portal_series import rebuild_portal_series
+
+def main():
+    """Executa o backfill e mostra os totais resultantes"""
+    with app.app_context():
+        rows = rebuild_rollups()
+        totals = get_totals()
+        series_rows = rebuild_portal_series()
+
+    for metric, total in totals.items():
+        print(f"📊 {metric}: {total}")
+    print(f"✅ Backfill concluído: {rows} linha(s) diária(s) no dashboard, {series_rows} na série por portal")
+
+if __name__ == "__main__":
+    main()
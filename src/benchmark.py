@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Benchmark das rotas da API: vazão e latência (p50/p95/p99) por rota.
+
+Cada rota de ENDPOINTS é chamada com parâmetros sorteados do próprio banco
+(portais, usuários, termos de busca), sempre os mesmos para a mesma semente,
+em dois modos:
+
+- ``inprocess``: cliente de testes do Flask, sem rede; mede o custo do app
+  (rotas, ORM, serialização);
+- ``http``: requisições reais com conexões em paralelo contra
+  ``src/serve.py`` (iniciado pelo script numa porta livre) ou contra um
+  servidor já rodando (``--url``).
+
+Os dados vêm de ``src/utils/dataset.py``: sem ``--database``, um banco
+temporário é gerado na escala pedida; com ``--database``, o benchmark roda
+numa cópia (as rotas gravam visualizações, eventos e curtidas), ou no
+próprio arquivo com ``--in-place``.
+
+O resultado é um JSON (``--output``) com o commit, o ambiente, o tamanho dos
+dados e as medidas de cada rota; ``--compare`` mostra a diferença para um
+resultado anterior e, com ``--max-regression``, termina com erro (código 1)
+se o p95 de alguma rota piorar mais que o limite.
+
+Uso:
+    python src/benchmark.py --scale small --output bench.json
+    python src/benchmark.py --database /tmp/medium.db --mode http --concurrency 16
+    python src/benchmark.py --compare bench.json --max-regression 20
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import signal
+import socket
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_VERSION = 1
+
+# (nome, método, url, corpo, autenticação); os campos entre chaves vêm de _request_params.
+# Autenticação: None, 'user' (usuário sorteado) ou 'creator' (criador do portal sorteado)
+ENDPOINTS = [
+    ('health', 'GET', '/api/health', None, None),
+    ('portals.list', 'GET', '/api/portals?page={page}', None, None),
+    ('portals.list_category', 'GET', '/api/portals?category_id={category_id}', None, None),
+    ('portals.detail', 'GET', '/api/portals/{portal_id}', None, None),
+    ('portals.nearby', 'GET', '/api/portals/nearby?lat={latitude}&lng={longitude}&radius=5', None, None),
+    ('portals.clusters', 'GET', '/api/portals/clusters?bbox={west},{south},{east},{north}&zoom={zoom}',
+     None, None),
+    ('reviews.list', 'GET', '/api/portals/{portal_id}/reviews', None, None),
+    ('search.all', 'GET', '/api/search?q={term}', None, None),
+    ('search.portals', 'GET', '/api/search?q={term}&type=portals', None, None),
+    ('search.suggestions', 'GET', '/api/search/suggestions?q={prefix}', None, None),
+    ('tags', 'GET', '/api/tags', None, None),
+    ('categories', 'GET', '/api/categories', None, None),
+    ('users.detail', 'GET', '/api/users/{user_id}', None, None),
+    ('explorations.list', 'GET', '/api/explorations', None, 'user'),
+    ('analytics.dashboard', 'GET', '/api/analytics/dashboard', None, 'user'),
+    ('analytics.trending', 'GET', '/api/analytics/trending', None, None),
+    ('analytics.portal', 'GET', '/api/analytics/portal/{portal_id}', None, 'creator'),
+    ('analytics.user', 'GET', '/api/analytics/user/{user_id}', None, 'user'),
+    ('analytics.track', 'POST', '/api/analytics/track', {'event_type': 'portal_view', 'portal_id': '{portal_id}'},
+     None),
+    ('portals.like', 'POST', '/api/portals/{portal_id}/like', None, 'user'),
+]
+
+# Amostra de ids lidos do banco para montar as requisições
+SAMPLE_SIZE = 5000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das rotas da API')
+    parser.add_argument('--scale', default='small', help='escala do banco gerado, sem --database (padrão small)')
+    parser.add_argument('--database', help='banco já gerado (src/generate_dataset.py)')
+    parser.add_argument('--in-place', action='store_true', help='usa o banco informado em vez de uma cópia')
+    parser.add_argument('--mode', choices=('inprocess', 'http', 'both'), default='both')
+    parser.add_argument('--url', help='servidor já rodando (modo http), ex.: http://127.0.0.1:5000')
+    parser.add_argument('--requests', type=int, default=200, help='requisições medidas por rota (padrão 200)')
+    parser.add_argument('--warmup', type=int, default=20, help='requisições de aquecimento por rota (padrão 20)')
+    parser.add_argument('--concurrency', type=int, default=8, help='conexões em paralelo no modo http (padrão 8)')
+    parser.add_argument('--workers', type=int, default=2, help='workers do servidor iniciado (padrão 2)')
+    parser.add_argument('--endpoints', help='só as rotas cujo nome contém um destes textos (separados por vírgula)')
+    parser.add_argument('--seed', type=int, default=42, help='semente dos dados e das requisições (padrão 42)')
+    parser.add_argument('--output', help='arquivo JSON com os resultados')
+    parser.add_argument('--compare', help='resultado anterior (JSON) para comparação')
+    parser.add_argument('--max-regression', type=float,
+                        help='piora máxima do p95 em %% em relação a --compare (erro se passar)')
+    return parser.parse_args(argv)
+
+
+def _prepare_database(args):
+    """Banco em um diretório temporário (gerado ou copiado) e o ambiente do app"""
+    workdir = tempfile.mkdtemp(prefix='benchmark-')
+    if args.database and args.in_place:
+        path = os.path.abspath(args.database)
+    else:
+        path = os.path.join(workdir, 'app.db')
+        if args.database:
+            shutil.copy(args.database, path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['AUTH_MODE'] = 'mock'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    return workdir
+
+
+def percentile(values, fraction):
+    """Percentil por posição mais próxima (``values`` ordenado)"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def summarize(latencies, errors, statuses, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': count,
+        'errors': errors,
+        'status_codes': {str(code): n for code, n in sorted(statuses.items())},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(count / elapsed, 1) if elapsed > 0 else None,
+        'latency_ms': {
+            'mean': to_ms(sum(latencies) / count) if count else None,
+            'min': to_ms(latencies[0]) if count else None,
+            'p50': to_ms(percentile(latencies, 0.50)),
+            'p95': to_ms(percentile(latencies, 0.95)),
+            'p99': to_ms(percentile(latencies, 0.99)),
+            'max': to_ms(latencies[-1]) if count else None,
+        },
+    }
+
+
+def _request_params(db):
+    """Ids e coordenadas reais do banco, na ordem dos ids (determinístico)"""
+    from sqlalchemy import text
+    from src.utils.dataset import TITLE_WORDS
+
+    portals = db.session.execute(text(
+        "SELECT id, category_id, latitude, longitude, creator_id FROM portals "
+        "WHERE is_public = 1 AND is_active = 1 AND latitude IS NOT NULL ORDER BY id LIMIT :limit"
+    ), {'limit': SAMPLE_SIZE}).all()
+    users = db.session.execute(text(
+        "SELECT id FROM users WHERE portals_count > 0 ORDER BY id LIMIT :limit"
+    ), {'limit': SAMPLE_SIZE}).scalars().all()
+    if not portals or not users:
+        raise RuntimeError('Banco sem portais públicos ou criadores; gere os dados com src/generate_dataset.py')
+    total_portals = db.session.execute(text("SELECT COUNT(*) FROM portals")).scalar()
+    return {
+        'portals': portals, 'users': users,
+        'pages': max(1, min(total_portals // 20, 50)),
+        'terms': [word.lower() for word in TITLE_WORDS],
+    }
+
+
+def _fill(value, params):
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in params:
+            return params[value[1:-1]]
+        return value.format(**params)
+    if isinstance(value, dict):
+        return {key: _fill(item, params) for key, item in value.items()}
+    return value
+
+
+def build_plan(endpoint, count, sample, seed):
+    """
+    Lista de (método, caminho, corpo, cabeçalhos) de uma rota; a mesma para
+    a mesma semente, usada pelos dois modos
+    """
+    name, method, url, body, auth = endpoint
+    rng = random.Random(f'{seed}:{name}')
+    # Curtidas: cada par (usuário, portal) uma vez só, para não disputar o mesmo toggle
+    pairs = set()
+    plan = []
+    while len(plan) < count:
+        portal_id, category_id, latitude, longitude, creator_id = rng.choice(sample['portals'])
+        user_id = rng.choice(sample['users'])
+        if name == 'portals.like':
+            if (user_id, portal_id) in pairs and len(pairs) < len(sample['users']) * len(sample['portals']):
+                continue
+            pairs.add((user_id, portal_id))
+        term = rng.choice(sample['terms'])
+        zoom = rng.choice((4, 8, 12))
+        span = 180 / 2 ** zoom
+        params = {
+            'portal_id': portal_id, 'category_id': category_id or 0, 'user_id': user_id,
+            'latitude': round(latitude, 5), 'longitude': round(longitude, 5),
+            'south': round(latitude - span, 5), 'north': round(latitude + span, 5),
+            'west': round(longitude - span, 5), 'east': round(longitude + span, 5), 'zoom': zoom,
+            'page': rng.randint(1, sample['pages']), 'term': term, 'prefix': term[:rng.randint(2, 3)],
+        }
+        headers = {}
+        if auth:
+            headers['Authorization'] = f"Bearer {creator_id if auth == 'creator' else user_id}"
+        # Termos com acento vão codificados na URL (o modo http envia só ASCII)
+        path = quote(_fill(url, params), safe="/?&=,:-.")
+        plan.append((method, path, _fill(body, params), headers))
+    return plan
+
+
+def run_inprocess(app, plan, warmup):
+    """Requisições em sequência pelo cliente de testes do Flask"""
+    client = app.test_client()
+    latencies, statuses, errors = [], {}, 0
+    for method, path, body, headers in plan[:warmup]:
+        client.open(path, method=method, json=body, headers=headers).get_data()
+
+    started = time.perf_counter()
+    for method, path, body, headers in plan[warmup:]:
+        before = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        latencies.append(time.perf_counter() - before)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        errors += response.status_code >= 400
+    return summarize(latencies, errors, statuses, time.perf_counter() - started)
+
+
+def _http_call(connection, method, path, body, headers):
+    payload = json.dumps(body).encode() if body is not None else None
+    headers = dict(headers, **({'Content-Type': 'application/json'} if payload is not None else {}))
+    for attempt in (1, 2):
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (ConnectionError, http.client.HTTPException):
+            # Conexão fechada pelo servidor (fim do keep-alive ou worker reciclado)
+            connection.close()
+            if attempt == 2:
+                raise
+
+
+def run_http(base_url, plan, warmup, concurrency):
+    """Requisições em ``concurrency`` conexões paralelas, cada uma com keep-alive"""
+    parts = urlsplit(base_url)
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+    errors = [0]
+
+    def consume(requests, record):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        try:
+            while True:
+                with lock:
+                    if not requests:
+                        return
+                    method, path, body, headers = requests.pop()
+                before = time.perf_counter()
+                try:
+                    status = _http_call(connection, method, path, body, headers)
+                except Exception:
+                    status = None
+                elapsed = time.perf_counter() - before
+                if record:
+                    with lock:
+                        if status is None or status >= 400:
+                            errors[0] += 1
+                        if status is not None:
+                            latencies.append(elapsed)
+                            statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            connection.close()
+
+    def run(requests, record):
+        # Lista invertida: pop() do fim mantém a ordem do plano
+        requests = list(reversed(requests))
+        threads = [threading.Thread(target=consume, args=(requests, record)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    run(plan[:warmup], record=False)
+    started = time.perf_counter()
+    run(plan[warmup:], record=True)
+    return summarize(latencies, errors[0], statuses, time.perf_counter() - started)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, workdir):
+    """Inicia ``src/serve.py`` numa porta livre e espera o /api/health responder"""
+    port = _free_port()
+    env = dict(os.environ, HOST='127.0.0.1', PORT=str(port), WEB_CONCURRENCY=str(workers),
+               SERVE_MAX_REQUESTS='0', METRICS_DIR=os.path.join(workdir, 'metrics'))
+    log = open(os.path.join(workdir, 'serve.log'), 'wb')
+    process = subprocess.Popen([sys.executable, '-m', 'src.serve'], cwd=PROJECT_DIR, env=env,
+                               stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"O servidor terminou ao iniciar; veja {os.path.join(workdir, 'serve.log')}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                connection.close()
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError('O servidor não respondeu em 60s')
+
+
+def stop_server(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=PROJECT_DIR, capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def environment():
+    """Commit e máquina em que o benchmark rodou"""
+    return {
+        'commit': _git('rev-parse', 'HEAD') or None,
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def dataset_size(db):
+    from sqlalchemy import text
+    tables = ('users', 'portals', 'reviews', 'user_portal_likes', 'user_portal_favorites', 'user_follows',
+              'explorations')
+    return {table: db.session.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar() for table in tables}
+
+
+def compare(results, baseline, max_regression=None):
+    """Mostra p50/p95 contra o resultado anterior; retorna as rotas que pioraram além do limite"""
+    previous = {(item['endpoint'], item['mode']): item for item in baseline.get('results', [])}
+    regressions = []
+    commit = (baseline.get('environment') or {}).get('commit') or '?'
+    print(f"\n📐 Comparação com {commit[:12]}")
+    for item in results:
+        before = previous.get((item['endpoint'], item['mode']))
+        if before is None:
+            continue
+        old, new = before['latency_ms'], item['latency_ms']
+        if not old.get('p95') or new.get('p95') is None:
+            continue
+        change = (new['p95'] - old['p95']) / old['p95'] * 100
+        regressed = max_regression is not None and change > max_regression
+        status = '❌' if regressed else ('🟢' if change < 0 else '⚪')
+        print(f"{status} {item['mode']:9} {item['endpoint']:24} p50 {old['p50']:8.2f} -> {new['p50']:8.2f} ms   "
+              f"p95 {old['p95']:8.2f} -> {new['p95']:8.2f} ms ({change:+.1f}%)")
+        if regressed:
+            regressions.append(item['endpoint'])
+    return regressions
+
+
+def _print_result(item):
+    latency = item['latency_ms']
+    status = '❌' if item['errors'] else '✅'
+    if not item['requests']:
+        print(f"{status} {item['mode']:9} {item['endpoint']:24} nenhuma resposta ({item['errors']} erro(s))")
+        return
+    print(f"{status} {item['mode']:9} {item['endpoint']:24} {item['throughput_rps']:9.1f} req/s   "
+          f"p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  p99 {latency['p99']:8.2f} ms"
+          + (f"   {item['errors']} erro(s)" if item['errors'] else ''))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.url and args.mode != 'http':
+        args.mode = 'http'
+    workdir = _prepare_database(args)
+
+    from src.main import app
+    from src.models.user import db
+    from src.utils.dataset import generate_dataset
+    from src.utils.events import event_pipeline
+    from src.utils.views import view_counter
+    from src.utils.database import dispose_engines
+
+    modes = ('inprocess', 'http') if args.mode == 'both' else (args.mode,)
+    endpoints = ENDPOINTS
+    if args.endpoints:
+        wanted = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+        endpoints = [endpoint for endpoint in ENDPOINTS if any(name in endpoint[0] for name in wanted)]
+
+    server = None
+    results = []
+    try:
+        with app.app_context():
+            if not args.database:
+                print(f"📦 Gerando dados (escala {args.scale})...")
+                generate_dataset(args.scale, seed=args.seed)
+            sample = _request_params(db)
+            size = dataset_size(db)
+            db.session.remove()
+        print(f"📊 Dados: {', '.join(f'{n:,} {table}' for table, n in size.items())}")
+
+        plans = {
+            endpoint[0]: build_plan(endpoint, args.warmup + args.requests, sample, args.seed)
+            for endpoint in endpoints
+        }
+        for mode in modes:
+            base_url = None
+            if mode == 'http':
+                base_url = args.url
+                if base_url is None:
+                    # Gravações pendentes do modo anterior antes de outro processo abrir o banco
+                    event_pipeline.flush()
+                    view_counter.flush()
+                    server, base_url = start_server(args.workers, workdir)
+            for endpoint in endpoints:
+                name = endpoint[0]
+                if mode == 'inprocess':
+                    measured = run_inprocess(app, plans[name], args.warmup)
+                else:
+                    measured = run_http(base_url, plans[name], args.warmup, args.concurrency)
+                item = {'endpoint': name, 'mode': mode, 'method': endpoint[1], **measured}
+                _print_result(item)
+                results.append(item)
+            if server is not None:
+                stop_server(server)
+                server = None
+    finally:
+        if server is not None:
+            stop_server(server)
+        event_pipeline.flush()
+        view_counter.flush()
+        with app.app_context():
+            dispose_engines(db)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'version': RESULTS_VERSION,
+        'timestamp': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        'environment': environment(),
+        'config': {
+            'scale': None if args.database else args.scale, 'database': args.database, 'seed': args.seed,
+            'requests': args.requests, 'warmup': args.warmup, 'concurrency': args.concurrency,
+            'workers': None if args.url else args.workers, 'url': args.url,
+            'response_cache': os.environ.get('RESPONSE_CACHE_BACKEND', 'memory'),
+        },
+        'dataset': size,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados em {args.output}")
+
+    failed = [item['endpoint'] for item in results if item['errors']]
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"❌ p95 piorou mais de {args.max_regression:g}% em: {', '.join(sorted(set(regressions)))}")
+            return 1
+    if failed:
+        print(f"❌ Rotas com erros: {', '.join(sorted(set(failed)))}")
+        return 1
+    print("✅ Benchmark concluído")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Script que verifica o número de queries de cada rota da API.
+
+Cria um banco temporário com o gerador de dados (``src/utils/dataset.py``),
+chama todas as rotas registradas em ``/api`` com o cliente de testes do Flask
+e conta os comandos SQL de cada uma. O script termina com erro (código 1) se:
+
+- uma rota passar do orçamento declarado em ROUTES;
+- uma listagem executar mais queries com uma página maior (N+1), caso em
+  que o comando repetido e o atributo do ORM que o disparou são mostrados;
+- uma rota registrada no app não estiver em ROUTES (toda rota nova precisa
+  declarar o seu orçamento).
+
+O cache de respostas fica desligado (um hit esconderia as queries) e a
+autenticação em modo mock.
+
+Uso: python src/check_query_budget.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+# Tamanhos de página comparados na verificação de N+1
+SCALING_SIZES = (2, 10)
+
+# (endpoint, método, url, corpo, orçamento, parâmetro de página, chave salva da resposta)
+# As URLs e corpos são formatados com os valores do banco gerado e com as
+# chaves salvas das rotas anteriores (ex.: o portal criado por POST /portals).
+ROUTES = [
+    ('health.health_check', 'GET', '/api/health', None, 0, None, None),
+    ('health.cache_stats', 'GET', '/api/health/cache', None, 0, None, None),
+    ('health.events_stats', 'GET', '/api/health/events', None, 0, None, None),
+    ('health.trending_stats', 'GET', '/api/health/trending', None, 0, None, None),
+    ('health.auth_stats', 'GET', '/api/health/auth', None, 0, None, None),
+    ('health.logging_stats', 'GET', '/api/health/logging', None, 0, None, None),
+    ('health.prometheus_metrics', 'GET', '/api/metrics', None, 0, None, None),
+    ('portals.get_portals', 'GET', '/api/portals', None, 8, 'per_page', None),
+    ('portals.get_portals', 'GET', '/api/portals?category_id={category_id}', None, 8, 'per_page', None),
+    ('portals.get_nearby_portals', 'GET', '/api/portals/nearby?lat={latitude}&lng={longitude}&radius=50',
+     None, 8, 'limit', None),
+    ('portals.get_portal_clusters', 'GET', '/api/portals/clusters?bbox={west},{south},{east},{north}&zoom=10',
+     None, 2, None, None),
+    ('portals.get_portal', 'GET', '/api/portals/{portal_id}', None, 6, None, None),
+    ('reviews.get_reviews_for_portal', 'GET', '/api/portals/{portal_id}/reviews', None, 4, 'per_page', None),
+    ('explorations.get_explorations', 'GET', '/api/explorations', None, 4, 'per_page', None),
+    ('users.get_user', 'GET', '/api/users/{user_id}', None, 2, None, None),
+    ('categories.get_categories', 'GET', '/api/categories', None, 2, None, None),
+    ('categories.get_category', 'GET', '/api/categories/{category_id}', None, 2, None, None),
+    ('search.search', 'GET', '/api/search?q=luz', None, 16, None, None),
+    ('search.search', 'GET', '/api/search?q=luz&type=portals', None, 9, 'per_page', None),
+    ('search.search_suggestions', 'GET', '/api/search/suggestions?q=lu', None, 0, None, None),
+    ('search.get_tags', 'GET', '/api/tags', None, 2, 'limit', None),
+    ('analytics.get_dashboard_analytics', 'GET', '/api/analytics/dashboard', None, 8, None, None),
+    ('analytics.get_trending', 'GET', '/api/analytics/trending', None, 7, 'limit', None),
+    ('analytics.get_user_analytics', 'GET', '/api/analytics/user/{user_id}', None, 12, None, None),
+    ('analytics.get_portal_analytics', 'GET', '/api/analytics/portal/{portal_id}', None, 4, None, None),
+    ('analytics.track_event', 'POST', '/api/analytics/track',
+     {'event_type': 'portal_view', 'portal_id': '{portal_id}'}, 0, None, None),
+    ('users.create_user', 'POST', '/api/users',
+     {'firebase_uid': 'user_budget', 'name': 'Orçamento', 'email': 'budget@example.com'}, 4, None, None),
+    ('users.update_user', 'PUT', '/api/users/{user_id}', {'bio': 'Bio atualizada'}, 4, None, None),
+    ('users.follow_user', 'POST', '/api/users/{other_user_id}/follow', None, 8, None, None),
+    ('categories.create_category', 'POST', '/api/categories', {'name': 'Categoria Orçamento'}, 4, None,
+     ('new_category_id', 'category')),
+    ('categories.update_category', 'PUT', '/api/categories/{new_category_id}',
+     {'description': 'Atualizada'}, 5, None, None),
+    ('categories.delete_category', 'DELETE', '/api/categories/{new_category_id}', None, 5, None, None),
+    ('portals.create_portal', 'POST', '/api/portals',
+     {'title': 'Portal Orçamento', 'image_url': 'https://example.com/budget.jpg', 'category_id': '{category_id}',
+      'latitude': '{latitude}', 'longitude': '{longitude}', 'tags': ['Retrato', 'Nova Tag']},
+     16, None, ('new_portal_id', 'portal')),
+    ('portals.update_portal', 'PUT', '/api/portals/{new_portal_id}',
+     {'title': 'Portal Orçamento 2', 'tags': ['Retrato']}, 16, None, None),
+    ('portals.toggle_like_portal', 'POST', '/api/portals/{portal_id}/like', None, 8, None, None),
+    ('portals.toggle_favorite_portal', 'POST', '/api/portals/{portal_id}/favorite', None, 8, None, None),
+    ('reviews.create_review', 'POST', '/api/portals/{new_portal_id}/reviews', {'rating': 4, 'comment': 'Bom'},
+     8, None, ('review_id', 'review')),
+    ('reviews.update_review', 'PUT', '/api/reviews/{review_id}', {'rating': 5}, 8, None, None),
+    ('reviews.delete_review', 'DELETE', '/api/reviews/{review_id}', None, 8, None, None),
+    ('explorations.create_exploration', 'POST', '/api/explorations',
+     {'scan_image_url': 'https://example.com/scan.jpg', 'portal_id': '{portal_id}'}, 6, None,
+     ('exploration_id', 'exploration')),
+    ('explorations.get_exploration', 'GET', '/api/explorations/{exploration_id}', None, 3, None, None),
+    ('explorations.delete_exploration', 'DELETE', '/api/explorations/{exploration_id}', None, 5, None, None),
+    ('explorations.create_explorations_batch', 'POST', '/api/explorations/batch',
+     {'explorations': [{'scan_image_url': 'https://example.com/a.jpg', 'portal_id': '{portal_id}'},
+                       {'scan_image_url': 'https://example.com/b.jpg', 'portal_id': '{portal_id}'}]},
+     6, None, None),
+    ('portals.delete_portal', 'DELETE', '/api/portals/{new_portal_id}', None, 20, None, None),
+]
+
+# Rotas fora da API (arquivos estáticos e o frontend)
+IGNORED_ENDPOINTS = {'static', 'serve'}
+
+
+def _prepare_environment():
+    """Banco vazio em um diretório temporário, sem cache de respostas"""
+    workdir = tempfile.mkdtemp(prefix='query-budget-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    os.environ['AUTH_MODE'] = 'mock'
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    return workdir
+
+
+def _fill(value, params):
+    """Formata strings (e listas/dicts de strings) com os parâmetros"""
+    if isinstance(value, str):
+        # Um placeholder sozinho mantém o tipo do parâmetro (ex.: ids inteiros)
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in params:
+            return params[value[1:-1]]
+        return value.format(**params)
+    if isinstance(value, list):
+        return [_fill(item, params) for item in value]
+    if isinstance(value, dict):
+        return {key: _fill(item, params) for key, item in value.items()}
+    return value
+
+
+def _route_params(db, Portal, User):
+    portal = Portal.query.filter(
+        Portal.is_public == True, Portal.is_active == True, Portal.rating_count > 1
+    ).order_by(Portal.id).first()
+    other = User.query.filter(User.id != portal.creator_id).order_by(User.id).first()
+    return {
+        'portal_id': portal.id,
+        'user_id': portal.creator_id,
+        'other_user_id': other.id,
+        'category_id': portal.category_id,
+        'latitude': portal.latitude,
+        'longitude': portal.longitude,
+        'south': portal.latitude - 0.5, 'north': portal.latitude + 0.5,
+        'west': portal.longitude - 0.5, 'east': portal.longitude + 0.5,
+    }
+
+
+def _with_page(url, param, size):
+    separator = '&' if '?' in url else '?'
+    return f'{url}{separator}{param}={size}'
+
+
+def main():
+    workdir = _prepare_environment()
+
+    from src.main import app
+    from src.models.user import db, User
+    from src.models.portal import Portal
+    from src.utils.dataset import generate_dataset
+    from src.utils.query_budget import record_queries, check_scaling, QueryBudgetExceeded
+    from src.utils.events import event_pipeline
+    from src.utils.views import view_counter
+    from src.utils.database import dispose_engines
+
+    failures = []
+    try:
+        with app.app_context():
+            counts = generate_dataset('tiny')
+            print(f"📊 Dados gerados: {', '.join(f'{n} {table}' for table, n in counts.items())}")
+            params = _route_params(db, Portal, User)
+
+        client = app.test_client()
+        checked = set()
+        for endpoint, method, url, body, budget, page_param, save in ROUTES:
+            url = _fill(url, params)
+            body = _fill(body, params)
+            headers = {'Authorization': f"Bearer {params['user_id']}"}
+
+            with app.app_context():
+                with record_queries() as log:
+                    response = client.open(url, method=method, json=body, headers=headers)
+            checked.add(endpoint)
+
+            problems = []
+            if response.status_code >= 400:
+                problems.append(f'status {response.status_code}: {response.get_data(as_text=True)[:200]}')
+            if log.count > budget:
+                problems.append(f'{log.count} queries (orçamento {budget})\n    {log.describe()}')
+            if page_param:
+                try:
+                    with app.app_context():
+                        check_scaling(
+                            lambda size: client.open(_with_page(url, page_param, size), method=method, headers=headers),
+                            sizes=SCALING_SIZES
+                        )
+                except QueryBudgetExceeded as e:
+                    problems.append(str(e))
+
+            status = '❌' if problems else '✅'
+            print(f"{status} {method} {url} ({log.count}/{budget} queries)")
+            for problem in problems:
+                print(f"     {problem}")
+            failures.extend(problems)
+
+            if save and response.status_code < 400:
+                key, field = save
+                params[key] = response.get_json()[field]['id']
+
+        missing = sorted(
+            rule.endpoint for rule in app.url_map.iter_rules()
+            if rule.endpoint not in checked and rule.endpoint not in IGNORED_ENDPOINTS
+        )
+        for endpoint in missing:
+            print(f"❌ {endpoint}: rota sem orçamento em ROUTES")
+        failures.extend(missing)
+    finally:
+        # Gravações pendentes vão para o banco temporário antes de removê-lo
+        event_pipeline.flush()
+        view_counter.flush()
+        with app.app_context():
+            dispose_engines(db)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"❌ {len(failures)} problema(s) no orçamento de queries")
+        return 1
+    print("✅ Todas as rotas dentro do orçamento de queries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
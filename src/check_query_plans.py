@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Script que verifica os planos de consulta das rotas mais acessadas.
+
+Cada rota de HOT_ROUTES é chamada com o cliente de testes do Flask; os
+SELECTs executados passam por ``EXPLAIN QUERY PLAN`` e o script termina com
+erro (código 1) se algum deles percorrer uma tabela inteira sem índice.
+
+Roda sobre uma cópia do banco (as rotas de leitura também gravam
+visualizações), em modo de autenticação mock.
+
+Uso: python src/check_query_plans.py [caminho do banco]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+# Rotas verificadas; {portal_id} e {user_id} vêm do próprio banco
+HOT_ROUTES = [
+    '/api/portals',
+    '/api/portals?category_id={category_id}',
+    '/api/portals?creator_id={user_id}',
+    '/api/portals/{portal_id}',
+    '/api/portals/{portal_id}/reviews',
+    '/api/portals/nearby?lat={latitude}&lng={longitude}',
+    '/api/portals/clusters?bbox={west},{south},{east},{north}&zoom=10',
+    '/api/explorations',
+    '/api/users/{user_id}',
+    '/api/categories',
+    '/api/search?q=portal',
+    '/api/analytics/trending',
+    '/api/analytics/user/{user_id}',
+    '/api/analytics/portal/{portal_id}',
+]
+
+# Mesmo caminho padrão de src/utils/database.py (sem importá-lo)
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'app.db')
+
+def _prepare_database(path):
+    """Copia o banco para um diretório temporário e aponta o app para a cópia"""
+    workdir = tempfile.mkdtemp(prefix='query-plans-')
+    if os.path.exists(path):
+        shutil.copy(path, os.path.join(workdir, 'app.db'))
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    os.environ['AUTH_MODE'] = 'mock'
+    return workdir
+
+def _route_params(Portal):
+    portal = Portal.query.filter(
+        Portal.is_public == True, Portal.is_active == True, Portal.latitude.isnot(None)
+    ).order_by(Portal.id).first()
+    if portal is None:
+        return None
+    return {
+        'portal_id': portal.id,
+        'user_id': portal.creator_id,
+        'category_id': portal.category_id or 0,
+        'latitude': portal.latitude,
+        'longitude': portal.longitude,
+        'south': portal.latitude - 0.5, 'north': portal.latitude + 0.5,
+        'west': portal.longitude - 0.5, 'east': portal.longitude + 0.5,
+    }
+
+def main():
+    """Executa as rotas e mostra os planos com varredura completa"""
+    # Nada de src.* antes de _prepare_database: src.utils.database lê DATABASE_URL na importação
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATABASE_PATH
+    workdir = _prepare_database(path)
+
+    from src.main import app
+    from src.models.user import db
+    from src.models.portal import Portal
+    from src.utils.query_plans import capture_queries, explain, full_scans
+    from src.utils.views import view_counter
+    from src.utils.database import dispose_engines
+
+    failures = 0
+    try:
+        with app.app_context():
+            params = _route_params(Portal)
+            if params is None:
+                print("⚠️  Nenhum portal público com coordenadas; rode src/init_db.py antes")
+                return 1
+
+            client = app.test_client()
+            headers = {'Authorization': f"Bearer {params['user_id']}"}
+            with db.engine.connect() as conn:
+                for route in HOT_ROUTES:
+                    url = route.format(**params)
+                    with capture_queries() as queries:
+                        response = client.get(url, headers=headers)
+
+                    scans = []
+                    for statement, parameters in queries:
+                        for detail in full_scans(explain(conn, statement, parameters)):
+                            scans.append((detail, statement))
+
+                    status = '❌' if scans else '✅'
+                    print(f"{status} GET {url} ({response.status_code}, {len(queries)} consulta(s))")
+                    for detail, statement in scans:
+                        print(f"     {detail}: {' '.join(statement.split())[:200]}")
+                    failures += len(scans)
+    finally:
+        # Visualizações contadas durante a verificação vão para a cópia, antes de removê-la
+        view_counter.flush()
+        with app.app_context():
+            dispose_engines(db)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"❌ {failures} consulta(s) com varredura completa de tabela")
+        return 1
+    print("✅ Nenhuma varredura completa nas rotas verificadas")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
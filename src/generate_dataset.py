@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Script que gera um banco com dados sintéticos em volume (``src/utils/dataset.py``).
+
+Escalas prontas (``--scale``): tiny, small, medium e large (1M de usuários,
+500 mil portais, 50M de curtidas). Cada volume pode ser trocado
+individualmente. Com a mesma semente o resultado é sempre o mesmo.
+
+Uso:
+    python src/generate_dataset.py --scale medium --database /tmp/medium.db
+    python src/generate_dataset.py --scale large --likes 20000000 --seed 7
+
+Sem ``--database``, usa o banco do app (DATABASE_URL ou src/database/app.db),
+que precisa estar sem usuários.
+"""
+
+import os
+import sys
+import time
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+TABLES = ('users', 'portals', 'reviews', 'likes', 'favorites', 'follows', 'explorations')
+
+
+def parse_args(argv=None):
+    # Escalas importadas só depois de DATABASE_URL definido
+    parser = argparse.ArgumentParser(description='Gera dados sintéticos em volume')
+    parser.add_argument('--scale', default='small', help='tiny, small, medium ou large (padrão small)')
+    parser.add_argument('--seed', type=int, default=42, help='semente (padrão 42)')
+    parser.add_argument('--database', help='arquivo SQLite a criar (não pode existir)')
+    for table in TABLES:
+        parser.add_argument(f'--{table}', type=int, help=f'total de {table} (substitui o da escala)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.database:
+        if os.path.exists(args.database):
+            print(f"❌ {args.database} já existe; o gerador precisa de um banco novo")
+            return 1
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(args.database)}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from src.main import app
+    from src.utils.dataset import generate_dataset, resolve_volumes
+
+    try:
+        volumes = resolve_volumes(args.scale, **{table: getattr(args, table) for table in TABLES})
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"📦 Escala {args.scale}: {', '.join(f'{n:,} {table}' for table, n in volumes.items())}")
+
+    started = time.monotonic()
+    last = {'table': None}
+
+    def progress(table, rows):
+        if table != last['table']:
+            if last['table']:
+                print()
+            last['table'] = table
+        elapsed = time.monotonic() - started
+        print(f"\r   {table}: {rows:,} linha(s) ({elapsed:.0f}s)", end='', flush=True)
+
+    with app.app_context():
+        try:
+            counts = generate_dataset(args.scale, seed=args.seed, progress=progress, **volumes)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+    print()
+
+    elapsed = time.monotonic() - started
+    total = sum(counts.values())
+    for table, rows in counts.items():
+        print(f"📊 {table}: {rows:,}")
+    print(f"✅ {total:,} linha(s) em {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} linhas/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
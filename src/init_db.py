@@ -14,6 +14,7 @@ from src.models.category import Category
 from src.models.tag import Tag
 from src.models.review import Review
 from src.models.exploration import Exploration
+from src.utils.counters import reconcile_counters
 
 def init_database():
     """Inicializa o banco de dados com dados de exemplo"""
@@ -190,6 +191,9 @@ def init_database():
         # Commit final
         db.session.commit()
         
+        # Preencher os contadores desnormalizados
+        reconcile_counters()
+        
         print("✅ Dados de exemplo inseridos com sucesso!")
         print(f"📊 Criados: {len(categories)} categorias, {len(tags)} tags, {len(users)} usuários, {len(portals)} portais")
         print(f"📝 Criadas: {len(reviews)} avaliações, {len(explorations)} explorações")
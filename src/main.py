@@ -2,6 +2,7 @@ import os
 import sys
 from flask import Flask, send_from_directory, request, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.portals import portals_bp
@@ -11,54 +12,46 @@ from src.routes.explorations import explorations_bp
 from src.routes.health import health_bp
 from src.routes.search import search_bp
 from src.routes.analytics import analytics_bp
-from src.utils.helpers import error_response
-import logging
-import json
-from datetime import datetime
+from src.utils.helpers import error_response, InvalidCursorError
+from src.utils.migrations import run_migrations
+from src.utils.database import configure_database
+from src.utils.json_provider import init_json
+from src.utils.negotiation import NegotiatingRequest
+from src.utils.search_index import ensure_search_index
+from src.utils.geo_index import ensure_geo_index
+from src.utils.clusters import ensure_cluster_index
+from src.utils.rollups import ensure_rollups
+from src.utils.portal_series import ensure_portal_series
+from src.utils.suggestions import init_suggestions
+from src.utils.trending import init_trending
+from src.utils.events import event_pipeline
+from src.utils.views import view_counter
+from src.utils.log_pipeline import configure_logging
+from src.utils.metrics import init_metrics
+import time
 
 # DON\'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-class JsonFormatter(logging.Formatter):
-    def format(self, record):
-        log_record = {
-            "timestamp": datetime.fromtimestamp(record.created).isoformat() + "Z",
-            "level": record.levelname,
-            "message": record.getMessage(),
-            "service": "portales-api",
-            "module": record.name,
-            "function": record.funcName,
-        }
-        if hasattr(record, 'request_id'):
-            log_record['request_id'] = record.request_id
-        if hasattr(record, 'user_id'):
-            log_record['user_id'] = record.user_id
-        if record.exc_info:
-            log_record['exc_info'] = self.formatException(record.exc_info)
-        if record.stack_info:
-            log_record['stack_info'] = self.formatStack(record.stack_info)
-        if hasattr(record, 'details'):
-            log_record['details'] = record.details
-
-        return json.dumps(log_record)
-
-def configure_logging(app):
-    handler = logging.StreamHandler()
-    formatter = JsonFormatter()
-    handler.setFormatter(formatter)
-    app.logger.addHandler(handler)
-    app.logger.setLevel(logging.INFO) # Default level
-
-    # Remove default Flask handlers
-    for h in list(app.logger.handlers): # Iterate over a copy
-        app.logger.removeHandler(h)
-
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 CORS(app) # Habilitar CORS para todas as rotas
 
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
-# Configurar logging
+# Proxies reversos na frente do app (ex.: 1 no Railway). O IP do cliente
+# (request.remote_addr) só é lido do X-Forwarded-For para esses saltos;
+# com 0 (padrão) o cabeçalho é ignorado
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
+
+# Serialização JSON das respostas (orjson se instalado)
+init_json(app)
+
+# Corpos de requisição em MessagePack também passam por request.get_json()
+app.request_class = NegotiatingRequest
+
+# Configurar logging (JSON, escrito em segundo plano)
 configure_logging(app)
 
 # Registrar blueprints
@@ -71,22 +64,47 @@ app.register_blueprint(health_bp, url_prefix='/api')
 app.register_blueprint(search_bp, url_prefix='/api')
 app.register_blueprint(analytics_bp, url_prefix='/api')
 
-# Configurar banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Configurar banco de dados (SQLite em WAL, pool somente leitura para GETs)
+configure_database(app, db)
 with app.app_context():
     db.create_all()
+    run_migrations()
+    ensure_search_index()
+    ensure_geo_index()
+    ensure_cluster_index()
+    ensure_rollups()
+    ensure_portal_series()
+
+# Métricas por requisição (latência, SQL, tamanho) expostas em /api/metrics
+init_metrics(app, db)
+
+# Índice de sugestões em memória
+init_suggestions(app)
+
+# Motor de tendências em memória (reconstruído do histórico)
+init_trending(app)
+
+# Pipeline de eventos de analytics (gravação em lote em segundo plano)
+event_pipeline.init_app(app)
+
+# Contadores de visualização de portais (gravados periodicamente)
+view_counter.init_app(app)
 
 # Middleware para adicionar request_id e user_id aos logs
 @app.before_request
 def before_request():
     g.request_id = request.headers.get('X-Request-ID', os.urandom(8).hex())
+    g.request_started = time.perf_counter()
     # g.current_user_id é definido pelo decorador auth_required/optional_auth
 
 @app.after_request
 def after_request(response):
     response.headers['X-Request-ID'] = g.request_id
+    # Log de acesso (amostrável por rota com LOG_ROUTE_SAMPLE_RATES)
+    app.logger.info('%s %s %s', request.method, request.path, response.status_code, extra={'details': {
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - g.get('request_started', time.perf_counter())) * 1000, 2)
+    }})
     return response
 
 # Tratamento de erros global
@@ -94,6 +112,10 @@ def after_request(response):
 def not_found_error(error):
     return error_response('Recurso não encontrado', 'RESOURCE_NOT_FOUND', status_code=404)
 
+@app.errorhandler(InvalidCursorError)
+def invalid_cursor_error(error):
+    return error_response(str(error), 'VALIDATION_ERROR', status_code=400)
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Script para aplicar as migrações pendentes do schema e mostrar o estado de
+cada uma (a inicialização do app também aplica as pendentes)
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import app
+from src.utils.migrations import run_migrations, migration_status
+
+def main():
+    """Aplica as migrações e lista as versões"""
+    with app.app_context():
+        ran = run_migrations()
+        status = migration_status()
+
+    for version, name, applied_at in status:
+        mark = '✅' if applied_at else '⏳'
+        print(f"{mark} {version:04d} {name} {applied_at or ''}")
+    print(f"✅ {len(ran)} migração(ões) aplicada(s) agora" if ran else "✅ Schema atualizado")
+
+if __name__ == "__main__":
+    main()
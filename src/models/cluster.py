@@ -0,0 +1,28 @@
+from src.models.user import db
+
+class PortalCluster(db.Model):
+    """
+    Célula do índice de clusters do mapa: agrega os portais visíveis que caem
+    em uma célula da grade de um nível de zoom
+    """
+    __tablename__ = 'portal_clusters'
+    
+    zoom = db.Column(db.Integer, primary_key=True)
+    cell_x = db.Column(db.Integer, primary_key=True)
+    cell_y = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    latitude_sum = db.Column(db.Float, nullable=False, default=0.0)
+    longitude_sum = db.Column(db.Float, nullable=False, default=0.0)
+    representative_id = db.Column(db.Integer, nullable=True, index=True)
+    representative_score = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<PortalCluster {self.zoom}/{self.cell_x}/{self.cell_y}>'
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'latitude': self.latitude_sum / self.count if self.count else None,
+            'longitude': self.longitude_sum / self.count if self.count else None,
+            'representative_id': self.representative_id
+        }
@@ -0,0 +1,30 @@
+from src.models.user import db
+from datetime import datetime
+import json
+
+class AnalyticsEvent(db.Model):
+    """
+    Evento de analytics (tabela somente de inserção, gravada em lote pelo
+    pipeline de eventos)
+    """
+    __tablename__ = 'analytics_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.String(128), nullable=True)
+    portal_id = db.Column(db.Integer, nullable=True)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    properties = db.Column(db.Text, nullable=True)  # JSON
+
+    def __repr__(self):
+        return f'<AnalyticsEvent {self.event_type} {self.id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'user_id': self.user_id,
+            'portal_id': self.portal_id,
+            'timestamp': self.timestamp.isoformat() + 'Z' if self.timestamp else None,
+            'properties': json.loads(self.properties) if self.properties else {}
+        }
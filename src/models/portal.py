@@ -20,6 +20,16 @@ class Portal(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Contadores desnormalizados (mantidos por src.utils.counters)
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    favorites_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Visualizações (mantidas por src.utils.views, gravadas em lote)
+    views_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unique_viewers = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Campos JSON para dados complexos
     ai_analysis = db.Column(db.JSON, nullable=True)
     ar_effects = db.Column(db.JSON, nullable=True)
@@ -67,20 +77,20 @@ class Portal(db.Model):
         
         if include_stats:
             portal_dict['stats'] = {
-                'views_count': 0,  # TODO: Implementar contagem de visualizações
-                'likes_count': len(self.liked_by),
-                'favorites_count': len(self.favorited_by),
+                'views_count': self.views_count or 0,
+                'unique_viewers': self.unique_viewers or 0,
+                'likes_count': self.likes_count or 0,
+                'favorites_count': self.favorites_count or 0,
                 'rating_average': self.get_average_rating(),
-                'rating_count': len(self.reviews)
+                'rating_count': self.rating_count or 0
             }
         
         return portal_dict
     
     def get_average_rating(self):
-        if not self.reviews:
+        if not self.rating_count:
             return 0.0
-        total = sum(review.rating for review in self.reviews)
-        return round(total / len(self.reviews), 1)
+        return round(self.rating_sum / self.rating_count, 1)
 
 # Tabela de associação para tags
 portal_tags = db.Table('portal_tags',
@@ -0,0 +1,19 @@
+from src.models.user import db
+
+class PortalDailyStats(db.Model):
+    """
+    Engajamento de um portal em um dia (série temporal para os gráficos do criador)
+    """
+    __tablename__ = 'portal_daily_stats'
+    
+    portal_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    likes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    favorites = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    reviews = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    explorations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    ar_activations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<PortalDailyStats {self.portal_id} {self.day}>'
@@ -0,0 +1,14 @@
+from src.models.user import db
+
+class DailyRollup(db.Model):
+    """
+    Total pré-agregado de uma métrica em um dia (ex.: novos portais em 2025-08-27)
+    """
+    __tablename__ = 'daily_rollups'
+    
+    day = db.Column(db.Date, primary_key=True)
+    metric = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyRollup {self.day} {self.metric}={self.count}>'
@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from src.utils.database import RoutingSession
 
-db = SQLAlchemy()
+# Objetos continuam utilizáveis depois do commit, sem recarregar do banco
+db = SQLAlchemy(session_options={'class_': RoutingSession, 'expire_on_commit': False})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -16,6 +18,11 @@ class User(db.Model):
     is_verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Contadores desnormalizados (mantidos por src.utils.counters)
+    portals_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    followers_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relacionamentos
     portals = db.relationship('Portal', backref='creator', lazy=True, cascade='all, delete-orphan')
     reviews = db.relationship('Review', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -52,9 +59,9 @@ class User(db.Model):
         
         if include_stats:
             user_dict['stats'] = {
-                'portals_count': len(self.portals),
-                'followers_count': len(self.followers),
-                'following_count': len(self.following)
+                'portals_count': self.portals_count or 0,
+                'followers_count': self.followers_count or 0,
+                'following_count': self.following_count or 0
             }
         
         return user_dict
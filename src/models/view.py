@@ -0,0 +1,16 @@
+from src.models.user import db
+
+class PortalViewCount(db.Model):
+    """
+    Visualizações de um portal em um período: um dia ('AAAA-MM-DD') ou o
+    total ('all'), com o sketch HyperLogLog dos visitantes únicos
+    """
+    __tablename__ = 'portal_view_counts'
+    
+    portal_id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    registers = db.Column(db.LargeBinary, nullable=True)
+
+    def __repr__(self):
+        return f'<PortalViewCount {self.portal_id} {self.period}={self.views}>'
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Script para reconstruir o estado do motor de tendências a partir do histórico
+(curtidas, favoritos, reviews, explorações e visualizações diárias) e mostrar
+o ranking resultante. Os servidores fazem a mesma reconstrução na
+inicialização e a cada TRENDING_REFRESH_SECONDS.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import app
+from src.models.portal import Portal
+from src.utils.trending import trending_engine, load_history
+
+def main():
+    """Reconstrói o motor e mostra os portais em tendência e os mais populares"""
+    with app.app_context():
+        portals = load_history()
+        trending = trending_engine.trending(10)
+        popular = trending_engine.popular(10)
+        titles = dict(Portal.query.with_entities(Portal.id, Portal.title).filter(
+            Portal.id.in_([portal_id for portal_id, _ in trending + popular])
+        ).all())
+
+    print(f"✅ Motor reconstruído: {portals} portal(is) com engajamento")
+    print("🔥 Em tendência:")
+    for portal_id, score in trending:
+        print(f"   {score:10.2f}  #{portal_id} {titles.get(portal_id, '')}")
+    print("⭐ Mais populares:")
+    for portal_id, score in popular:
+        print(f"   {score:10.2f}  #{portal_id} {titles.get(portal_id, '')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Script para recalcular os contadores desnormalizados (curtidas, favoritos,
+avaliações, seguidores e portais) e corrigir divergências
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import app
+from src.utils.counters import reconcile_counters
+
+def main():
+    """Executa a reconciliação e mostra quantas linhas foram corrigidas"""
+    with app.app_context():
+        repaired = reconcile_counters()
+
+    total = sum(repaired.values())
+    for counter, count in repaired.items():
+        if count:
+            print(f"🔧 {counter}: {count} linha(s) corrigida(s)")
+
+    if total:
+        print(f"✅ Reconciliação concluída: {total} correção(ões)")
+    else:
+        print("✅ Todos os contadores já estavam corretos")
+
+if __name__ == "__main__":
+    main()
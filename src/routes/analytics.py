@@ -1,71 +1,85 @@
+import json
 from flask import Blueprint, request, g
 from src.models.user import db, User
 from src.models.portal import Portal
 from src.models.review import Review
 from src.models.exploration import Exploration
 from src.utils.auth import auth_required, optional_auth
-from src.utils.helpers import success_response, error_response
+from src.utils.helpers import success_response, error_response, parse_timestamp
+from src.utils.serializers import serialize_portal_fragments
+from src.utils.fragments import defer_portal_blobs
+from src.utils.events import event_pipeline
+from src.utils.rollups import get_totals, get_daily
+from src.utils.views import unique_viewers
+from src.utils.portal_series import get_portal_series, SERIES_METRICS
+from src.utils.trending import trending_engine, refresh_if_stale, TRENDING_HALF_LIFE_HOURS
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
 
 analytics_bp = Blueprint("analytics", __name__)
 
+# Tamanho máximo de "properties" serializado, por evento
+EVENT_MAX_PROPERTIES_BYTES = 4096
+
+DASHBOARD_MAX_DAYS = 365
+PORTAL_SERIES_RANGES = (30, 90, 365)
+DASHBOARD_GROWTH_METRICS = ["new_users", "new_portals", "new_reviews", "new_explorations", "new_likes"]
+TRENDING_MAX_LIMIT = 100
+
+def _ranked_portals(ranked, limit):
+    """
+    Carrega os portais públicos e ativos de uma lista [(portal_id, score)]
+    mantendo a ordem. Retorna (portais, {portal_id: score}).
+    """
+    scores = dict(ranked)
+    portals = {
+        portal.id: portal for portal in defer_portal_blobs(Portal.query.filter(
+            Portal.id.in_(list(scores)),
+            Portal.is_public == True,
+            Portal.is_active == True
+        )).all()
+    } if scores else {}
+    ordered = [portals[portal_id] for portal_id, _ in ranked if portal_id in portals][:limit]
+    return ordered, scores
+
+
 @analytics_bp.route("/analytics/dashboard", methods=["GET"])
 @auth_required
 def get_dashboard_analytics():
     """
     Estatísticas gerais da plataforma (para admins)
     """
-    days = request.args.get("days", 30, type=int)
+    days = max(1, min(request.args.get("days", 30, type=int), DASHBOARD_MAX_DAYS))
     start_date = datetime.utcnow() - timedelta(days=days)
     
-    # Estatísticas gerais
-    total_users = User.query.count()
-    total_portals = Portal.query.filter_by(is_public=True, is_active=True).count()
-    total_reviews = Review.query.count()
-    total_explorations = Exploration.query.count()
+    # Estatísticas gerais (somas dos agregados diários, sem COUNT nas tabelas)
+    totals = get_totals(["new_users", "public_portals", "new_reviews", "new_explorations"])
     
     # Usuários ativos (que fizeram alguma ação nos últimos 30 dias)
     active_users = User.query.filter(
         User.last_login >= start_date
     ).count() if hasattr(User, 'last_login') else 0
     
-    # Portais mais populares (por número de curtidas)
-    popular_portals = Portal.query.join(Portal.liked_by).group_by(Portal.id).order_by(
-        desc(func.count(User.id))
-    ).limit(10).all()
-    
-    # Crescimento diário (últimos 7 dias)
-    daily_growth = {}
-    for i in range(7):
-        date = datetime.utcnow() - timedelta(days=i)
-        date_str = date.strftime("%Y-%m-%d")
-        
-        new_users = User.query.filter(
-            func.date(User.created_at) == date.date()
-        ).count()
-        
-        new_portals = Portal.query.filter(
-            func.date(Portal.created_at) == date.date()
-        ).count()
-        
-        new_reviews = Review.query.filter(
-            func.date(Review.created_at) == date.date()
-        ).count()
-        
-        daily_growth[date_str] = {
-            "new_users": new_users,
-            "new_portals": new_portals,
-            "new_reviews": new_reviews
-        }
+    # Portais mais populares de todos os tempos (motor de tendências, sem decaimento)
+    refresh_if_stale()
+    popular_portals, _ = _ranked_portals(trending_engine.popular(20), 10)
+    
+    # Crescimento diário no período (uma linha pré-agregada por dia e métrica)
+    daily_growth = get_daily(days, DASHBOARD_GROWTH_METRICS)
+    period_totals = {
+        metric: sum(day[metric] for day in daily_growth.values())
+        for metric in DASHBOARD_GROWTH_METRICS
+    }
     
     return success_response({
-        "total_users": total_users,
-        "total_portals": total_portals,
-        "total_reviews": total_reviews,
-        "total_explorations": total_explorations,
+        "total_users": totals["new_users"],
+        "total_portals": totals["public_portals"],
+        "total_reviews": totals["new_reviews"],
+        "total_explorations": totals["new_explorations"],
         "active_users": active_users,
-        "popular_portals": [portal.to_dict() for portal in popular_portals],
+        "popular_portals": serialize_portal_fragments(popular_portals),
+        "days": days,
+        "period_totals": period_totals,
         "daily_growth": daily_growth
     })
 
@@ -97,33 +111,41 @@ def get_user_analytics(user_id):
     explorations_count = Exploration.query.filter_by(user_id=user_id).count()
     
     # Total de curtidas recebidas nos portais do usuário
-    total_likes = db.session.query(func.count()).select_from(
-        Portal.query.filter_by(creator_id=user_id).join(Portal.liked_by).subquery()
+    total_likes = db.session.query(func.sum(Portal.likes_count)).filter(
+        Portal.creator_id == user_id
     ).scalar() or 0
     
     # Portais mais populares do usuário
-    popular_portals = Portal.query.filter_by(creator_id=user_id).join(
-        Portal.liked_by
-    ).group_by(Portal.id).order_by(
-        desc(func.count(User.id))
-    ).limit(5).all()
+    popular_portals = defer_portal_blobs(Portal.query.filter(
+        Portal.creator_id == user_id,
+        Portal.likes_count > 0
+    )).order_by(desc(Portal.likes_count)).limit(5).all()
     
     return success_response({
         "portals_count": portals_count,
         "reviews_count": reviews_count,
         "explorations_count": explorations_count,
         "total_likes_received": total_likes,
-        "followers_count": len(user.followers),
-        "following_count": len(user.following),
-        "popular_portals": [portal.to_dict() for portal in popular_portals]
+        "followers_count": user.followers_count,
+        "following_count": user.following_count,
+        "popular_portals": serialize_portal_fragments(popular_portals)
     })
 
 @analytics_bp.route("/analytics/portal/<int:portal_id>", methods=["GET"])
 @auth_required
 def get_portal_analytics(portal_id):
     """
-    Analytics específicas do portal
+    Analytics específicas do portal, com a série diária de engajamento
+    dos últimos 30, 90 ou 365 dias (parâmetro days)
     """
+    days = request.args.get("days", 30, type=int)
+    if days not in PORTAL_SERIES_RANGES:
+        return error_response(
+            f"days deve ser um de: {', '.join(map(str, PORTAL_SERIES_RANGES))}",
+            "VALIDATION_ERROR",
+            status_code=400
+        )
+    
     portal = Portal.query.get(portal_id)
     if not portal:
         return error_response(
@@ -140,57 +162,47 @@ def get_portal_analytics(portal_id):
             status_code=403
         )
     
-    # Estatísticas do portal
-    likes_count = len(portal.liked_by)
-    favorites_count = len(portal.favorited_by)
-    reviews_count = Review.query.filter_by(portal_id=portal_id).count()
+    # Estatísticas do portal (contadores desnormalizados)
     explorations_count = Exploration.query.filter_by(portal_id=portal_id).count()
+    avg_rating = portal.rating_sum / portal.rating_count if portal.rating_count else 0
     
-    # Avaliação média
-    avg_rating = db.session.query(func.avg(Review.rating)).filter_by(
-        portal_id=portal_id
-    ).scalar() or 0
-    
-    # Visualizações por dia (últimos 30 dias)
-    # Nota: Isso requereria um sistema de tracking de views
-    # Por enquanto, retornamos dados simulados
-    daily_views = {}
-    for i in range(30):
-        date = datetime.utcnow() - timedelta(days=i)
-        date_str = date.strftime("%Y-%m-%d")
-        daily_views[date_str] = 0  # Placeholder
+    # Série diária do período: uma única leitura por faixa de (portal_id, dia)
+    series = get_portal_series(portal_id, days)
     
     return success_response({
-        "likes_count": likes_count,
-        "favorites_count": favorites_count,
-        "reviews_count": reviews_count,
+        "likes_count": portal.likes_count,
+        "favorites_count": portal.favorites_count,
+        "reviews_count": portal.rating_count,
         "explorations_count": explorations_count,
         "average_rating": round(float(avg_rating), 2) if avg_rating else 0,
-        "daily_views": daily_views
+        "views_count": portal.views_count or 0,
+        "unique_viewers": portal.unique_viewers or 0,
+        "period_unique_viewers": unique_viewers(portal_id, series["days"]),
+        "days": days,
+        "period_totals": {metric: sum(series[metric]) for metric in SERIES_METRICS},
+        "series": series,
+        "daily_views": dict(zip(series["days"], series["views"]))
     })
 
 @analytics_bp.route("/analytics/trending", methods=["GET"])
 @optional_auth
 def get_trending():
     """
-    Portais em tendência
+    Portais em tendência (pontuação de engajamento com decaimento exponencial)
     """
-    limit = request.args.get("limit", 20, type=int)
-    days = request.args.get("days", 7, type=int)
+    limit = max(1, min(request.args.get("limit", 20, type=int), TRENDING_MAX_LIMIT))
     
-    start_date = datetime.utcnow() - timedelta(days=days)
+    refresh_if_stale()
+    ranked = trending_engine.trending(limit * 2)
+    trending_portals, scores = _ranked_portals(ranked, limit)
     
-    # Portais com mais curtidas nos últimos dias
-    trending_portals = Portal.query.filter(
-        Portal.is_public == True,
-        Portal.is_active == True,
-        Portal.created_at >= start_date
-    ).join(Portal.liked_by).group_by(Portal.id).order_by(
-        desc(func.count(User.id))
-    ).limit(limit).all()
+    portals_data = serialize_portal_fragments(trending_portals, extra={
+        portal.id: {"trending_score": round(scores[portal.id], 4)} for portal in trending_portals
+    })
     
     return success_response({
-        "trending_portals": [portal.to_dict() for portal in trending_portals]
+        "trending_portals": portals_data,
+        "half_life_hours": TRENDING_HALF_LIFE_HOURS
     })
 
 @analytics_bp.route("/analytics/track", methods=["POST"])
@@ -215,9 +227,57 @@ def track_event():
             status_code=400
         )
     
-    # Por enquanto, apenas logamos o evento
-    # Em uma implementação real, isso seria salvo em uma tabela de analytics
-    print(f"Event tracked: {event_type} by user {g.current_user_id if hasattr(g, 'current_user_id') else 'anonymous'}")
+    if not isinstance(event_type, str) or len(event_type) > 100:
+        return error_response(
+            "Campo 'event_type' deve ser um texto de até 100 caracteres",
+            "VALIDATION_ERROR",
+            status_code=400
+        )
+    
+    portal_id = data.get("portal_id")
+    if portal_id is not None and (isinstance(portal_id, bool) or not isinstance(portal_id, int)):
+        return error_response(
+            "Campo 'portal_id' deve ser um número inteiro",
+            "VALIDATION_ERROR",
+            status_code=400
+        )
+    
+    properties = data.get("properties") or {}
+    if not isinstance(properties, dict) or len(json.dumps(properties)) > EVENT_MAX_PROPERTIES_BYTES:
+        return error_response(
+            f"Campo 'properties' deve ser um objeto de até {EVENT_MAX_PROPERTIES_BYTES} bytes",
+            "VALIDATION_ERROR",
+            status_code=400
+        )
+    
+    timestamp = None
+    if data.get("timestamp"):
+        try:
+            timestamp = parse_timestamp(data["timestamp"])
+        except ValueError:
+            return error_response(
+                "Campo 'timestamp' deve estar no formato ISO 8601",
+                "VALIDATION_ERROR",
+                status_code=400
+            )
+    
+    # O evento só entra na fila; a gravação acontece em lote, em segundo plano
+    accepted = event_pipeline.enqueue(
+        event_type,
+        user_id=g.current_user_id,
+        portal_id=portal_id,
+        properties=properties,
+        timestamp=timestamp
+    )
+    
+    if not accepted:
+        response, status_code = error_response(
+            "Fila de eventos cheia, tente novamente",
+            "SERVICE_UNAVAILABLE",
+            status_code=503
+        )
+        response.headers["Retry-After"] = "1"
+        return response, status_code
     
-    return success_response({"message": "Evento rastreado com sucesso"})
+    return success_response({"message": "Evento rastreado com sucesso"}, status_code=202)
 
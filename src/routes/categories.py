@@ -1,17 +1,21 @@
 from flask import Blueprint, request
 from src.models.user import db
 from src.models.category import Category
+from src.models.portal import Portal
 from src.utils.helpers import success_response, error_response, validate_required_fields, create_slug
+from src.utils.serializers import serialize_categories
+from src.utils.response_cache import response_cache
 
 categories_bp = Blueprint("categories", __name__)
 
 @categories_bp.route("/categories", methods=["GET"])
+@response_cache.cached(tags=["categories", "portals"])
 def get_categories():
     """
     Lista todas as categorias
     """
     categories = Category.query.all()
-    return success_response({"categories": [cat.to_dict() for cat in categories]})
+    return success_response({"categories": serialize_categories(categories)})
 
 @categories_bp.route("/categories/<int:category_id>", methods=["GET"])
 def get_category(category_id):
@@ -64,6 +68,7 @@ def create_category():
     try:
         db.session.add(category)
         db.session.commit()
+        response_cache.invalidate("categories")
         return success_response({"category": category.to_dict()}, status_code=201)
     except Exception as e:
         db.session.rollback()
@@ -102,6 +107,7 @@ def update_category(category_id):
 
     try:
         db.session.commit()
+        response_cache.invalidate("categories")
         return success_response({"category": category.to_dict()})
     except Exception as e:
         db.session.rollback()
@@ -121,7 +127,8 @@ def delete_category(category_id):
             "Categoria não encontrada", "RESOURCE_NOT_FOUND", status_code=404
         )
 
-    if category.portals.count() > 0:
+    # EXISTS em vez de carregar a coleção (``portals`` é uma lista, sem .count())
+    if db.session.query(Portal.query.filter_by(category_id=category_id).exists()).scalar():
         return error_response(
             "Não é possível deletar categoria com portais associados",
             "VALIDATION_ERROR",
@@ -131,6 +138,7 @@ def delete_category(category_id):
     try:
         db.session.delete(category)
         db.session.commit()
+        response_cache.invalidate("categories")
         return success_response(status_code=204)
     except Exception as e:
         db.session.rollback()
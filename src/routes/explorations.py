@@ -1,12 +1,23 @@
+import os
+from datetime import datetime
 from flask import Blueprint, request, g
+from sqlalchemy import insert
 from src.models.user import db, User
 from src.models.portal import Portal
 from src.models.exploration import Exploration
 from src.utils.auth import auth_required
-from src.utils.helpers import success_response, error_response, validate_required_fields, paginate_query
+from src.utils.helpers import success_response, error_response, validate_required_fields, paginate_query, parse_timestamp
+from src.utils.serializers import serialize_explorations
+from src.utils.count_cache import count_cache
+from src.utils.trending import record_engagement
 
 explorations_bp = Blueprint("explorations", __name__)
 
+# Máximo de explorações por requisição em /explorations/batch
+EXPLORATIONS_BATCH_MAX = int(os.environ.get("EXPLORATIONS_BATCH_MAX", 500))
+
+_NUMERIC_FIELDS = ("detection_confidence", "latitude", "longitude")
+
 @explorations_bp.route("/explorations", methods=["GET"])
 @auth_required
 def get_explorations():
@@ -15,12 +26,19 @@ def get_explorations():
     """
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 20, type=int)
+    cursor = request.args.get("cursor")
+    include_total = request.args.get("include_total", "false").lower() == "true"
+    count_mode = request.args.get("count", "cached")  # cached, exact ou estimate
 
     query = Exploration.query.filter_by(user_id=g.current_user_id).order_by(Exploration.created_at.desc())
-    result = paginate_query(query, page, per_page)
+    result = paginate_query(
+        query, page, per_page,
+        cursor=cursor, keyset=(Exploration.created_at, Exploration.id), include_total=include_total,
+        count_key=("explorations", {"user_id": g.current_user_id}), count_mode=count_mode
+    )
 
     return success_response({
-        "explorations": [exp.to_dict() for exp in result["items"]],
+        "explorations": serialize_explorations(result["items"]),
         "pagination": result["pagination"],
     })
 
@@ -44,6 +62,16 @@ def create_exploration():
             status_code=400,
         )
 
+    if not isinstance(data["scan_image_url"], str) or not data["scan_image_url"].strip():
+        return error_response(
+            "Campo scan_image_url deve ser uma URL (texto)", "VALIDATION_ERROR", status_code=400
+        )
+
+    if not isinstance(data.get("ar_activated", False), bool):
+        return error_response(
+            "Campo ar_activated deve ser booleano", "VALIDATION_ERROR", status_code=400
+        )
+
     # Opcional: verificar se o portal_id existe
     portal = None
     if "portal_id" in data and data["portal_id"] is not None:
@@ -73,6 +101,127 @@ def create_exploration():
             "Erro ao criar exploração", "INTERNAL_ERROR", status_code=500
         )
 
+def _parse_batch_item(item, existing_portal_ids):
+    """
+    Valida um item do lote e monta a linha a inserir.
+    Retorna (linha, None) ou (None, (código, mensagem)).
+    """
+    if not isinstance(item, dict):
+        return None, ("VALIDATION_ERROR", "Item deve ser um objeto JSON")
+
+    missing_fields = validate_required_fields(item, ["scan_image_url"])
+    if missing_fields:
+        return None, ("VALIDATION_ERROR", f"Campos obrigatórios ausentes: {', '.join(missing_fields)}")
+
+    # Um valor de tipo errado falharia no INSERT em lote e derrubaria o lote inteiro
+    if not isinstance(item["scan_image_url"], str) or not item["scan_image_url"].strip():
+        return None, ("VALIDATION_ERROR", "Campo scan_image_url deve ser uma URL (texto)")
+
+    for field in _NUMERIC_FIELDS:
+        value = item.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return None, ("VALIDATION_ERROR", f"Campo {field} deve ser numérico")
+
+    # Sem conversão: bool("false") seria True
+    if not isinstance(item.get("ar_activated", False), bool):
+        return None, ("VALIDATION_ERROR", "Campo ar_activated deve ser booleano")
+
+    portal_id = item.get("portal_id")
+    if portal_id is not None and (isinstance(portal_id, bool) or not isinstance(portal_id, int)):
+        return None, ("VALIDATION_ERROR", "Campo portal_id deve ser um inteiro")
+    if portal_id is not None and portal_id not in existing_portal_ids:
+        return None, ("RESOURCE_NOT_FOUND", "Portal associado não encontrado")
+
+    row = {
+        "user_id": g.current_user_id,
+        "portal_id": portal_id,
+        "scan_image_url": item["scan_image_url"],
+        "detection_confidence": item.get("detection_confidence"),
+        "ar_activated": item.get("ar_activated", False),
+        "latitude": item.get("latitude"),
+        "longitude": item.get("longitude"),
+        "created_at": datetime.utcnow(),
+    }
+
+    # Scans feitos offline chegam com o horário em que foram capturados
+    if item.get("created_at"):
+        try:
+            row["created_at"] = parse_timestamp(item["created_at"])
+        except ValueError:
+            return None, ("VALIDATION_ERROR", "created_at deve estar no formato ISO 8601")
+
+    return row, None
+
+@explorations_bp.route("/explorations/batch", methods=["POST"])
+@auth_required
+def create_explorations_batch():
+    """
+    Cria várias explorações de uma vez (ex.: scans enfileirados offline)
+    Itens inválidos são reportados individualmente sem impedir os demais.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("explorations") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return error_response(
+            "Envie uma lista não vazia em 'explorations'", "VALIDATION_ERROR", status_code=400
+        )
+
+    if len(items) > EXPLORATIONS_BATCH_MAX:
+        return error_response(
+            f"Máximo de {EXPLORATIONS_BATCH_MAX} explorações por requisição",
+            "VALIDATION_ERROR",
+            {"max_items": EXPLORATIONS_BATCH_MAX},
+            status_code=400,
+        )
+
+    # Todos os portais referenciados validados em uma única query
+    requested_portal_ids = {
+        item.get("portal_id") for item in items
+        if isinstance(item, dict) and isinstance(item.get("portal_id"), int) and not isinstance(item.get("portal_id"), bool)
+    }
+    existing_portal_ids = {
+        portal_id for (portal_id,) in
+        db.session.query(Portal.id).filter(Portal.id.in_(requested_portal_ids)).all()
+    } if requested_portal_ids else set()
+
+    results = [None] * len(items)
+    rows, row_indexes = [], []
+    for index, item in enumerate(items):
+        row, error = _parse_batch_item(item, existing_portal_ids)
+        if error:
+            code, message = error
+            results[index] = {"index": index, "status": "error", "error": {"code": code, "message": message}}
+        else:
+            rows.append(row)
+            row_indexes.append(index)
+
+    if rows:
+        try:
+            # Um único INSERT em lote e um único commit para todo o lote
+            created_ids = db.session.scalars(
+                insert(Exploration).returning(Exploration.id, sort_by_parameter_order=True), rows
+            ).all()
+            for row in rows:
+                record_engagement(row["portal_id"], "exploration", row["created_at"])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return error_response(
+                "Erro ao criar explorações", "INTERNAL_ERROR", status_code=500
+            )
+
+        # Inserção em lote não dispara os eventos do mapper (tendências são registradas acima)
+        count_cache.invalidate("explorations", {"user_id": g.current_user_id})
+        for index, exploration_id in zip(row_indexes, created_ids):
+            results[index] = {"index": index, "status": "created", "id": exploration_id}
+
+    created = len(rows)
+    return success_response({
+        "results": results,
+        "created": created,
+        "failed": len(items) - created,
+    }, status_code=201 if created == len(items) else 207)
+
 @explorations_bp.route("/explorations/<int:exploration_id>", methods=["GET"])
 @auth_required
 def get_exploration(exploration_id):
@@ -1,5 +1,13 @@
-from flask import Blueprint
+from flask import Blueprint, Response
 from src.utils.helpers import success_response
+from src.utils.response_cache import response_cache
+from src.utils.fragments import fragment_cache
+from src.utils.events import event_pipeline
+from src.utils.views import view_counter
+from src.utils.trending import trending_engine
+from src.utils.auth import token_verifier
+from src.utils.log_pipeline import log_pipeline
+from src.utils.metrics import metrics, PROMETHEUS_CONTENT_TYPE
 from datetime import datetime
 
 health_bp = Blueprint('health', __name__)
@@ -15,3 +23,44 @@ def health_check():
         'version': '1.0.0'
     })
 
+@health_bp.route('/health/cache', methods=['GET'])
+def cache_stats():
+    """
+    Estatísticas de hit/miss do cache de respostas e do cache de portais serializados
+    """
+    return success_response({'cache': response_cache.stats(), 'fragments': fragment_cache.stats()})
+
+@health_bp.route('/health/events', methods=['GET'])
+def events_stats():
+    """
+    Estado do pipeline de eventos de analytics (fila, gravados, descartados)
+    """
+    return success_response({'events': event_pipeline.stats(), 'views': view_counter.stats()})
+
+@health_bp.route('/health/trending', methods=['GET'])
+def trending_stats():
+    """
+    Estado do motor de tendências (portais pontuados, marco do decaimento)
+    """
+    return success_response({'trending': trending_engine.stats()})
+
+@health_bp.route('/health/auth', methods=['GET'])
+def auth_stats():
+    """
+    Cache de verificação de tokens (hits/misses) e chaves públicas em uso
+    """
+    return success_response({'auth': token_verifier.stats()})
+
+@health_bp.route('/health/logging', methods=['GET'])
+def logging_stats():
+    """
+    Estado do pipeline de logs (fila, escritos, amostrados, descartados por nível)
+    """
+    return success_response({'logging': log_pipeline.stats()})
+
+@health_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Métricas de todos os workers no formato texto do Prometheus
+    """
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
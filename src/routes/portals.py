@@ -1,16 +1,29 @@
 from flask import Blueprint, request, g
-from src.models.user import db, User
+from src.models.user import db, User, user_portal_likes, user_portal_favorites
 from src.models.portal import Portal
 from src.models.category import Category
 from src.models.tag import Tag
 from src.models.review import Review
 from src.utils.auth import auth_required, optional_auth
 from src.utils.helpers import success_response, error_response, validate_required_fields, paginate_query, create_slug
+from src.utils.serializers import serialize_portal_fragments
+from src.utils.fragments import defer_portal_blobs
+from src.utils.counters import adjust_portal_counters, adjust_user_counters, get_portal_counter
+from src.utils.response_cache import response_cache
+from src.utils.search_index import filter_by_search
+from src.utils.geo_index import nearby
+from src.utils.clusters import query_clusters, CLUSTER_MAX_ZOOM
+from src.utils.views import count_portal_view
+from src.utils.trending import record_engagement
 
 portals_bp = Blueprint('portals', __name__)
 
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 500
+
 @portals_bp.route('/portals', methods=['GET'])
 @optional_auth
+@response_cache.cached(tags=['portals', 'users', 'categories'])
 def get_portals():
     """
     Lista portais com filtros e paginação
@@ -22,9 +35,12 @@ def get_portals():
     creator_id = request.args.get('creator_id')
     featured = request.args.get('featured', type=bool)
     search = request.args.get('search')
+    cursor = request.args.get('cursor')
+    include_total = request.args.get('include_total', 'false').lower() == 'true'
+    count_mode = request.args.get('count', 'cached')  # cached, exact ou estimate
     
-    # Query base
-    query = Portal.query.filter_by(is_public=True, is_active=True)
+    # Query base (ai_analysis/ar_effects só são lidos para portais fora do cache de trechos)
+    query = defer_portal_blobs(Portal.query.filter_by(is_public=True, is_active=True))
     
     # Aplicar filtros
     if category_id:
@@ -37,21 +53,128 @@ def get_portals():
         query = query.filter_by(is_featured=featured)
     
     if search:
-        query = query.filter(Portal.title.contains(search))
+        query = filter_by_search(query, Portal, 'portals', search)
     
     # Ordenação
     query = query.order_by(Portal.created_at.desc())
     
-    # Paginação
-    result = paginate_query(query, page, per_page)
+    # Paginação (por página ou por cursor, se 'cursor' for enviado)
+    result = paginate_query(
+        query, page, per_page,
+        cursor=cursor, keyset=(Portal.created_at, Portal.id), include_total=include_total,
+        count_key=('portals', {
+            'category_id': category_id,
+            'creator_id': creator_id,
+            'featured': featured,
+            'search': search
+        }),
+        count_mode=count_mode
+    )
     
     return success_response({
-        'portals': [portal.to_dict() for portal in result['items']],
+        'portals': serialize_portal_fragments(result['items']),
         'pagination': result['pagination']
     })
 
+@portals_bp.route('/portals/nearby', methods=['GET'])
+@optional_auth
+def get_nearby_portals():
+    """
+    Lista os portais públicos mais próximos de um ponto, por distância
+    """
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius = request.args.get('radius', NEARBY_DEFAULT_RADIUS_KM, type=float)
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    if lat is None or lng is None or not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        return error_response(
+            'Parâmetros lat e lng são obrigatórios e devem ser coordenadas válidas',
+            'VALIDATION_ERROR',
+            status_code=400
+        )
+    
+    if not 0 < radius <= NEARBY_MAX_RADIUS_KM or limit < 1:
+        return error_response(
+            f'radius deve estar entre 0 e {NEARBY_MAX_RADIUS_KM} km e limit deve ser positivo',
+            'VALIDATION_ERROR',
+            status_code=400
+        )
+    
+    query = Portal.query.filter_by(is_public=True, is_active=True)
+    nearest = nearby(query, lat, lng, radius, limit)
+    
+    portals = {
+        portal.id: portal
+        for portal in defer_portal_blobs(Portal.query.filter(Portal.id.in_([portal_id for portal_id, _ in nearest])))
+    }
+    ordered = [portals[portal_id] for portal_id, _ in nearest if portal_id in portals]
+    distances = {portal_id: {'distance_km': round(distance, 3)} for portal_id, distance in nearest}
+    
+    return success_response({
+        'portals': serialize_portal_fragments(ordered, extra=distances),
+        'center': {'lat': lat, 'lng': lng},
+        'radius_km': radius
+    })
+
+@portals_bp.route('/portals/clusters', methods=['GET'])
+@optional_auth
+@response_cache.cached(tags=['portals'])
+def get_portal_clusters():
+    """
+    Agrupa os portais públicos de uma área do mapa para o nível de zoom informado
+    bbox = oeste,sul,leste,norte (em graus)
+    """
+    zoom = request.args.get('zoom', type=int)
+    try:
+        west, south, east, north = [float(value) for value in request.args.get('bbox', '').split(',')]
+    except ValueError:
+        west = south = east = north = None
+    
+    if zoom is None or zoom < 0 or west is None:
+        return error_response(
+            'Parâmetros bbox (oeste,sul,leste,norte) e zoom são obrigatórios',
+            'VALIDATION_ERROR',
+            status_code=400
+        )
+    
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return error_response(
+            'bbox inválido',
+            'VALIDATION_ERROR',
+            status_code=400
+        )
+    
+    zoom = min(zoom, CLUSTER_MAX_ZOOM)
+    clusters = query_clusters(south, west, north, east, zoom)
+    
+    # Até CLUSTER_MAX_RESULTS portais: só as colunas do marcador do mapa, sem os blobs
+    representatives = {
+        row.id: row._asdict()
+        for row in db.session.query(
+            Portal.id, Portal.title, Portal.image_url, Portal.latitude, Portal.longitude
+        ).filter(Portal.id.in_([cluster.representative_id for cluster in clusters]))
+    }
+    
+    result = []
+    for cluster in clusters:
+        cluster_dict = cluster.to_dict()
+        cluster_dict['portal'] = representatives.get(cluster_dict.pop('representative_id'))
+        result.append(cluster_dict)
+    
+    return success_response({
+        'clusters': result,
+        'zoom': zoom
+    })
+
 @portals_bp.route('/portals/<int:portal_id>', methods=['GET'])
 @optional_auth
+@count_portal_view  # antes do cache: respostas em cache também contam
+@response_cache.cached(
+    # 'portals': o detalhe inclui category.portal_count, que muda com outros portais
+    tags=lambda portal_id: [f'portal:{portal_id}', 'portals', 'users', 'categories'],
+    vary_on_auth=True  # portais privados só aparecem para o criador
+)
 def get_portal(portal_id):
     """
     Obtém detalhes de um portal específico
@@ -141,7 +264,9 @@ def create_portal():
                 
                 portal.tags.append(tag)
         
+        adjust_user_counters(g.current_user_id, portals_count=1)
         db.session.commit()
+        response_cache.invalidate('portals', 'tags')
         return success_response({'portal': portal.to_dict()}, status_code=201)
     except Exception as e:
         db.session.rollback()
@@ -208,6 +333,7 @@ def update_portal(portal_id):
                 portal.tags.append(tag)
         
         db.session.commit()
+        response_cache.invalidate('portals', f'portal:{portal_id}', 'tags')
         return success_response({'portal': portal.to_dict()})
     except Exception as e:
         db.session.rollback()
@@ -242,7 +368,9 @@ def delete_portal(portal_id):
     
     try:
         db.session.delete(portal)
+        adjust_user_counters(portal.creator_id, portals_count=-1)
         db.session.commit()
+        response_cache.invalidate('portals', f'portal:{portal_id}', 'tags')
         return success_response(status_code=204)
     except Exception as e:
         db.session.rollback()
@@ -276,24 +404,33 @@ def toggle_like_portal(portal_id):
             status_code=404
         )
     
-    # Verificar se já curtiu
-    is_liked = portal in user.liked_portals
-    
     try:
-        if is_liked:
-            # Descurtir
-            user.liked_portals.remove(portal)
+        # Descurtir se já curtiu, sem carregar a coleção inteira
+        removed = db.session.execute(
+            user_portal_likes.delete().where(
+                user_portal_likes.c.user_id == user.id,
+                user_portal_likes.c.portal_id == portal_id
+            ).returning(user_portal_likes.c.created_at)
+        ).scalars().all()
+        
+        if removed:
             action = 'removed'
+            adjust_portal_counters(portal_id, likes_count=-len(removed))
+            # Retira do score de tendência a contribuição original
+            record_engagement(portal_id, 'like', removed[0], delta=-1)
         else:
             # Curtir
-            user.liked_portals.append(portal)
+            db.session.execute(user_portal_likes.insert().values(user_id=user.id, portal_id=portal_id))
             action = 'added'
+            adjust_portal_counters(portal_id, likes_count=1)
+            record_engagement(portal_id, 'like')
         
         db.session.commit()
+        response_cache.invalidate('portals', f'portal:{portal_id}')
         
         return success_response({
             'action': action,
-            'likes_count': len(portal.liked_by)
+            'likes_count': get_portal_counter(portal_id, 'likes_count')
         })
     except Exception as e:
         db.session.rollback()
@@ -327,24 +464,33 @@ def toggle_favorite_portal(portal_id):
             status_code=404
         )
     
-    # Verificar se já favoritou
-    is_favorited = portal in user.favorite_portals
-    
     try:
-        if is_favorited:
-            # Desfavoritar
-            user.favorite_portals.remove(portal)
+        # Desfavoritar se já favoritou, sem carregar a coleção inteira
+        removed = db.session.execute(
+            user_portal_favorites.delete().where(
+                user_portal_favorites.c.user_id == user.id,
+                user_portal_favorites.c.portal_id == portal_id
+            ).returning(user_portal_favorites.c.created_at)
+        ).scalars().all()
+        
+        if removed:
             action = 'removed'
+            adjust_portal_counters(portal_id, favorites_count=-len(removed))
+            # Retira do score de tendência a contribuição original
+            record_engagement(portal_id, 'favorite', removed[0], delta=-1)
         else:
             # Favoritar
-            user.favorite_portals.append(portal)
+            db.session.execute(user_portal_favorites.insert().values(user_id=user.id, portal_id=portal_id))
             action = 'added'
+            adjust_portal_counters(portal_id, favorites_count=1)
+            record_engagement(portal_id, 'favorite')
         
         db.session.commit()
+        response_cache.invalidate('portals', f'portal:{portal_id}')
         
         return success_response({
             'action': action,
-            'favorites_count': len(portal.favorited_by)
+            'favorites_count': get_portal_counter(portal_id, 'favorites_count')
         })
     except Exception as e:
         db.session.rollback()
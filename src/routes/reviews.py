@@ -4,6 +4,9 @@ from src.models.portal import Portal
 from src.models.review import Review
 from src.utils.auth import auth_required
 from src.utils.helpers import success_response, error_response, validate_required_fields, paginate_query
+from src.utils.serializers import serialize_reviews
+from src.utils.counters import adjust_portal_counters
+from src.utils.response_cache import response_cache
 
 reviews_bp = Blueprint("reviews", __name__)
 
@@ -20,12 +23,19 @@ def get_reviews_for_portal(portal_id):
 
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 20, type=int)
+    cursor = request.args.get("cursor")
+    include_total = request.args.get("include_total", "false").lower() == "true"
+    count_mode = request.args.get("count", "cached")  # cached, exact ou estimate
 
     query = Review.query.filter_by(portal_id=portal_id).order_by(Review.created_at.desc())
-    result = paginate_query(query, page, per_page)
+    result = paginate_query(
+        query, page, per_page,
+        cursor=cursor, keyset=(Review.created_at, Review.id), include_total=include_total,
+        count_key=("reviews", {"portal_id": portal_id}), count_mode=count_mode
+    )
 
     return success_response({
-        "reviews": [review.to_dict() for review in result["items"]],
+        "reviews": serialize_reviews(result["items"]),
         "pagination": result["pagination"],
     })
 
@@ -75,7 +85,9 @@ def create_review(portal_id):
 
     try:
         db.session.add(review)
+        adjust_portal_counters(portal_id, rating_count=1, rating_sum=review.rating)
         db.session.commit()
+        response_cache.invalidate("portals", f"portal:{portal_id}")
         return success_response({"review": review.to_dict()}, status_code=201)
     except Exception as e:
         db.session.rollback()
@@ -106,6 +118,8 @@ def update_review(review_id):
     if not data:
         return error_response("Dados JSON inválidos", "VALIDATION_ERROR", status_code=400)
 
+    previous_rating = review.rating
+
     updatable_fields = ["rating", "title", "comment"]
     for field in updatable_fields:
         if field in data:
@@ -117,7 +131,9 @@ def update_review(review_id):
         )
 
     try:
+        adjust_portal_counters(review.portal_id, rating_sum=review.rating - previous_rating)
         db.session.commit()
+        response_cache.invalidate("portals", f"portal:{review.portal_id}")
         return success_response({"review": review.to_dict()})
     except Exception as e:
         db.session.rollback()
@@ -146,7 +162,9 @@ def delete_review(review_id):
 
     try:
         db.session.delete(review)
+        adjust_portal_counters(review.portal_id, rating_count=-1, rating_sum=-review.rating)
         db.session.commit()
+        response_cache.invalidate("portals", f"portal:{review.portal_id}")
         return success_response(status_code=204)
     except Exception as e:
         db.session.rollback()
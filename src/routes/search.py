@@ -4,17 +4,23 @@ from src.models.portal import Portal
 from src.models.category import Category
 from src.models.tag import Tag
 from src.utils.helpers import success_response, error_response, paginate_query
-from sqlalchemy import or_
+from src.utils.serializers import serialize_portal_fragments, serialize_users, serialize_categories
+from src.utils.fragments import defer_portal_blobs
+from src.utils.response_cache import response_cache
+from src.utils.search_index import ranked_search, snippets, user_rowids
+from src.utils.suggestions import suggestion_index, refresh_if_stale
 
 search_bp = Blueprint("search", __name__)
 
 @search_bp.route("/search", methods=["GET"])
+@response_cache.cached(tags=["portals", "users", "categories", "tags"])
 def search():
     """
-    Busca global por portais, usuários e categorias
+    Busca global por portais, usuários, categorias e tags
+    (índice FTS5, resultados ordenados por relevância com trechos destacados)
     """
     query = request.args.get("q", "").strip()
-    search_type = request.args.get("type", "all")  # all, portals, users, categories
+    search_type = request.args.get("type", "all")  # all, portals, users, categories, tags
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 20, type=int)
     
@@ -27,55 +33,49 @@ def search():
     
     results = {}
     
+    def fetch(base_query, model, name):
+        # Página completa quando o tipo é específico, top 5 quando é "all"
+        ranked = ranked_search(base_query, model, name, query)
+        if search_type == name:
+            result = paginate_query(ranked, page, per_page)
+            results["pagination"] = result["pagination"]
+            return result["items"]
+        return ranked.limit(5).all()
+    
+    def add_snippets(name, items, rowids):
+        found = snippets(name, rowids, query)
+        for item, rowid in zip(items, rowids):
+            item["snippet"] = found.get(rowid)
+        return items
+    
     if search_type in ["all", "portals"]:
         # Buscar portais
-        portal_query = Portal.query.filter(
-            Portal.is_public == True,
-            Portal.is_active == True,
-            or_(
-                Portal.title.contains(query),
-                Portal.description.contains(query)
-            )
-        ).order_by(Portal.created_at.desc())
-        
-        if search_type == "portals":
-            portal_result = paginate_query(portal_query, page, per_page)
-            results["portals"] = [portal.to_dict() for portal in portal_result["items"]]
-            results["pagination"] = portal_result["pagination"]
-        else:
-            results["portals"] = [portal.to_dict() for portal in portal_query.limit(5).all()]
+        portals = fetch(
+            defer_portal_blobs(Portal.query.filter(Portal.is_public == True, Portal.is_active == True)),
+            Portal, "portals"
+        )
+        found = snippets("portals", [p.id for p in portals], query)
+        results["portals"] = serialize_portal_fragments(portals, extra={
+            p.id: {"snippet": found.get(p.id)} for p in portals
+        })
     
     if search_type in ["all", "users"]:
-        # Buscar usuários
-        user_query = User.query.filter(
-            or_(
-                User.name.contains(query),
-                User.bio.contains(query)
-            )
-        ).order_by(User.created_at.desc())
-        
-        if search_type == "users":
-            user_result = paginate_query(user_query, page, per_page)
-            results["users"] = [user.to_dict() for user in user_result["items"]]
-            results["pagination"] = user_result["pagination"]
-        else:
-            results["users"] = [user.to_dict() for user in user_query.limit(5).all()]
+        # Buscar usuários (o índice usa o rowid da tabela users)
+        users = fetch(User.query, User, "users")
+        rowids = user_rowids(user.id for user in users)
+        results["users"] = add_snippets("users", serialize_users(users), [rowids.get(u.id) for u in users])
     
     if search_type in ["all", "categories"]:
         # Buscar categorias
-        category_query = Category.query.filter(
-            or_(
-                Category.name.contains(query),
-                Category.description.contains(query)
-            )
-        ).order_by(Category.name)
-        
-        if search_type == "categories":
-            category_result = paginate_query(category_query, page, per_page)
-            results["categories"] = [cat.to_dict() for cat in category_result["items"]]
-            results["pagination"] = category_result["pagination"]
-        else:
-            results["categories"] = [cat.to_dict() for cat in category_query.limit(5).all()]
+        categories = fetch(Category.query, Category, "categories")
+        results["categories"] = add_snippets(
+            "categories", serialize_categories(categories), [c.id for c in categories]
+        )
+    
+    if search_type in ["all", "tags"]:
+        # Buscar tags
+        tags = fetch(Tag.query, Tag, "tags")
+        results["tags"] = add_snippets("tags", [tag.to_dict() for tag in tags], [t.id for t in tags])
     
     return success_response(results)
 
@@ -83,32 +83,30 @@ def search():
 def search_suggestions():
     """
     Sugestões de busca baseadas em termos populares
+    (índice de prefixos em memória, tolerante a erros de digitação)
     """
     query = request.args.get("q", "").strip()
     limit = request.args.get("limit", 10, type=int)
+    fuzzy = request.args.get("fuzzy", "true").lower() != "false"
+    
+    refresh_if_stale()
+    items = suggestion_index.suggest(query, limit=limit, fuzzy=fuzzy) if query else []
     
     suggestions = []
+    for item in items:
+        if item["text"] not in suggestions:
+            suggestions.append(item["text"])
     
-    if query:
-        # Buscar portais que começam com o termo
-        portal_suggestions = Portal.query.filter(
-            Portal.is_public == True,
-            Portal.is_active == True,
-            Portal.title.like(f"{query}%")
-        ).limit(limit).all()
-        
-        suggestions.extend([portal.title for portal in portal_suggestions])
-        
-        # Buscar tags que começam com o termo
-        tag_suggestions = Tag.query.filter(
-            Tag.name.like(f"{query}%")
-        ).limit(limit - len(suggestions)).all()
-        
-        suggestions.extend([tag.name for tag in tag_suggestions])
-    
-    return success_response({"suggestions": suggestions[:limit]})
+    return success_response({
+        "suggestions": suggestions,
+        "items": [
+            {"text": item["text"], "type": item["type"], "id": item["id"]}
+            for item in items
+        ]
+    })
 
 @search_bp.route("/tags", methods=["GET"])
+@response_cache.cached(tags=["tags", "portals"])
 def get_tags():
     """
     Lista tags populares
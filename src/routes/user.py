@@ -1,7 +1,9 @@
 from flask import Blueprint, request, g
-from src.models.user import db, User
+from src.models.user import db, User, user_follows
 from src.utils.auth import auth_required, optional_auth
 from src.utils.helpers import success_response, error_response, validate_required_fields
+from src.utils.counters import adjust_user_counters, get_user_counter
+from src.utils.response_cache import response_cache
 
 user_bp = Blueprint('users', __name__)
 
@@ -63,6 +65,7 @@ def update_user(user_id):
     
     try:
         db.session.commit()
+        response_cache.invalidate('users')
         return success_response({'user': user.to_dict()})
     except Exception as e:
         db.session.rollback()
@@ -128,6 +131,7 @@ def create_user():
     try:
         db.session.add(user)
         db.session.commit()
+        response_cache.invalidate('users')
         return success_response({'user': user.to_dict()}, status_code=201)
     except Exception as e:
         db.session.rollback()
@@ -167,24 +171,32 @@ def follow_user(user_id):
             status_code=404
         )
     
-    # Verificar se já está seguindo
-    is_following = target_user in current_user.following
-    
     try:
-        if is_following:
-            # Deixar de seguir
-            current_user.following.remove(target_user)
+        # Deixar de seguir se já segue, sem carregar a coleção inteira
+        removed = db.session.execute(
+            user_follows.delete().where(
+                user_follows.c.follower_id == current_user.id,
+                user_follows.c.followed_id == target_user.id
+            )
+        ).rowcount
+        
+        if removed:
             action = 'removed'
+            delta = -removed
         else:
             # Seguir
-            current_user.following.append(target_user)
+            db.session.execute(user_follows.insert().values(follower_id=current_user.id, followed_id=target_user.id))
             action = 'added'
+            delta = 1
         
+        adjust_user_counters(current_user.id, following_count=delta)
+        adjust_user_counters(target_user.id, followers_count=delta)
         db.session.commit()
+        response_cache.invalidate('users')
         
         return success_response({
             'action': action,
-            'followers_count': len(target_user.followers)
+            'followers_count': get_user_counter(target_user.id, 'followers_count')
         })
     except Exception as e:
         db.session.rollback()
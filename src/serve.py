@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Servidor de produção: ``python -m src.serve``
+
+Um processo mestre importa o app uma vez (criação do schema, índices e
+caches acontecem aqui) e faz fork dos workers, que compartilham os módulos
+já carregados (copy-on-write) e o mesmo socket de escuta. Cada worker abre
+as próprias conexões com o banco depois do fork.
+
+Sinais aceitos pelo mestre:
+    SIGTERM / SIGINT   encerramento gracioso: os workers terminam as
+                       requisições em andamento (até SERVE_GRACEFUL_TIMEOUT)
+    SIGHUP             recarga: os workers são drenados e o mestre se
+                       reexecuta (mesmo PID e mesmo socket), carregando o
+                       código novo; conexões que chegam nesse meio tempo
+                       esperam na fila do socket
+
+Configuração por variáveis de ambiente:
+    HOST                       endereço de escuta (padrão 0.0.0.0)
+    PORT                       porta (padrão 5000)
+    WEB_CONCURRENCY            número de workers (padrão: número de CPUs)
+    SERVE_THREADED             1 para atender requisições em threads dentro de cada worker (padrão 0)
+    SERVE_MAX_REQUESTS         recicla o worker depois de N requisições (padrão 1000, 0 desativa)
+    SERVE_MAX_REQUESTS_JITTER  variação aleatória de N, para os workers não reciclarem juntos (padrão 100)
+    SERVE_GRACEFUL_TIMEOUT     segundos para drenar requisições antes de forçar o fim (padrão 30)
+    SERVE_BACKLOG              fila de conexões do socket (padrão 2048)
+    METRICS_DIR                retratos de métricas dos workers (padrão: diretório temporário por porta)
+    RESPONSE_CACHE_BACKEND     padrão file (compartilhado entre os workers); memory só com um worker
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import atexit
+import random
+import signal
+import socket
+import logging
+import tempfile
+import threading
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 5000))
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 0)) or os.cpu_count() or 1
+SERVE_THREADED = os.environ.get('SERVE_THREADED', '0') == '1'
+SERVE_MAX_REQUESTS = int(os.environ.get('SERVE_MAX_REQUESTS', 1000))
+SERVE_MAX_REQUESTS_JITTER = int(os.environ.get('SERVE_MAX_REQUESTS_JITTER', 100))
+SERVE_GRACEFUL_TIMEOUT = float(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 30))
+SERVE_BACKLOG = int(os.environ.get('SERVE_BACKLOG', 2048))
+
+# Socket herdado na recarga (SIGHUP)
+LISTEN_FD_ENV = 'SERVE_LISTEN_FD'
+# Worker que morre antes disso é considerado falha de inicialização
+MIN_WORKER_LIFETIME = 1.0
+
+logger = logging.getLogger('src.serve')
+
+
+def create_socket():
+    """Socket de escuta compartilhado pelos workers (herdado se for uma recarga)"""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        sock = socket.socket(fileno=int(fd))
+    else:
+        sock = socket.create_server((HOST, PORT), backlog=SERVE_BACKLOG, reuse_port=False)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Worker:
+    """
+    Processo que atende requisições no socket compartilhado até receber
+    SIGTERM ou atingir o limite de requisições
+    """
+
+    def __init__(self, app, sock, max_requests):
+        self.app = app
+        self.sock = sock
+        self.max_requests = max_requests
+        self.handled = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def wsgi(self, environ, start_response):
+        # Conta requisições para reciclagem e espera das em andamento
+        with self._lock:
+            self.handled += 1
+            self.active += 1
+        try:
+            return ClosingIterator(self.app(environ, start_response), self._finished)
+        except BaseException:
+            self._finished()
+            raise
+
+    def _finished(self):
+        with self._lock:
+            self.active -= 1
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        _init_worker(self.app)
+
+        server = make_server(
+            HOST, PORT, self.wsgi, threaded=SERVE_THREADED, fd=self.sock.fileno()
+        )
+        # Acorda periodicamente para verificar se deve parar
+        server.timeout = 0.5
+        while not self._stopping and not (self.max_requests and self.handled >= self.max_requests):
+            server.handle_request()
+
+        # Drenagem: espera as requisições em andamento (modo com threads)
+        deadline = time.monotonic() + SERVE_GRACEFUL_TIMEOUT
+        while self.active and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+def _init_worker(app):
+    """
+    Prepara o processo filho: o pool de conexões herdado do mestre é
+    descartado sem fechar as conexões dele, e cada worker abre as próprias
+    """
+    from src.models.user import db
+    from src.utils.database import dispose_engines
+    with app.app_context():
+        dispose_engines(db, close=False)
+
+
+def _archive_metrics(pid):
+    # Importado aqui: METRICS_DIR é definido em main() antes do app ser importado
+    from src.utils.metrics import metrics
+    metrics.archive(pid)
+
+
+def _worker_main(app, sock, max_requests):
+    code = 0
+    try:
+        Worker(app, sock, max_requests).run()
+    except Exception:
+        logger.exception('Worker %s falhou', os.getpid())
+        code = 1
+    finally:
+        # Grava o que estiver pendente (eventos, visualizações) antes de sair
+        atexit._run_exitfuncs()
+        os._exit(code)
+
+
+class Arbiter:
+    """
+    Processo mestre: mantém WEB_CONCURRENCY workers vivos, recicla os que
+    terminam e trata os sinais de encerramento e recarga
+    """
+
+    def __init__(self, app, sock, workers=WEB_CONCURRENCY):
+        self.app = app
+        self.sock = sock
+        self.num_workers = workers
+        self.workers = {}
+        self._signal = None
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_write, False)
+
+    def _handle_signal(self, signum, frame):
+        if signum != signal.SIGCHLD:
+            self._signal = signum
+        try:
+            os.write(self._wakeup_write, b'.')
+        except BlockingIOError:
+            pass
+
+    def spawn(self):
+        max_requests = SERVE_MAX_REQUESTS
+        if max_requests and SERVE_MAX_REQUESTS_JITTER:
+            max_requests += random.randint(0, SERVE_MAX_REQUESTS_JITTER)
+        pid = os.fork()
+        if pid == 0:
+            os.close(self._wakeup_read)
+            os.close(self._wakeup_write)
+            _worker_main(self.app, self.sock, max_requests)
+        self.workers[pid] = time.monotonic()
+
+    def reap(self):
+        """Recolhe workers que terminaram. Retorna quantos morreram cedo demais."""
+        early = 0
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self.workers.pop(pid, None)
+            # Métricas do worker passam para o acumulado
+            _archive_metrics(pid)
+            if started is not None and os.waitstatus_to_exitcode(status) != 0:
+                if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                    early += 1
+                logger.warning('Worker %s terminou com status %s', pid, os.waitstatus_to_exitcode(status))
+        return early
+
+    def stop_workers(self, timeout=SERVE_GRACEFUL_TIMEOUT):
+        """Pede aos workers que terminem e força o fim depois do prazo"""
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout + 1
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.workers.pop(pid, None)
+
+    def reload(self):
+        """Drena os workers e reexecuta o mestre com o mesmo socket"""
+        logger.info('Recarregando (PID %s)', os.getpid())
+        self.stop_workers()
+        os.environ[LISTEN_FD_ENV] = str(self.sock.fileno())
+        os.execv(sys.executable, [sys.executable, '-m', 'src.serve'])
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, self._handle_signal)
+
+        logger.info(
+            'Servindo em %s:%s com %s worker(s) (PID %s)',
+            HOST, PORT, self.num_workers, os.getpid()
+        )
+        while True:
+            if self._signal in (signal.SIGTERM, signal.SIGINT):
+                logger.info('Encerrando: aguardando as requisições em andamento')
+                self.stop_workers()
+                return
+            if self._signal == signal.SIGHUP:
+                self.reload()
+
+            if self.reap():
+                # Falha na inicialização dos workers: evita um loop de forks
+                time.sleep(MIN_WORKER_LIFETIME)
+            while len(self.workers) < self.num_workers:
+                self.spawn()
+
+            try:
+                os.read(self._wakeup_read, 64)
+            except InterruptedError:
+                pass
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(levelname)s %(message)s')
+    # O log de acesso vem do app (pipeline em segundo plano, com amostragem);
+    # o do werkzeug escreveria de novo, de forma síncrona, cada requisição
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    sock = create_socket()
+
+    # Métricas somadas entre os workers: cada um grava um retrato neste diretório
+    os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f'portales-metrics-{PORT}'))
+    # O cache em memória é por processo: uma invalidação só chegaria ao worker
+    # que atendeu a escrita, e os outros serviriam portais já privados ou
+    # apagados até o TTL
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'file')
+    if os.environ['RESPONSE_CACHE_BACKEND'] == 'memory' and WEB_CONCURRENCY > 1:
+        logger.error(
+            'RESPONSE_CACHE_BACKEND=memory não é compartilhado entre os %s workers; use file ou none',
+            WEB_CONCURRENCY
+        )
+        sys.exit(1)
+
+    # Pré-carregamento: importa o app (schema, índices, caches) antes do fork
+    from src.main import app
+    from src.utils.metrics import metrics
+    # Retratos de uma execução anterior não entram na soma
+    metrics.clear_directory()
+    from src.models.user import db
+    from src.utils.database import dispose_engines
+    with app.app_context():
+        # Nenhuma conexão aberta no mestre é compartilhada com os workers
+        dispose_engines(db)
+
+    Arbiter(app, sock).run()
+
+
+if __name__ == '__main__':
+    main()
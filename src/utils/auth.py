@@ -1,8 +1,20 @@
 import firebase_admin
 from firebase_admin import credentials, auth
-from flask import request, jsonify, g
+from flask import request, g
 from functools import wraps
+from src.utils.negotiation import make_response
+from collections import OrderedDict
 import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import jwt
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
 
 # Inicializar Firebase Admin SDK
 # Em produção, você deve usar um arquivo de credenciais do Firebase
@@ -14,23 +26,314 @@ except Exception as e:
     print(f"Firebase não inicializado: {e}")
     print("Usando modo de desenvolvimento sem Firebase")
 
-def verify_firebase_token(token):
+# Verificação de tokens:
+#     AUTH_MODE                 'mock' (desenvolvimento, padrão) ou 'firebase' (RS256)
+#     FIREBASE_PROJECT_ID       projeto Firebase (audience/issuer dos tokens)
+#     AUTH_CERTS_URL            certificados públicos do Google (x509 ou JWKS)
+#     AUTH_KEYS_FILE            arquivo local com as chaves, no lugar da URL (testes offline)
+#     AUTH_TOKEN_CACHE_SIZE     tokens verificados mantidos em memória (padrão 10000)
+#     AUTH_NEGATIVE_TTL         segundos que um token inválido fica em cache (padrão 30)
+#     AUTH_KEYS_REFRESH_MARGIN  renova as chaves em segundo plano quando faltar isso para expirarem (padrão 300)
+AUTH_MODE = os.environ.get('AUTH_MODE', 'mock')
+FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID') or os.environ.get('GOOGLE_CLOUD_PROJECT')
+AUTH_CERTS_URL = os.environ.get(
+    'AUTH_CERTS_URL',
+    'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+)
+AUTH_KEYS_FILE = os.environ.get('AUTH_KEYS_FILE')
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_NEGATIVE_TTL = float(os.environ.get('AUTH_NEGATIVE_TTL', 30))
+AUTH_KEYS_REFRESH_MARGIN = float(os.environ.get('AUTH_KEYS_REFRESH_MARGIN', 300))
+# Validade das chaves quando a resposta não traz Cache-Control
+AUTH_KEYS_DEFAULT_MAX_AGE = 3600
+# Intervalo mínimo entre buscas forçadas (kid desconhecido ou falha)
+AUTH_KEYS_MIN_REFRESH_INTERVAL = 30
+# Tolerância de relógio na validação de exp/iat
+AUTH_CLOCK_LEEWAY = 10
+# Tokens de desenvolvimento não expiram; ficam em cache por este tempo
+MOCK_TOKEN_TTL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class KeyCache:
     """
-    Verifica o token Firebase JWT
-    Em desenvolvimento, retorna um usuário mock
+    Chaves públicas de verificação por ``kid``, buscadas na URL de
+    certificados (ou em um arquivo local) e válidas pelo ``max-age`` do
+    Cache-Control. Perto de expirar, a renovação acontece em segundo plano e
+    as chaves atuais continuam em uso; se a busca falhar, as chaves antigas
+    são mantidas.
     """
-    try:
-        # Em produção, descomente esta linha:
-        # decoded_token = auth.verify_id_token(token)
-        # return decoded_token['uid']
-        
+
+    def __init__(self, url=AUTH_CERTS_URL, path=None, fetcher=None):
+        self.url = url
+        self.path = path
+        self.fetcher = fetcher or (self._read_file if path else self._fetch_url)
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.fetches = 0
+        self.failures = 0
+
+    def _fetch_url(self):
+        response = requests.get(self.url, timeout=5)
+        response.raise_for_status()
+        return response.json(), _max_age(response.headers)
+
+    def _read_file(self):
+        with open(self.path) as keys_file:
+            return json.load(keys_file), AUTH_KEYS_DEFAULT_MAX_AGE
+
+    def refresh(self):
+        """Busca as chaves agora. Retorna True se conseguiu."""
+        self._last_attempt = time.monotonic()
+        try:
+            payload, max_age = self.fetcher()
+            keys = parse_keys(payload)
+        except Exception:
+            self.failures += 1
+            logger.exception('Falha ao buscar chaves públicas de autenticação')
+            return False
+        with self._lock:
+            self._keys = keys
+            self._expires_at = time.monotonic() + max_age
+            self.fetches += 1
+        return True
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='auth-keys', daemon=True).start()
+
+    def get(self, kid):
+        """Chave pública de ``kid`` (ou None se ela não existir)"""
+        now = time.monotonic()
+        remaining = self._expires_at - now
+        can_retry = now - self._last_attempt >= AUTH_KEYS_MIN_REFRESH_INTERVAL
+        if remaining <= 0 and (not self._keys or can_retry):
+            # Sem chaves válidas: a requisição espera pela busca
+            self.refresh()
+            can_retry = False
+        elif remaining < AUTH_KEYS_REFRESH_MARGIN:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and can_retry:
+            # Kid desconhecido: as chaves podem ter sido trocadas antes do previsto
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def stats(self):
+        return {
+            'keys': len(self._keys),
+            'expires_in': max(0, round(self._expires_at - time.monotonic())),
+            'fetches': self.fetches,
+            'failures': self.failures
+        }
+
+
+def _max_age(headers):
+    """Validade (segundos) de uma resposta pelo Cache-Control e Age"""
+    cache_control = headers.get('Cache-Control', '')
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return 0
+    match = re.search(r'max-age=(\d+)', cache_control)
+    if not match:
+        return AUTH_KEYS_DEFAULT_MAX_AGE
+    return max(0, int(match.group(1)) - int(headers.get('Age', 0) or 0))
+
+
+def parse_keys(payload):
+    """
+    {kid: chave pública} a partir de um JWKS ({"keys": [...]}) ou do formato
+    do Google ({kid: certificado PEM})
+    """
+    if 'keys' in payload:
+        return {
+            jwk['kid']: jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(jwk))
+            for jwk in payload['keys'] if jwk.get('kid')
+        }
+    keys = {}
+    for kid, pem in payload.items():
+        data = pem.encode()
+        if b'BEGIN CERTIFICATE' in data:
+            keys[kid] = x509.load_pem_x509_certificate(data).public_key()
+        else:
+            keys[kid] = load_pem_public_key(data)
+    return keys
+
+
+class TokenCache:
+    """
+    LRU de hash do token -> claims decodificadas, cada entrada válida até o
+    ``exp`` do token. Tokens inválidos também ficam em cache, por pouco tempo,
+    para que repetições não refaçam a verificação.
+    """
+
+    def __init__(self, max_size=AUTH_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(token):
+        # Só o hash fica em memória, nunca o token
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key):
+        """(encontrado, claims); claims é None para um token inválido em cache"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, claims, expires_at):
+        if self.max_size <= 0 or expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class _KeyUnavailable(Exception):
+    """Chave do token indisponível (busca falhou ou kid novo dentro do intervalo mínimo)"""
+
+
+class TokenVerifier:
+    """
+    Verifica tokens de ID do Firebase localmente (RS256 com as chaves em
+    cache) e guarda o resultado no cache de tokens
+    """
+
+    def __init__(self, mode=AUTH_MODE, project_id=FIREBASE_PROJECT_ID, key_cache=None, token_cache=None):
+        # Sem projeto, audience/issuer nunca conferem e todo token seria recusado
+        if mode == 'firebase' and not project_id:
+            raise RuntimeError('AUTH_MODE=firebase exige FIREBASE_PROJECT_ID (ou GOOGLE_CLOUD_PROJECT)')
+        self.mode = mode
+        self.project_id = project_id
+        self.key_cache = key_cache or KeyCache(path=AUTH_KEYS_FILE)
+        self.token_cache = token_cache or TokenCache()
+        self.verifications = 0
+        self.rejections = 0
+
+    def _decode_mock(self, token):
         # Para desenvolvimento, vamos simular a verificação
         if token == "mock_token":
-            return "mock_user_id"
+            uid = "mock_user_id"
         elif token.startswith("user_"):
-            return token
+            uid = token
         else:
             return None
+        return {'uid': uid, 'sub': uid, 'exp': time.time() + MOCK_TOKEN_TTL}
+
+    def _decode_firebase(self, token):
+        header = jwt.get_unverified_header(token)
+        if header.get('alg') != 'RS256':
+            return None
+        key = self.key_cache.get(header.get('kid'))
+        if key is None:
+            raise _KeyUnavailable()
+        claims = jwt.decode(
+            token, key, algorithms=['RS256'],
+            audience=self.project_id,
+            issuer=f'https://securetoken.google.com/{self.project_id}',
+            leeway=AUTH_CLOCK_LEEWAY,
+            options={'require': ['exp', 'iat', 'sub', 'aud', 'iss']}
+        )
+        if not claims['sub'] or len(claims['sub']) > 128:
+            return None
+        claims['uid'] = claims['sub']
+        return claims
+
+    def verify(self, token):
+        """Claims do token (com 'uid'), ou None se ele for inválido"""
+        cache_key = self.token_cache.key(token)
+        found, claims = self.token_cache.get(cache_key)
+        if found:
+            return claims
+
+        self.verifications += 1
+        try:
+            if self.mode == 'firebase':
+                claims = self._decode_firebase(token)
+            else:
+                claims = self._decode_mock(token)
+        except jwt.InvalidTokenError:
+            claims = None
+        except _KeyUnavailable:
+            # Falha nossa, não do token: sem cache negativo, para que ele
+            # volte a ser aceito assim que as chaves forem obtidas
+            self.rejections += 1
+            return None
+
+        if claims is None:
+            self.rejections += 1
+            self.token_cache.set(cache_key, None, time.time() + AUTH_NEGATIVE_TTL)
+        else:
+            self.token_cache.set(cache_key, claims, claims['exp'])
+        return claims
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'verifications': self.verifications,
+            'rejections': self.rejections,
+            'tokens': self.token_cache.stats(),
+            'keys': self.key_cache.stats() if self.mode == 'firebase' else None
+        }
+
+
+token_verifier = TokenVerifier()
+
+
+def verify_firebase_token(token):
+    """
+    Verifica o token Firebase JWT (com cache de tokens e de chaves)
+    Em desenvolvimento (AUTH_MODE=mock), aceita tokens mock
+    """
+    try:
+        claims = token_verifier.verify(token)
+        return claims['uid'] if claims else None
     except Exception as e:
         print(f"Erro ao verificar token: {e}")
         return None
@@ -44,7 +347,7 @@ def auth_required(f):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
-            return jsonify({
+            return make_response({
                 'success': False,
                 'error': 'Token de autorização ausente',
                 'error_code': 'AUTHENTICATION_ERROR'
@@ -54,7 +357,7 @@ def auth_required(f):
             # Extrair token do header "Bearer <token>"
             token = auth_header.split(' ')[1]
         except IndexError:
-            return jsonify({
+            return make_response({
                 'success': False,
                 'error': 'Formato de token inválido',
                 'error_code': 'AUTHENTICATION_ERROR'
@@ -63,7 +366,7 @@ def auth_required(f):
         user_id = verify_firebase_token(token)
         
         if not user_id:
-            return jsonify({
+            return make_response({
                 'success': False,
                 'error': 'Token inválido ou expirado',
                 'error_code': 'AUTHENTICATION_ERROR'
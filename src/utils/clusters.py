@@ -0,0 +1,355 @@
+"""
+Índice hierárquico de clusters do mapa.
+
+Para cada nível de zoom (0 a CLUSTER_MAX_ZOOM) o mundo é dividido em uma grade
+na projeção Web Mercator, com CLUSTER_CELLS_PER_TILE células por tile em cada
+eixo. A tabela ``portal_clusters`` guarda, por célula, quantos portais
+públicos ela contém, a soma das coordenadas (para o centróide) e um portal
+representativo (o mais curtido).
+
+O índice é atualizado dentro da mesma transação quando um portal é criado,
+movido, muda de visibilidade ou é removido (eventos do mapper). Curtidas
+mudam ``likes_count`` por UPDATE direto, sem eventos: ``adjust_portal_counters``
+chama ``update_cluster_representative`` para manter o representativo. Ajustes
+em massa (``reconcile_counters``, inserts em lote) exigem
+``rebuild_cluster_index``.
+"""
+
+import os
+import math
+import numpy as np
+from sqlalchemy import event, inspect, or_, and_, case, func, bindparam, delete, update
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import db
+from src.models.portal import Portal
+from src.models.cluster import PortalCluster
+from src.utils.geo_index import within_box
+
+CLUSTER_MAX_ZOOM = int(os.environ.get('CLUSTER_MAX_ZOOM', 16))
+CLUSTER_CELLS_PER_TILE = int(os.environ.get('CLUSTER_CELLS_PER_TILE', 4))
+# Limite de clusters devolvidos por requisição (os maiores primeiro)
+CLUSTER_MAX_RESULTS = int(os.environ.get('CLUSTER_MAX_RESULTS', 2000))
+
+MAX_MERCATOR_LATITUDE = 85.05112878
+
+_clusters = PortalCluster.__table__
+_WATCHED = ('latitude', 'longitude', 'is_public', 'is_active')
+
+
+def grid_size(zoom):
+    return (1 << zoom) * CLUSTER_CELLS_PER_TILE
+
+
+def _mercator(lat, lng):
+    """Coordenadas normalizadas (0 a 1) na projeção Web Mercator"""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE)
+    lng = np.asarray(lng, dtype=np.float64)
+    x = (lng + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def cells(lat, lng, zoom):
+    """Célula (x, y) de um ou mais pontos em um nível de zoom"""
+    size = grid_size(zoom)
+    x, y = _mercator(lat, lng)
+    cell_x = np.clip(np.floor(x * size), 0, size - 1).astype(np.int64)
+    cell_y = np.clip(np.floor(y * size), 0, size - 1).astype(np.int64)
+    return cell_x, cell_y
+
+
+def _point_cells(lat, lng):
+    """[(zoom, cell_x, cell_y)] de um ponto em todos os níveis"""
+    result = []
+    for zoom in range(CLUSTER_MAX_ZOOM + 1):
+        cell_x, cell_y = cells(lat, lng, zoom)
+        result.append((zoom, int(cell_x), int(cell_y)))
+    return result
+
+
+def _is_clustered(values):
+    return (
+        values['latitude'] is not None and values['longitude'] is not None
+        and bool(values['is_public']) and bool(values['is_active'])
+    )
+
+
+# --- Manutenção incremental --------------------------------------------------
+
+def _add(connection, portal_id, values):
+    lat, lng = values['latitude'], values['longitude']
+    score = values['likes_count'] or 0
+    statement = insert(_clusters)
+    statement = statement.on_conflict_do_update(
+        index_elements=['zoom', 'cell_x', 'cell_y'],
+        set_={
+            'count': _clusters.c.count + 1,
+            'latitude_sum': _clusters.c.latitude_sum + statement.excluded.latitude_sum,
+            'longitude_sum': _clusters.c.longitude_sum + statement.excluded.longitude_sum,
+            'representative_id': case(
+                (statement.excluded.representative_score > _clusters.c.representative_score,
+                 statement.excluded.representative_id),
+                else_=_clusters.c.representative_id
+            ),
+            'representative_score': func.max(_clusters.c.representative_score, statement.excluded.representative_score),
+        }
+    )
+    connection.execute(statement, [
+        {
+            'zoom': zoom, 'cell_x': cell_x, 'cell_y': cell_y, 'count': 1,
+            'latitude_sum': lat, 'longitude_sum': lng,
+            'representative_id': portal_id, 'representative_score': score,
+        }
+        for zoom, cell_x, cell_y in _point_cells(lat, lng)
+    ])
+
+
+def _remove(connection, portal_id, values):
+    lat, lng = values['latitude'], values['longitude']
+    point_cells = _point_cells(lat, lng)
+    in_cell = and_(
+        _clusters.c.zoom == bindparam('b_zoom'),
+        _clusters.c.cell_x == bindparam('b_cell_x'),
+        _clusters.c.cell_y == bindparam('b_cell_y')
+    )
+    params = [{'b_zoom': zoom, 'b_cell_x': cell_x, 'b_cell_y': cell_y} for zoom, cell_x, cell_y in point_cells]
+
+    connection.execute(
+        update(_clusters).where(in_cell).values(
+            count=_clusters.c.count - 1,
+            latitude_sum=_clusters.c.latitude_sum - lat,
+            longitude_sum=_clusters.c.longitude_sum - lng
+        ),
+        params
+    )
+    # Só as células recém-decrementadas (pela chave primária), sem varrer a tabela
+    connection.execute(delete(_clusters).where(in_cell, _clusters.c.count <= 0), params)
+
+    # Células em que o portal removido era o representativo escolhem outro
+    orphaned = connection.execute(
+        _clusters.select().with_only_columns(_clusters.c.zoom, _clusters.c.cell_x, _clusters.c.cell_y).where(
+            _clusters.c.representative_id == portal_id
+        )
+    ).all()
+    for zoom, cell_x, cell_y in orphaned:
+        representative = _pick_representative(connection, zoom, cell_x, cell_y, exclude_id=portal_id)
+        connection.execute(
+            update(_clusters).where(
+                _clusters.c.zoom == zoom, _clusters.c.cell_x == cell_x, _clusters.c.cell_y == cell_y
+            ).values(
+                representative_id=representative[0] if representative else None,
+                representative_score=representative[1] if representative else 0
+            )
+        )
+
+
+def update_cluster_representative(connection, portal_id, delta):
+    """
+    Reavalia o representativo das células de um portal depois que as curtidas
+    dele mudaram em ``delta`` (mesmo critério de ``rebuild_cluster_index``:
+    mais curtidas, empate pelo menor id)
+    """
+    portals = Portal.__table__
+    portal = connection.execute(
+        portals.select().with_only_columns(
+            portals.c.latitude, portals.c.longitude, portals.c.is_public, portals.c.is_active, portals.c.likes_count
+        ).where(portals.c.id == portal_id)
+    ).mappings().first()
+    if portal is None or not _is_clustered(portal):
+        return
+    score = portal['likes_count'] or 0
+    params = [
+        {'b_zoom': zoom, 'b_cell_x': cell_x, 'b_cell_y': cell_y}
+        for zoom, cell_x, cell_y in _point_cells(portal['latitude'], portal['longitude'])
+    ]
+    in_cell = and_(
+        _clusters.c.zoom == bindparam('b_zoom'),
+        _clusters.c.cell_x == bindparam('b_cell_x'),
+        _clusters.c.cell_y == bindparam('b_cell_y')
+    )
+
+    # Assume as células em que passou o representativo (ou em que já era)
+    connection.execute(
+        update(_clusters).where(in_cell, or_(
+            _clusters.c.representative_id == portal_id,
+            _clusters.c.representative_id.is_(None),
+            _clusters.c.representative_score < score,
+            and_(_clusters.c.representative_score == score, _clusters.c.representative_id > portal_id)
+        )).values(representative_id=portal_id, representative_score=score),
+        params
+    )
+
+    if delta >= 0:
+        return
+
+    # Com menos curtidas, outro portal da célula pode ter passado à frente
+    held = connection.execute(
+        _clusters.select().with_only_columns(_clusters.c.zoom, _clusters.c.cell_x, _clusters.c.cell_y).where(
+            _clusters.c.representative_id == portal_id
+        )
+    ).all()
+    for zoom, cell_x, cell_y in held:
+        representative = _pick_representative(connection, zoom, cell_x, cell_y, min_score=score)
+        if representative and (representative[1] > score or representative[0] < portal_id):
+            connection.execute(
+                update(_clusters).where(
+                    _clusters.c.zoom == zoom, _clusters.c.cell_x == cell_x, _clusters.c.cell_y == cell_y
+                ).values(representative_id=representative[0], representative_score=representative[1])
+            )
+
+
+def cell_bounds(zoom, cell_x, cell_y):
+    """(sul, oeste, norte, leste) de uma célula, em graus"""
+    size = grid_size(zoom)
+
+    def latitude(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / size))))
+
+    west = cell_x / size * 360.0 - 180.0
+    east = (cell_x + 1) / size * 360.0 - 180.0
+    return latitude(cell_y + 1), west, latitude(cell_y), east
+
+
+def _pick_representative(connection, zoom, cell_x, cell_y, exclude_id=None, min_score=0):
+    """(id, curtidas) do portal mais curtido da célula, com ao menos ``min_score`` curtidas"""
+    south, west, north, east = cell_bounds(zoom, cell_x, cell_y)
+    portals = Portal.__table__
+    query = portals.select().with_only_columns(
+        portals.c.id, portals.c.likes_count, portals.c.latitude, portals.c.longitude
+    ).where(
+        portals.c.is_public == True, portals.c.is_active == True,
+        within_box(portals.c, south, north, [(west, east)]),
+        portals.c.id != exclude_id,
+        portals.c.likes_count >= min_score
+    ).order_by(portals.c.likes_count.desc(), portals.c.id)
+
+    # A caixa pode incluir pontos da borda das células vizinhas
+    for portal_id, likes, lat, lng in connection.execute(query):
+        x, y = cells(lat, lng, zoom)
+        if int(x) == cell_x and int(y) == cell_y:
+            return portal_id, likes or 0
+    return None
+
+
+def _values(target, use_old=False):
+    state = inspect(target)
+    values = {'likes_count': target.likes_count}
+    for attr in _WATCHED:
+        history = state.attrs[attr].history
+        if use_old and history.deleted:
+            values[attr] = history.deleted[0]
+        else:
+            values[attr] = getattr(target, attr)
+    return values
+
+
+@event.listens_for(Portal, 'after_insert')
+def _portal_inserted(mapper, connection, target):
+    values = _values(target)
+    if _is_clustered(values):
+        _add(connection, target.id, values)
+
+
+@event.listens_for(Portal, 'after_update')
+def _portal_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[attr].history.has_changes() for attr in _WATCHED):
+        return
+    old, new = _values(target, use_old=True), _values(target)
+    if _is_clustered(old):
+        _remove(connection, target.id, old)
+    if _is_clustered(new):
+        _add(connection, target.id, new)
+
+
+@event.listens_for(Portal, 'after_delete')
+def _portal_deleted(mapper, connection, target):
+    values = _values(target, use_old=True)
+    if _is_clustered(values):
+        _remove(connection, target.id, values)
+
+
+# --- Reconstrução e consulta -------------------------------------------------
+
+def rebuild_cluster_index():
+    """
+    Recalcula todas as células a partir da tabela de portais.
+    Retorna o número de portais indexados.
+    """
+    rows = db.session.query(Portal.id, Portal.latitude, Portal.longitude, Portal.likes_count).filter(
+        Portal.is_public == True, Portal.is_active == True,
+        Portal.latitude.isnot(None), Portal.longitude.isnot(None)
+    ).all()
+
+    db.session.execute(delete(_clusters))
+    connection = db.session.connection()
+    insert_sql = (
+        'INSERT INTO portal_clusters (zoom, cell_x, cell_y, count, latitude_sum, longitude_sum, '
+        'representative_id, representative_score) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+    )
+    if rows:
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        lats = np.array([row[1] for row in rows], dtype=np.float64)
+        lngs = np.array([row[2] for row in rows], dtype=np.float64)
+        likes = np.array([row[3] or 0 for row in rows], dtype=np.int64)
+
+        # Mais curtidos primeiro: a primeira ocorrência de cada célula é o representativo
+        order = np.lexsort((ids, -likes))
+        ids, lats, lngs, likes = ids[order], lats[order], lngs[order], likes[order]
+
+        for zoom in range(CLUSTER_MAX_ZOOM + 1):
+            cell_x, cell_y = cells(lats, lngs, zoom)
+            keys = cell_x * grid_size(zoom) + cell_y
+            unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            counts = np.bincount(inverse)
+            lat_sums = np.bincount(inverse, weights=lats)
+            lng_sums = np.bincount(inverse, weights=lngs)
+            # Milhares de linhas por nível: executemany direto no driver
+            connection.exec_driver_sql(insert_sql, list(zip(
+                [zoom] * len(unique_keys),
+                cell_x[first].tolist(), cell_y[first].tolist(), counts.tolist(),
+                lat_sums.tolist(), lng_sums.tolist(),
+                ids[first].tolist(), likes[first].tolist()
+            )))
+
+    db.session.commit()
+    return len(rows)
+
+
+def ensure_cluster_index():
+    """
+    Constrói o índice se ele estiver vazio e houver portais para agrupar
+    (banco criado antes do índice ou populado por inserts em lote).
+    Deve ser chamado dentro de um app context.
+    """
+    if PortalCluster.query.first() is not None:
+        return
+    has_portals = Portal.query.filter(
+        Portal.is_public == True, Portal.is_active == True,
+        Portal.latitude.isnot(None), Portal.longitude.isnot(None)
+    ).first() is not None
+    if has_portals:
+        rebuild_cluster_index()
+
+
+def query_clusters(south, west, north, east, zoom):
+    """
+    Clusters do nível ``zoom`` que cobrem a caixa informada. Se oeste > leste,
+    a caixa cruza o antimeridiano.
+    """
+    zoom = max(0, min(zoom, CLUSTER_MAX_ZOOM))
+    top_x, top_y = cells(north, west, zoom)
+    bottom_x, bottom_y = cells(south, east, zoom)
+    top_x, top_y, bottom_x, bottom_y = int(top_x), int(top_y), int(bottom_x), int(bottom_y)
+
+    if west <= east:
+        x_ranges = [(top_x, bottom_x)]
+    else:
+        x_ranges = [(top_x, grid_size(zoom) - 1), (0, bottom_x)]
+
+    return PortalCluster.query.filter(
+        PortalCluster.zoom == zoom,
+        PortalCluster.cell_y.between(top_y, bottom_y),
+        or_(*[PortalCluster.cell_x.between(low, high) for low, high in x_ranges])
+    ).order_by(PortalCluster.count.desc()).limit(CLUSTER_MAX_RESULTS).all()
@@ -0,0 +1,213 @@
+"""
+Cache dos totais (COUNT(*)) das listagens paginadas.
+
+Cada total é guardado por assinatura de filtro, por exemplo
+``('portals', {'category_id': 3, 'featured': True})``, com um TTL curto.
+Inserções e remoções de portais, reviews e explorações invalidam apenas as
+assinaturas que a linha alterada pode afetar, depois do commit.
+
+O modo ``estimate`` devolve um total aproximado sem contar a tabela inteira.
+"""
+
+import os
+import time
+import threading
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, object_session
+from src.models.user import db
+from src.models.portal import Portal
+from src.models.review import Review
+from src.models.exploration import Exploration
+
+COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL', 30))
+# Totais expirados ainda servem como estimativa durante esta janela
+COUNT_CACHE_STALE_TTL = float(os.environ.get('COUNT_CACHE_STALE_TTL', 600))
+# Até este limite o modo estimate conta de forma exata
+ESTIMATE_EXACT_LIMIT = int(os.environ.get('COUNT_ESTIMATE_EXACT_LIMIT', 1000))
+# Tamanho da janela de ids amostrada para extrapolar o total
+ESTIMATE_SAMPLE_SIZE = int(os.environ.get('COUNT_ESTIMATE_SAMPLE_SIZE', 10000))
+# Limite de assinaturas guardadas (as mais antigas são descartadas)
+COUNT_CACHE_MAX_ENTRIES = int(os.environ.get('COUNT_CACHE_MAX_ENTRIES', 10000))
+
+COUNT_MODES = ('cached', 'exact', 'estimate')
+
+# Campo da assinatura -> atributo do modelo, por entidade
+SIGNATURE_FIELDS = {
+    'portals': {'category_id': 'category_id', 'creator_id': 'creator_id', 'featured': 'is_featured'},
+    'reviews': {'portal_id': 'portal_id'},
+    'explorations': {'user_id': 'user_id'},
+}
+
+# Colunas que, se alteradas, mudam em qual listagem a linha aparece
+_VISIBILITY_FIELDS = {
+    'portals': ('is_public', 'is_active'),
+    'reviews': (),
+    'explorations': (),
+}
+
+_MODELS = {'portals': Portal, 'reviews': Review, 'explorations': Exploration}
+
+
+class CountCache:
+    """
+    Cache em memória de totais por (entidade, assinatura de filtro)
+    """
+
+    def __init__(self, ttl=COUNT_CACHE_TTL, stale_ttl=COUNT_CACHE_STALE_TTL, max_entries=COUNT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(entity, signature):
+        return entity, tuple(sorted((k, v) for k, v in signature.items() if v is not None))
+
+    def get(self, entity, signature, allow_stale=False):
+        """
+        Retorna (total, is_fresh) ou None
+        """
+        key = self.make_key(entity, signature)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, total = entry
+        age = time.monotonic() - stored_at
+        if age <= self.ttl:
+            return total, True
+        if allow_stale and age <= self.stale_ttl:
+            return total, False
+        return None
+
+    def set(self, entity, signature, total):
+        key = self.make_key(entity, signature)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic(), total)
+            # dict mantém ordem de inserção: os primeiros são os mais antigos
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, entity, row=None):
+        """
+        Remove os totais afetados por uma linha inserida/removida.
+        Sem ``row``, remove todos os totais da entidade.
+        """
+        fields = SIGNATURE_FIELDS[entity]
+
+        def affected(signature):
+            for name, value in signature:
+                if name == 'search':
+                    # Não dá para avaliar a busca aqui: invalidar por segurança
+                    return True
+                if name in fields and row.get(fields[name]) != value:
+                    return False
+            return True
+
+        with self._lock:
+            for key in list(self._entries):
+                key_entity, signature = key
+                if key_entity == entity and (row is None or affected(signature)):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+def _estimate_total(query):
+    """
+    Estima o total sem COUNT(*) completo: conta exato até um limite pequeno
+    e, acima dele, extrapola a partir de uma janela dos ids mais recentes.
+    Retorna (total, is_estimate).
+    """
+    bounded = query.order_by(None).limit(ESTIMATE_EXACT_LIMIT + 1).subquery()
+    sample_total = db.session.query(func.count()).select_from(bounded).scalar()
+    if sample_total <= ESTIMATE_EXACT_LIMIT:
+        return sample_total, False
+
+    model = query.column_descriptions[0]['entity']
+    max_id = db.session.query(func.max(model.id)).scalar() or 0
+    window = min(ESTIMATE_SAMPLE_SIZE, max_id)
+    matched = query.order_by(None).filter(model.id > max_id - window).count()
+    estimate = int(round(matched * max_id / window)) if window else 0
+    return max(estimate, ESTIMATE_EXACT_LIMIT + 1), True
+
+
+def count_query(query, entity, signature, mode='cached'):
+    """
+    Conta os resultados de uma query usando o cache de totais
+    Retorna (total, is_estimate)
+    """
+    if mode == 'estimate':
+        cached = count_cache.get(entity, signature, allow_stale=True)
+        if cached is not None:
+            total, is_fresh = cached
+            return total, not is_fresh
+        return _estimate_total(query)
+
+    if mode == 'cached':
+        cached = count_cache.get(entity, signature)
+        if cached is not None:
+            return cached[0], False
+
+    total = query.order_by(None).count()
+    count_cache.set(entity, signature, total)
+    return total, False
+
+
+# --- Invalidação após commit -------------------------------------------------
+
+def _row_values(entity, target, use_old=False):
+    state = inspect(target)
+    values = {}
+    for attr in list(SIGNATURE_FIELDS[entity].values()) + list(_VISIBILITY_FIELDS[entity]):
+        history = state.attrs[attr].history
+        if use_old and history.deleted:
+            values[attr] = history.deleted[0]
+        else:
+            values[attr] = getattr(target, attr)
+    return values
+
+
+def _queue_invalidation(target, entity, row):
+    session = object_session(target)
+    session.info.setdefault('count_cache_pending', []).append((entity, row))
+
+
+def _register(entity, model):
+    watched = list(SIGNATURE_FIELDS[entity].values()) + list(_VISIBILITY_FIELDS[entity])
+
+    def on_insert_or_delete(mapper, connection, target):
+        _queue_invalidation(target, entity, _row_values(entity, target))
+
+    def on_update(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[attr].history.has_changes() for attr in watched):
+            _queue_invalidation(target, entity, _row_values(entity, target, use_old=True))
+            _queue_invalidation(target, entity, _row_values(entity, target))
+
+    event.listen(model, 'after_insert', on_insert_or_delete)
+    event.listen(model, 'after_delete', on_insert_or_delete)
+    event.listen(model, 'after_update', on_update)
+
+
+for _entity, _model in _MODELS.items():
+    _register(_entity, _model)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    for entity, row in session.info.pop('count_cache_pending', []):
+        count_cache.invalidate(entity, row)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('count_cache_pending', None)
@@ -0,0 +1,124 @@
+"""
+Contadores desnormalizados de engajamento em Portal e User.
+
+As rotas de escrita atualizam os contadores com incrementos atômicos em SQL
+(``SET likes_count = likes_count + 1``), na mesma transação da alteração.
+``reconcile_counters`` recalcula tudo a partir das tabelas de associação e
+corrige eventuais divergências.
+"""
+
+from sqlalchemy import func, select
+from src.models.user import db, User, user_portal_likes, user_portal_favorites, user_follows
+from src.models.portal import Portal
+from src.models.review import Review
+from src.utils.clusters import update_cluster_representative
+from src.utils.suggestions import queue_creator_change
+
+PORTAL_COUNTERS = ('likes_count', 'favorites_count', 'rating_sum', 'rating_count')
+USER_COUNTERS = ('portals_count', 'followers_count', 'following_count')
+
+
+def _adjust(model, allowed, object_id, deltas):
+    values = {}
+    for name, delta in deltas.items():
+        if name not in allowed:
+            raise ValueError(f'Contador desconhecido: {name}')
+        if delta:
+            column = getattr(model, name)
+            values[column] = column + delta
+
+    if values:
+        if hasattr(model, 'updated_at'):
+            # Curtida, favorito ou review não é edição do conteúdo (onupdate mudaria updated_at)
+            values[model.updated_at] = model.updated_at
+        db.session.query(model).filter(model.id == object_id).update(
+            values, synchronize_session=False
+        )
+
+
+def adjust_portal_counters(portal_id, **deltas):
+    """
+    Incrementa/decrementa atomicamente contadores de um portal
+    Ex: adjust_portal_counters(1, likes_count=1)
+    """
+    _adjust(Portal, PORTAL_COUNTERS, portal_id, deltas)
+    if deltas.get('likes_count'):
+        # O representativo de cada cluster do mapa é o portal mais curtido
+        update_cluster_representative(db.session.connection(), portal_id, deltas['likes_count'])
+
+
+def adjust_user_counters(user_id, **deltas):
+    """
+    Incrementa/decrementa atomicamente contadores de um usuário
+    """
+    _adjust(User, USER_COUNTERS, user_id, deltas)
+    if deltas.get('portals_count'):
+        # Criadores entram nas sugestões de busca com o primeiro portal e saem com o último
+        queue_creator_change(db.session, user_id)
+
+
+def get_portal_counter(portal_id, name):
+    """
+    Lê o valor atual de um contador direto do banco
+    """
+    return db.session.query(getattr(Portal, name)).filter(Portal.id == portal_id).scalar() or 0
+
+
+def get_user_counter(user_id, name):
+    """
+    Lê o valor atual de um contador de usuário direto do banco
+    """
+    return db.session.query(getattr(User, name)).filter(User.id == user_id).scalar() or 0
+
+
+def _expected_counters():
+    """
+    Subqueries correlacionadas com o valor correto de cada contador
+    """
+    portals = Portal.__table__
+    users = User.__table__
+    reviews = Review.__table__
+
+    def count_where(table, column, target):
+        return select(func.count()).select_from(table).where(column == target).scalar_subquery()
+
+    return {
+        portals: {
+            'likes_count': count_where(user_portal_likes, user_portal_likes.c.portal_id, portals.c.id),
+            'favorites_count': count_where(user_portal_favorites, user_portal_favorites.c.portal_id, portals.c.id),
+            'rating_count': count_where(reviews, reviews.c.portal_id, portals.c.id),
+            'rating_sum': select(func.coalesce(func.sum(reviews.c.rating), 0)).where(
+                reviews.c.portal_id == portals.c.id
+            ).scalar_subquery(),
+        },
+        users: {
+            'portals_count': count_where(portals, portals.c.creator_id, users.c.id),
+            'followers_count': count_where(user_follows, user_follows.c.followed_id, users.c.id),
+            'following_count': count_where(user_follows, user_follows.c.follower_id, users.c.id),
+        },
+    }
+
+
+def reconcile_counters():
+    """
+    Recalcula todos os contadores a partir das tabelas de origem e corrige
+    os que divergirem. Retorna o número de linhas corrigidas por contador.
+    """
+    repaired = {}
+
+    for table, counters in _expected_counters().items():
+        for name, expected in counters.items():
+            column = table.c[name]
+            values = {name: expected}
+            if 'updated_at' in table.c:
+                # Reparo de contador não é edição do conteúdo (onupdate mudaria updated_at)
+                values['updated_at'] = table.c.updated_at
+            result = db.session.execute(
+                table.update()
+                .where(column.is_(None) | (column != expected))
+                .values(values)
+            )
+            repaired[f'{table.name}.{name}'] = result.rowcount
+
+    db.session.commit()
+    return repaired
@@ -0,0 +1,128 @@
+"""
+Configuração do banco de dados.
+
+Com SQLite, toda conexão recebe os PRAGMAs abaixo: WAL (leitores não esperam
+pelo escritor e vice-versa), synchronous=NORMAL (seguro em WAL, sem fsync a
+cada commit), cache de páginas, mmap e busy_timeout (em vez de falhar na hora
+com "database is locked").
+
+Há também um segundo pool, de conexões somente leitura (``query_only``), que
+a sessão usa automaticamente nas requisições GET/HEAD. Se uma dessas
+requisições precisar escrever, a sessão passa a usar o pool de escrita até o
+fim da requisição.
+
+Configuração por variáveis de ambiente:
+    DATABASE_URL              URL do banco (padrão: src/database/app.db)
+    SQLITE_BUSY_TIMEOUT_MS    espera pelo lock de escrita (padrão 5000)
+    SQLITE_CACHE_SIZE_KB      cache de páginas por conexão (padrão 16384)
+    SQLITE_MMAP_SIZE          bytes mapeados em memória (padrão 268435456)
+    DATABASE_POOL_SIZE        conexões do pool de escrita (padrão 5)
+    DATABASE_READ_POOL_SIZE   conexões do pool de leitura (padrão 10, 0 desativa)
+"""
+
+import os
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'app.db')
+DATABASE_URL = os.environ.get('DATABASE_URL') or f"sqlite:///{DEFAULT_DATABASE_PATH}"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+DATABASE_READ_POOL_SIZE = int(os.environ.get('DATABASE_READ_POOL_SIZE', 10))
+
+# Bind do Flask-SQLAlchemy com as conexões somente leitura
+READ_BIND = 'read'
+READ_METHODS = ('GET', 'HEAD')
+
+
+def _is_sqlite_file(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def _sqlite_pragmas(read_only):
+    pragmas = [
+        f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}',
+        f'PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}',
+        f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}',
+        'PRAGMA temp_store = MEMORY',
+    ]
+    if read_only:
+        pragmas.append('PRAGMA query_only = ON')
+    else:
+        # journal_mode fica gravado no arquivo; o escritor é quem o define
+        pragmas += ['PRAGMA journal_mode = WAL', 'PRAGMA synchronous = NORMAL']
+    return pragmas
+
+
+def _on_connect(pragmas):
+    def listener(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+    return listener
+
+
+def configure_database(app, db):
+    """
+    Configura a URL e os pools, inicializa o Flask-SQLAlchemy e aplica os
+    PRAGMAs em cada nova conexão
+    """
+    url = app.config.setdefault('SQLALCHEMY_DATABASE_URI', DATABASE_URL)
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+
+    sqlite_file = _is_sqlite_file(url)
+    if sqlite_file:
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {'pool_size': DATABASE_POOL_SIZE})
+        if DATABASE_READ_POOL_SIZE > 0:
+            app.config.setdefault('SQLALCHEMY_BINDS', {})[READ_BIND] = {
+                'url': url,
+                'pool_size': DATABASE_READ_POOL_SIZE,
+            }
+
+    db.init_app(app)
+
+    if sqlite_file:
+        with app.app_context():
+            event.listen(db.engines[None], 'connect', _on_connect(_sqlite_pragmas(read_only=False)))
+            if READ_BIND in db.engines:
+                event.listen(db.engines[READ_BIND], 'connect', _on_connect(_sqlite_pragmas(read_only=True)))
+
+
+def dispose_engines(db, close=True):
+    """
+    Descarta os pools (de escrita e de leitura); com ``close=False`` as
+    conexões não são fechadas, o que é o correto em um processo filho após fork
+    """
+    for engine in db.engines.values():
+        engine.dispose(close=close)
+
+
+class RoutingSession(Session):
+    """
+    Sessão que usa o pool de leitura nas requisições GET/HEAD enquanto nada
+    tiver sido escrito
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_read_bind(clause):
+            engines = self._db.engines
+            if READ_BIND in engines:
+                return engines[READ_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_read_bind(self, clause):
+        if self.info.get('writer'):
+            return False
+        if self._flushing or getattr(clause, 'is_dml', False):
+            # A partir daqui a requisição lê o que escreveu
+            self.info['writer'] = True
+            return False
+        return has_request_context() and request.method in READ_METHODS
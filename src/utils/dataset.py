@@ -0,0 +1,568 @@
+"""
+Gerador determinístico de dados sintéticos em volume.
+
+Com a mesma semente e os mesmos volumes, ``generate_dataset`` produz sempre
+os mesmos usuários, portais, tags, reviews, curtidas, favoritos, seguidores e
+explorações (os horários são deslocamentos a partir de ``now``). As
+distribuições imitam produção:
+
+- popularidade em lei de potência (Pareto): poucos portais concentram a
+  maior parte das curtidas, favoritos, reviews e explorações, e poucos
+  criadores concentram portais e seguidores;
+- atividade dos usuários também em cauda longa (a maioria interage pouco);
+- portais agrupados geograficamente: cidades com pesos diferentes e, dentro
+  de cada uma, bairros (pontos quentes) com portais próximos;
+- interações depois da criação do usuário e do portal, mais frequentes nos
+  dias recentes.
+
+Os volumes são totais por tabela; ``SCALES`` tem os tamanhos prontos (de
+``tiny``, para verificações rápidas, a ``large``: 1M de usuários, 500 mil
+portais e 50M de curtidas). Nada é montado inteiro em memória: as linhas são
+geradas com numpy em blocos e inseridas com ``executemany`` direto no driver.
+Durante a carga os triggers ficam suspensos; no fim, agregados, índices de
+busca e geo, contadores, clusters e os índices em memória são reconstruídos.
+
+Usado por ``src/generate_dataset.py``, ``src/benchmark.py`` e
+``src/check_query_budget.py``.
+"""
+
+import json
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from sqlalchemy import text
+from src.models.user import db, User, user_portal_likes, user_portal_favorites, user_follows
+from src.models.portal import Portal, portal_tags
+from src.models.category import Category
+from src.models.tag import Tag
+from src.models.review import Review
+from src.models.exploration import Exploration
+from src.utils.counters import reconcile_counters
+from src.utils.clusters import rebuild_cluster_index
+from src.utils.count_cache import count_cache
+from src.utils.suggestions import suggestion_index, build_index
+from src.utils.trending import load_history
+from src.utils.rollups import rebuild_rollups
+from src.utils.portal_series import rebuild_portal_series
+from src.utils import search_index, geo_index
+
+DATASET_SEED = 42
+
+# Linhas por executemany (e por commit)
+DATASET_CHUNK_SIZE = 50_000
+
+# Volumes por escala: total de linhas de cada tabela
+SCALES = {
+    'tiny': {
+        'users': 40, 'portals': 200, 'reviews': 500, 'likes': 1_000, 'favorites': 250,
+        'follows': 300, 'explorations': 700,
+    },
+    'small': {
+        'users': 2_000, 'portals': 5_000, 'reviews': 15_000, 'likes': 100_000, 'favorites': 20_000,
+        'follows': 16_000, 'explorations': 30_000,
+    },
+    'medium': {
+        'users': 50_000, 'portals': 25_000, 'reviews': 100_000, 'likes': 2_500_000, 'favorites': 500_000,
+        'follows': 400_000, 'explorations': 750_000,
+    },
+    'large': {
+        'users': 1_000_000, 'portals': 500_000, 'reviews': 2_000_000, 'likes': 50_000_000,
+        'favorites': 10_000_000, 'follows': 8_000_000, 'explorations': 15_000_000,
+    },
+}
+DEFAULT_SCALE = 'small'
+
+# Expoentes das leis de potência (menor = cauda mais longa)
+PORTAL_POPULARITY_ALPHA = 1.2
+CREATOR_POPULARITY_ALPHA = 1.3
+USER_ACTIVITY_ALPHA = 1.5
+
+# Janelas de criação, em dias antes de ``now``
+USER_HISTORY_DAYS = 730
+PORTAL_HISTORY_DAYS = 365
+
+HOTSPOTS_PER_CITY = 12
+# Desvio (graus) dos bairros em torno da cidade e dos portais em torno do bairro
+HOTSPOT_SPREAD = 0.05
+PORTAL_SPREAD = 0.006
+# Portais fora dos bairros, espalhados pela região
+SCATTERED_SHARE = 0.05
+SCATTERED_SPREAD = 0.3
+
+CATEGORY_NAMES = [
+    'Arte Clássica', 'Arte Moderna', 'Arte Contemporânea', 'Fotografia', 'Escultura',
+    'Arte Urbana', 'Arquitetura', 'Instalação',
+]
+TAG_NAMES = [
+    'Renascimento', 'Impressionismo', 'Surrealismo', 'Abstrato', 'Retrato', 'Paisagem',
+    'Natureza Morta', 'Arte Digital', 'Barroco', 'Cubismo', 'Grafite', 'Minimalismo',
+    'Pop Art', 'Expressionismo', 'Mural', 'Realismo', 'Modernismo', 'Arte Sacra',
+]
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Hugo', 'Irene', 'João',
+               'Karina', 'Lucas', 'Marina', 'Nuno', 'Olívia', 'Pedro', 'Renata', 'Sérgio', 'Tânia', 'Vítor']
+LAST_NAMES = ['Almeida', 'Barbosa', 'Cardoso', 'Duarte', 'Esteves', 'Ferreira', 'Gomes', 'Lima',
+              'Moreira', 'Nunes', 'Oliveira', 'Pereira', 'Ribeiro', 'Santos', 'Teixeira', 'Vieira']
+TITLE_WORDS = ['Luz', 'Sombra', 'Jardim', 'Mar', 'Cidade', 'Retrato', 'Silêncio', 'Memória', 'Horizonte',
+               'Noite', 'Aurora', 'Ponte', 'Janela', 'Rio', 'Floresta', 'Labirinto', 'Espelho', 'Vento']
+TITLE_QUALIFIERS = ['Azul', 'Dourado', 'Perdido', 'Eterno', 'Suspenso', 'Urbano', 'Secreto', 'Infinito']
+REVIEW_TITLES = ['Incrível', 'Muito bom', 'Interessante', 'Vale a visita', 'Regular']
+# (cidade, latitude, longitude, peso)
+CITIES = [
+    ('São Paulo', -23.5505, -46.6333, 10), ('Rio de Janeiro', -22.9068, -43.1729, 7),
+    ('Lisboa', 38.7223, -9.1393, 4), ('Paris', 48.8566, 2.3522, 8), ('Cidade do México', 19.4326, -99.1332, 5),
+    ('Buenos Aires', -34.6037, -58.3816, 4), ('Madri', 40.4168, -3.7038, 3), ('Florença', 43.7696, 11.2558, 2),
+]
+EFFECTS = ['particles', 'glow', 'parallax', 'portal_frame', 'audio_guide', 'color_shift']
+RATING_WEIGHTS = [1, 2, 5, 10, 12]
+
+_DAY = 86400.0
+
+
+def resolve_volumes(scale=DEFAULT_SCALE, **overrides):
+    """Volumes da escala, com os valores informados (não None) sobrescritos"""
+    if scale not in SCALES:
+        raise ValueError(f"Escala desconhecida: {scale} (opções: {', '.join(SCALES)})")
+    volumes = dict(SCALES[scale])
+    for table, value in overrides.items():
+        if table not in volumes:
+            raise ValueError(f'Tabela desconhecida: {table}')
+        if value is not None:
+            volumes[table] = int(value)
+    return volumes
+
+
+def _power_law(rng, count, alpha):
+    """Pesos de cauda longa (Pareto), um por item"""
+    return rng.pareto(alpha, count) + 1.0
+
+
+def _cap(weights, max_share):
+    # Um item não pode pedir mais linhas do que existem origens distintas
+    limit = weights.sum() * max_share
+    return np.minimum(weights, limit) if limit > 0 else weights
+
+
+def _cumulative(weights):
+    cumulative = np.cumsum(weights)
+    return cumulative / cumulative[-1]
+
+
+def _sample(rng, cumulative, size):
+    """Índices sorteados pelo peso (distribuição acumulada normalizada)"""
+    return np.minimum(np.searchsorted(cumulative, rng.random(size), side='right'), len(cumulative) - 1)
+
+
+def _allocate(rng, total, weights, limit=None):
+    """
+    Reparte ``total`` linhas entre os itens, proporcionalmente ao peso, com
+    no máximo ``limit`` por item (o excedente vai para os demais)
+    """
+    probabilities = weights / weights.sum()
+    counts = rng.multinomial(total, probabilities).astype(np.int64)
+    if limit is None:
+        return counts
+    while True:
+        excess = int(np.maximum(counts - limit, 0).sum())
+        counts = np.minimum(counts, limit)
+        open_items = counts < limit
+        if not excess or not open_items.any():
+            return counts
+        share = probabilities * open_items
+        counts += rng.multinomial(excess, share / share.sum())
+
+
+def _blocks(counts, chunk=DATASET_CHUNK_SIZE):
+    """Faixas [início, fim) de itens com cerca de ``chunk`` linhas cada"""
+    cumulative = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        done = cumulative[start - 1] if start else 0
+        stop = int(np.searchsorted(cumulative, done + chunk, side='right'))
+        stop = min(max(stop, start + 1), len(counts))
+        yield start, stop
+        start = stop
+
+
+def _unique_pairs(rng, start, counts, cumulative, exclude_self=False, rounds=8):
+    """
+    Pares (origem, alvo) distintos para as origens ``start .. start+len(counts)``:
+    ``counts[i]`` alvos cada, sorteados pelo peso. Os duplicados são sorteados
+    de novo algumas vezes (a segunda metade das rodadas sem peso, para as
+    origens que já esgotaram os alvos populares); o que sobrar é descartado.
+    Ordenados por origem.
+    """
+    targets = len(cumulative)
+    sources = np.arange(start, start + len(counts), dtype=np.int64)
+    wanted = np.minimum(counts, targets - 1 if exclude_self else targets)
+    keys = np.empty(0, dtype=np.int64)
+    missing = wanted
+    for round_number in range(rounds):
+        origin = np.repeat(sources, missing)
+        if not len(origin):
+            break
+        if round_number < rounds // 2:
+            target = _sample(rng, cumulative, len(origin))
+        else:
+            target = rng.integers(targets, size=len(origin))
+        if exclude_self:
+            keep = target != origin
+            origin, target = origin[keep], target[keep]
+        keys = np.unique(np.concatenate([keys, origin * targets + target]))
+        got = np.bincount(keys // targets - start, minlength=len(counts))
+        missing = np.maximum(wanted - got, 0)
+    return keys // targets, keys % targets
+
+
+def _moments(rng, start, end):
+    """Horário entre ``start`` e ``end`` (epoch), mais provável perto do fim"""
+    return start + (end - start) * np.sqrt(rng.random(len(start)))
+
+
+def _timestamps(epochs):
+    """Epoch -> texto no formato do DateTime do SQLite ('AAAA-MM-DD HH:MM:SS.ffffff')"""
+    values = np.datetime_as_string((epochs * 1e6).astype('datetime64[us]'), unit='us')
+    return np.char.replace(values, 'T', ' ').tolist()
+
+
+def _insert(conn, table, columns, rows):
+    if not rows:
+        return
+    sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    conn.exec_driver_sql(sql, rows)
+    conn.commit()
+
+
+@contextmanager
+def _bulk_load(conn):
+    """
+    Suspende os triggers (agregados, busca e geo, reconstruídos no fim), os
+    índices secundários (recriar de uma vez é mais rápido que mantê-los a
+    cada linha) e o fsync durante a carga
+    """
+    if conn.dialect.name != 'sqlite':
+        yield
+        return
+    triggers = conn.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").all()
+    # Índices de PRIMARY KEY/UNIQUE (sql nulo) ficam: garantem a unicidade durante a carga
+    indexes = conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ).all()
+    for name, _ in triggers:
+        conn.exec_driver_sql(f'DROP TRIGGER {name}')
+    for name, _ in indexes:
+        conn.exec_driver_sql(f'DROP INDEX {name}')
+    conn.commit()
+    conn.exec_driver_sql('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        conn.rollback()
+        conn.exec_driver_sql('PRAGMA synchronous = NORMAL')
+        for _, sql in indexes + triggers:
+            conn.exec_driver_sql(sql)
+        conn.commit()
+
+
+class _Generator:
+    """
+    Estado compartilhado entre as tabelas: pesos, horários de criação e
+    coordenadas (arrays numpy indexados pela posição do usuário/portal)
+    """
+
+    def __init__(self, conn, volumes, seed, now, progress):
+        self.conn = conn
+        self.volumes = volumes
+        self.rng = np.random.default_rng(seed)
+        self.now = (now - datetime(1970, 1, 1)).total_seconds()
+        self.progress = progress or (lambda table, rows: None)
+        self.counts = {}
+
+    def _done(self, table, rows):
+        self.counts[table] = self.counts.get(table, 0) + rows
+        self.progress(table, self.counts[table])
+
+    def user_ids(self, index):
+        return self._user_ids[index].tolist()
+
+    def categories_and_tags(self):
+        rng = self.rng
+        rows = [
+            (i + 1, name, name.lower().replace(' ', '-'), f'Portais de {name.lower()}', 'palette',
+             '#%06x' % rng.integers(0x1000000))
+            for i, name in enumerate(CATEGORY_NAMES)
+        ]
+        _insert(self.conn, Category.__table__, ('id', 'name', 'slug', 'description', 'icon', 'color'), rows)
+        self._done('categories', len(rows))
+
+        rows = [(i + 1, name, name.lower().replace(' ', '-')) for i, name in enumerate(TAG_NAMES)]
+        _insert(self.conn, Tag.__table__, ('id', 'name', 'slug'), rows)
+        self._done('tags', len(rows))
+        self.tag_weights = _power_law(rng, len(TAG_NAMES), 1.5)
+        self.category_cumulative = _cumulative(_power_law(rng, len(CATEGORY_NAMES), 1.5))
+
+    def users(self):
+        rng, total = self.rng, self.volumes['users']
+        width = max(5, len(str(total)))
+        self._user_ids = np.array([f'user_{i:0{width}d}' for i in range(1, total + 1)], dtype=object)
+        self.user_created = self.now - rng.random(total) * USER_HISTORY_DAYS * _DAY
+        self.activity = _power_law(rng, total, USER_ACTIVITY_ALPHA)
+        self.creator_weights = _power_law(rng, total, CREATOR_POPULARITY_ALPHA)
+
+        city_cumulative = _cumulative(np.array([city[3] for city in CITIES], dtype=float))
+        columns = ('id', 'name', 'email', 'avatar_url', 'bio', 'location', 'is_verified', 'created_at')
+        for start in range(0, total, DATASET_CHUNK_SIZE):
+            stop = min(start + DATASET_CHUNK_SIZE, total)
+            size = stop - start
+            first = rng.integers(len(FIRST_NAMES), size=size)
+            last = rng.integers(len(LAST_NAMES), size=size)
+            city = _sample(rng, city_cumulative, size)
+            verified = (rng.random(size) < 0.1).tolist()
+            created = _timestamps(self.user_created[start:stop])
+            rows = []
+            for i, user_id in enumerate(self._user_ids[start:stop]):
+                name = f'{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}'
+                city_name = CITIES[city[i]][0]
+                rows.append((
+                    user_id, name, f'{user_id}@example.com', f'https://example.com/avatars/{user_id}.jpg',
+                    f'{name}, artista em {city_name}', city_name, verified[i], created[i],
+                ))
+            _insert(self.conn, User.__table__, columns, rows)
+            self._done('users', size)
+
+    def _locations(self, size):
+        """Cidade e coordenadas agrupadas em bairros"""
+        rng = self.rng
+        city = _sample(rng, self.city_cumulative, size)
+        hotspot = rng.integers(HOTSPOTS_PER_CITY, size=size)
+        latitude = self.hotspots[city, hotspot, 0] + rng.normal(0, PORTAL_SPREAD, size)
+        longitude = self.hotspots[city, hotspot, 1] + rng.normal(0, PORTAL_SPREAD, size)
+        scattered = rng.random(size) < SCATTERED_SHARE
+        centers = np.array([[c[1], c[2]] for c in CITIES])[city]
+        latitude[scattered] = centers[scattered, 0] + rng.normal(0, SCATTERED_SPREAD, scattered.sum())
+        longitude[scattered] = centers[scattered, 1] + rng.normal(0, SCATTERED_SPREAD, scattered.sum())
+        return city, latitude, longitude
+
+    def portals(self):
+        rng, total = self.rng, self.volumes['portals']
+        self.city_cumulative = _cumulative(np.array([city[3] for city in CITIES], dtype=float))
+        self.hotspots = np.array([[c[1], c[2]] for c in CITIES])[:, None, :] + rng.normal(
+            0, HOTSPOT_SPREAD, (len(CITIES), HOTSPOTS_PER_CITY, 2)
+        )
+        creator_cumulative = _cumulative(self.creator_weights)
+        self.portal_created = np.empty(total)
+        self.latitude = np.empty(total)
+        self.longitude = np.empty(total)
+
+        columns = (
+            'id', 'title', 'description', 'image_url', 'thumbnail_url', 'creator_id', 'category_id', 'location',
+            'latitude', 'longitude', 'is_public', 'is_active', 'is_featured', 'created_at', 'updated_at',
+            'ai_analysis', 'ar_effects',
+        )
+        for start in range(0, total, DATASET_CHUNK_SIZE):
+            stop = min(start + DATASET_CHUNK_SIZE, total)
+            size = stop - start
+            creator = _sample(rng, creator_cumulative, size)
+            city, latitude, longitude = self._locations(size)
+            self.latitude[start:stop], self.longitude[start:stop] = latitude, longitude
+            begin = np.maximum(self.user_created[creator], self.now - PORTAL_HISTORY_DAYS * _DAY)
+            self.portal_created[start:stop] = _moments(rng, begin, np.full(size, self.now))
+            created = _timestamps(self.portal_created[start:stop])
+            category = (_sample(rng, self.category_cumulative, size) + 1).tolist()
+            word = rng.integers(len(TITLE_WORDS), size=size)
+            qualifier = rng.integers(len(TITLE_QUALIFIERS), size=size)
+            flags = rng.random((size, 3)) < [0.9, 0.97, 0.05]
+            # Até 4 tags distintas por portal, as populares com mais chance (amostragem ponderada sem reposição)
+            tag_count = rng.integers(1, 5, size=size)
+            tag_order = np.argsort(-rng.random((size, len(TAG_NAMES))) ** (1 / self.tag_weights), axis=1)[:, :4] + 1
+            labels = rng.uniform(0.5, 1, (size, 4)).round(3).tolist()
+            colors = rng.integers(0x1000000, size=(size, 5)).tolist()
+            confidence = rng.uniform(0.4, 0.99, size).round(3).tolist()
+            embedding = rng.uniform(-1, 1, (size, 64)).round(4).tolist()
+            effects = rng.random((size, len(EFFECTS)))
+            effect_count = rng.integers(1, 4, size=size)
+            intensity = rng.uniform(0.1, 1, (size, len(EFFECTS))).round(2).tolist()
+            anchor = rng.integers(3, size=size)
+            creator_ids = self.user_ids(creator)
+            latitude, longitude = latitude.tolist(), longitude.tolist()
+
+            rows, tag_rows = [], []
+            for i in range(size):
+                portal_id = start + i + 1
+                city_name = CITIES[city[i]][0]
+                tag_ids = sorted(tag_order[i, :tag_count[i]].tolist())
+                tags = [TAG_NAMES[t - 1] for t in tag_ids]
+                ai_analysis = {
+                    'labels': [{'name': tag, 'score': labels[i][j]} for j, tag in enumerate(tags)],
+                    'dominant_colors': ['#%06x' % color for color in colors[i]],
+                    'style_confidence': confidence[i],
+                    'embedding': embedding[i],
+                }
+                chosen = np.argsort(effects[i])[:effect_count[i]].tolist()
+                ar_effects = {
+                    'effects': [{'type': EFFECTS[e], 'intensity': intensity[i][e]} for e in chosen],
+                    'anchor': ('image', 'plane', 'geo')[anchor[i]],
+                }
+                rows.append((
+                    portal_id, f'{TITLE_WORDS[word[i]]} {TITLE_QUALIFIERS[qualifier[i]]} {portal_id}',
+                    f'Portal em {city_name} sobre {", ".join(tag.lower() for tag in tags)}',
+                    f'https://example.com/portals/{portal_id}.jpg',
+                    f'https://example.com/portals/{portal_id}_thumb.jpg',
+                    creator_ids[i], category[i], city_name, latitude[i], longitude[i],
+                    bool(flags[i, 0]), bool(flags[i, 1]), bool(flags[i, 2]), created[i], created[i],
+                    json.dumps(ai_analysis), json.dumps(ar_effects),
+                ))
+                tag_rows.extend((portal_id, tag_id) for tag_id in tag_ids)
+            _insert(self.conn, Portal.__table__, columns, rows)
+            _insert(self.conn, portal_tags, ('portal_id', 'tag_id'), tag_rows)
+            self._done('portals', size)
+            self._done('portal_tags', len(tag_rows))
+
+        self.portal_weights = _power_law(rng, total, PORTAL_POPULARITY_ALPHA)
+
+    def _pairs(self, table, total, source_weights, target_weights, exclude_self=False):
+        """
+        Gera pares distintos em blocos: cada origem recebe uma parte do total
+        pelo peso, e os alvos são sorteados pelo peso deles
+        """
+        # Nenhuma origem pede mais da metade dos alvos
+        counts = _allocate(self.rng, total, source_weights, limit=max(len(target_weights) // 2, 1))
+        # Alvo nenhum pode pedir mais linhas do que existem origens
+        cumulative = _cumulative(_cap(target_weights, 0.5 * len(source_weights) / max(total, 1)))
+        for start, stop in _blocks(counts):
+            sources, targets = _unique_pairs(self.rng, start, counts[start:stop], cumulative, exclude_self)
+            yield sources, targets
+            self._done(table, len(sources))
+
+    def _interaction_times(self, users, portals):
+        begin = np.maximum(self.user_created[users], self.portal_created[portals])
+        return _timestamps(_moments(self.rng, begin, np.full(len(users), self.now)))
+
+    def reviews(self):
+        # Reviews se concentram nos portais populares (origem = portal)
+        columns = ('id', 'portal_id', 'user_id', 'rating', 'title', 'comment', 'is_verified', 'helpful_count',
+                   'created_at')
+        next_id = 1
+        rating_cumulative = _cumulative(np.array(RATING_WEIGHTS, dtype=float))
+        for portals, users in self._pairs('reviews', self.volumes['reviews'], self.portal_weights, self.activity):
+            size = len(portals)
+            rating = (_sample(self.rng, rating_cumulative, size) + 1).tolist()
+            title = self.rng.integers(len(REVIEW_TITLES), size=size).tolist()
+            helpful = self.rng.integers(0, 21, size=size).tolist()
+            created = self._interaction_times(users, portals)
+            user_ids = self.user_ids(users)
+            portal_ids = (portals + 1).tolist()
+            rows = [
+                (next_id + i, portal_ids[i], user_ids[i], rating[i], REVIEW_TITLES[title[i]],
+                 f'Experiência em realidade aumentada no portal {portal_ids[i]}', False, helpful[i], created[i])
+                for i in range(size)
+            ]
+            next_id += size
+            _insert(self.conn, Review.__table__, columns, rows)
+
+    def portal_interactions(self, name, table):
+        """Curtidas ou favoritos: usuários ativos escolhem portais populares"""
+        for users, portals in self._pairs(name, self.volumes[name], self.activity, self.portal_weights):
+            rows = list(zip(self.user_ids(users), (portals + 1).tolist(), self._interaction_times(users, portals)))
+            _insert(self.conn, table, ('user_id', 'portal_id', 'created_at'), rows)
+
+    def follows(self):
+        # Criadores populares também são os mais seguidos
+        for followers, followed in self._pairs(
+            'follows', self.volumes['follows'], self.activity, self.creator_weights, exclude_self=True
+        ):
+            begin = np.maximum(self.user_created[followers], self.user_created[followed])
+            created = _timestamps(_moments(self.rng, begin, np.full(len(followers), self.now)))
+            rows = list(zip(self.user_ids(followers), self.user_ids(followed), created))
+            _insert(self.conn, user_follows, ('follower_id', 'followed_id', 'created_at'), rows)
+
+    def explorations(self):
+        # Sem unicidade: o mesmo usuário escaneia o mesmo portal várias vezes
+        columns = ('id', 'user_id', 'portal_id', 'scan_image_url', 'detection_confidence', 'ar_activated',
+                   'latitude', 'longitude', 'created_at')
+        counts = _allocate(self.rng, self.volumes['explorations'], self.activity)
+        cumulative = _cumulative(self.portal_weights)
+        next_id = 1
+        for start, stop in _blocks(counts):
+            users = np.repeat(np.arange(start, stop), counts[start:stop])
+            size = len(users)
+            portals = _sample(self.rng, cumulative, size)
+            confidence = self.rng.uniform(0.6, 0.99, size).round(3).tolist()
+            activated = (self.rng.random(size) < 0.8).tolist()
+            latitude = (self.latitude[portals] + self.rng.normal(0, 0.0005, size)).tolist()
+            longitude = (self.longitude[portals] + self.rng.normal(0, 0.0005, size)).tolist()
+            created = self._interaction_times(users, portals)
+            user_ids = self.user_ids(users)
+            portal_ids = (portals + 1).tolist()
+            rows = [
+                (next_id + i, user_ids[i], portal_ids[i], f'https://example.com/scans/{next_id + i}.jpg',
+                 confidence[i], activated[i], latitude[i], longitude[i], created[i])
+                for i in range(size)
+            ]
+            next_id += size
+            _insert(self.conn, Exploration.__table__, columns, rows)
+            self._done('explorations', size)
+
+
+def generate_dataset(scale=DEFAULT_SCALE, seed=DATASET_SEED, now=None, progress=None, **volumes):
+    """
+    Insere o conjunto de dados em um banco sem usuários (levanta RuntimeError
+    caso contrário). Os volumes vêm de ``SCALES[scale]`` e podem ser trocados
+    por tabela (``users=``, ``portals=``, ``reviews=``, ``likes=``,
+    ``favorites=``, ``follows=``, ``explorations=``). ``progress(tabela,
+    linhas)`` é chamado a cada bloco inserido.
+
+    Deve ser chamado dentro de um app context, depois da criação do schema.
+    Retorna o número de linhas por tabela (curtidas, favoritos, seguidores e
+    reviews podem ficar um pouco abaixo do pedido: pares repetidos são
+    descartados).
+    """
+    volumes = resolve_volumes(scale, **volumes)
+    now = now or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    # Nenhuma transação da sessão aberta enquanto a carga usa outra conexão
+    db.session.remove()
+
+    with db.engine.connect() as conn:
+        if conn.execute(text('SELECT 1 FROM users LIMIT 1')).first() is not None:
+            raise RuntimeError('O banco já contém usuários; o gerador precisa de um banco vazio')
+        conn.rollback()
+
+        generator = _Generator(conn, volumes, seed, now, progress)
+        with _bulk_load(conn):
+            generator.categories_and_tags()
+            generator.users()
+            generator.portals()
+            generator.reviews()
+            generator.portal_interactions('likes', user_portal_likes)
+            generator.portal_interactions('favorites', user_portal_favorites)
+            generator.follows()
+            generator.explorations()
+
+    rebuild_derived_tables()
+    refresh_derived_state()
+    return generator.counts
+
+
+def rebuild_derived_tables():
+    """
+    Reconstrói o que os triggers mantêm (agregados diários, série por
+    portal, busca e R*Tree), depois de uma carga com os triggers suspensos
+    """
+    rebuild_rollups()
+    rebuild_portal_series()
+    if search_index.is_available():
+        search_index.rebuild_search_index()
+    if geo_index.is_available():
+        geo_index.rebuild_geo_index()
+
+
+def refresh_derived_state():
+    """
+    Reconstrói o que os inserts em lote não atualizam: contadores
+    desnormalizados, clusters do mapa, totais em cache e os índices em
+    memória (sugestões e tendências)
+    """
+    reconcile_counters()
+    rebuild_cluster_index()
+    count_cache.clear()
+    suggestion_index.replace_with(build_index())
+    load_history()
@@ -0,0 +1,199 @@
+"""
+Pipeline de eventos de analytics com escrita em segundo plano (write-behind).
+
+``/api/analytics/track`` só coloca o evento em uma fila em memória limitada e
+retorna. Uma thread em segundo plano retira os eventos em lotes e grava cada
+lote com um único INSERT e um único commit na tabela ``analytics_events``
+(somente inserção). Assim o endpoint nunca espera pelo lock de escrita do
+SQLite.
+
+Quando a fila está cheia, ``enqueue`` espera um pouco (backpressure) e, se
+ainda não houver espaço, descarta o evento e conta o descarte. No encerramento
+do processo a fila é esvaziada no banco.
+
+Configuração por variáveis de ambiente:
+    EVENTS_QUEUE_SIZE          capacidade da fila (padrão 10000)
+    EVENTS_BATCH_SIZE          eventos por INSERT (padrão 500)
+    EVENTS_FLUSH_INTERVAL      segundos máximos entre gravações (padrão 1)
+    EVENTS_ENQUEUE_TIMEOUT     espera máxima com a fila cheia (padrão 0.05)
+    EVENTS_MAX_RETRIES         tentativas de gravar um lote (padrão 5)
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.event import AnalyticsEvent
+
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 10000))
+EVENTS_BATCH_SIZE = int(os.environ.get('EVENTS_BATCH_SIZE', 500))
+EVENTS_FLUSH_INTERVAL = float(os.environ.get('EVENTS_FLUSH_INTERVAL', 1))
+EVENTS_ENQUEUE_TIMEOUT = float(os.environ.get('EVENTS_ENQUEUE_TIMEOUT', 0.05))
+EVENTS_MAX_RETRIES = int(os.environ.get('EVENTS_MAX_RETRIES', 5))
+
+logger = logging.getLogger(__name__)
+
+
+class EventPipeline:
+    """
+    Fila limitada + thread que grava os eventos em lote
+    """
+
+    def __init__(self, queue_size=EVENTS_QUEUE_SIZE, batch_size=EVENTS_BATCH_SIZE,
+                 flush_interval=EVENTS_FLUSH_INTERVAL, enqueue_timeout=EVENTS_ENQUEUE_TIMEOUT):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.app = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_at = None
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        # A thread é criada no primeiro uso de cada processo, o que mantém a
+        # fila válida em servidores que fazem fork depois de importar o app
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+                self._pid = os.getpid()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='analytics-events', daemon=True)
+                self._thread.start()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def enqueue(self, event_type, user_id=None, portal_id=None, properties=None, timestamp=None):
+        """
+        Coloca um evento na fila. Retorna False se ele foi descartado
+        porque a fila continuou cheia.
+        """
+        self._ensure_started()
+        event = {
+            'event_type': event_type,
+            'user_id': user_id,
+            'portal_id': portal_id,
+            'timestamp': timestamp or datetime.utcnow(),
+            'properties': json.dumps(properties, ensure_ascii=False) if properties else None,
+        }
+        try:
+            if self.enqueue_timeout > 0:
+                self._queue.put(event, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def _drain(self, first_timeout):
+        """Retira até ``batch_size`` eventos, esperando pelo primeiro"""
+        try:
+            batch = [self._queue.get(timeout=first_timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        attempt = 0
+        while True:
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(insert(AnalyticsEvent.__table__), batch)
+                break
+            except Exception:
+                attempt += 1
+                if attempt >= EVENTS_MAX_RETRIES:
+                    logger.exception('Falha ao gravar lote de eventos; %s eventos descartados', len(batch))
+                    self._count('failed', len(batch))
+                    return
+                # SQLite ocupado: tenta de novo com espera crescente
+                time.sleep(min(0.1 * 2 ** attempt, 2))
+
+        with self._stats_lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.last_flush_at = datetime.utcnow()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(self.flush_interval)
+            if batch:
+                self._write(batch)
+        # Encerramento: grava o que restou na fila
+        while True:
+            batch = self._drain(0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def flush(self, timeout=5):
+        """
+        Espera a fila ser gravada (útil em scripts e no encerramento)
+        Retorna True se a fila esvaziou dentro do prazo.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._stats_lock:
+                done = self.written + self.failed >= self.enqueued
+            if done:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def shutdown(self, timeout=5):
+        """Para a thread depois de gravar os eventos pendentes"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_size': self._queue.qsize(),
+                'queue_capacity': self.queue_size,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_flush_at': self.last_flush_at.isoformat() + 'Z' if self.last_flush_at else None
+            }
+
+
+event_pipeline = EventPipeline()
@@ -0,0 +1,156 @@
+"""
+Cache de portais já serializados (bytes JSON), para as listagens.
+
+Cada portal é serializado uma vez (campos próprios, ``ai_analysis``,
+``ar_effects`` e estatísticas) e guardado com um carimbo de versão: o
+``updated_at`` e os contadores desnormalizados. Uma listagem compara o
+carimbo da linha que acabou de ler com o do cache; se mudou (edição, curtida,
+review, visualizações gravadas), o trecho é refeito. Não há invalidação
+explícita, então o cache nunca devolve um portal desatualizado em relação ao
+banco.
+
+Criador, categoria e tags são serializados por página (mudam por outros
+caminhos) e concatenados ao trecho do portal em ``serialize_portal_fragments``
+(``src/utils/serializers.py``).
+
+As colunas JSON grandes podem ser adiadas na query da listagem
+(``defer_portal_blobs``): só são lidas, em uma única query, para os portais
+que não estão no cache.
+
+Configuração por variáveis de ambiente:
+    FRAGMENT_CACHE_SIZE   portais em cache por processo (padrão 5000, 0 desativa)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import inspect
+from sqlalchemy.orm import defer
+from sqlalchemy.orm.attributes import set_committed_value
+from src.models.user import db
+from src.models.portal import Portal
+from src.utils.json_provider import RawJSON, dumps_bytes
+
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))
+
+# Colunas JSON grandes, lidas só quando o portal precisa ser serializado
+PORTAL_BLOB_COLUMNS = ('ai_analysis', 'ar_effects')
+
+
+def portal_version(portal):
+    """Carimbo de versão do trecho serializado de um portal"""
+    return (
+        portal.updated_at, portal.views_count, portal.unique_viewers, portal.likes_count,
+        portal.favorites_count, portal.rating_sum, portal.rating_count
+    )
+
+
+def defer_portal_blobs(query):
+    """Adia as colunas JSON grandes em uma query de portais"""
+    return query.options(*(defer(getattr(Portal, column)) for column in PORTAL_BLOB_COLUMNS))
+
+
+def _load_blobs(portals):
+    """Carrega em uma query as colunas adiadas dos portais informados"""
+    pending = [
+        portal for portal in portals
+        if any(column in inspect(portal).unloaded for column in PORTAL_BLOB_COLUMNS)
+    ]
+    if not pending:
+        return
+    columns = [getattr(Portal, column) for column in PORTAL_BLOB_COLUMNS]
+    rows = db.session.query(Portal.id, *columns).filter(
+        Portal.id.in_([portal.id for portal in pending])
+    ).all()
+    values = {row[0]: row[1:] for row in rows}
+    for portal in pending:
+        for column, value in zip(PORTAL_BLOB_COLUMNS, values.get(portal.id, (None,) * len(columns))):
+            set_committed_value(portal, column, value)
+
+
+class FragmentCache:
+    """
+    LRU de trechos JSON por (portal, variante), com carimbo de versão
+    """
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def portals(self, portals, include_stats=True):
+        """
+        Trechos dos portais, na mesma ordem: bytes do objeto JSON de
+        ``Portal.to_dict`` sem criador, categoria e tags, e sem o ``}`` final
+        (para que o chamador possa acrescentar campos)
+        """
+        result = [None] * len(portals)
+        missing = []
+        with self._lock:
+            for index, portal in enumerate(portals):
+                entry = self._entries.get((portal.id, include_stats))
+                if entry is not None and entry[0] == portal_version(portal):
+                    self._entries.move_to_end((portal.id, include_stats))
+                    result[index] = entry[1]
+                else:
+                    missing.append(index)
+            self.hits += len(portals) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            _load_blobs([portals[index] for index in missing])
+            built = []
+            for index in missing:
+                portal = portals[index]
+                data = dumps_bytes(portal.to_dict(
+                    include_creator=False, include_category=False, include_tags=False, include_stats=include_stats
+                ))[:-1]
+                result[index] = data
+                built.append(((portal.id, include_stats), (portal_version(portal), data)))
+            self._store(built)
+
+        return result
+
+    def _store(self, entries):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            for key, value in entries:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def join_fragment(body, fields):
+    """
+    Fecha o trecho de um portal acrescentando ``fields``, pares
+    (nome em bytes, valor já serializado)
+    """
+    parts = [body]
+    for name, value in fields:
+        parts.append(b',"' + name + b'":' + value)
+    parts.append(b'}')
+    return RawJSON(b''.join(parts))
+
+
+fragment_cache = FragmentCache()
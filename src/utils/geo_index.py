@@ -0,0 +1,173 @@
+"""
+Índice espacial (SQLite R*Tree) sobre as coordenadas dos portais.
+
+A tabela ``portals_geo`` guarda um ponto (caixa degenerada) por portal com
+latitude e longitude, mantida por triggers no banco como o índice de busca.
+Uma consulta por raio faz duas etapas: o R*Tree devolve os candidatos dentro
+da caixa que envolve o círculo e a distância exata (haversine) é calculada de
+uma vez para todos os candidatos com numpy.
+
+Se o SQLite não tiver R*Tree, a caixa é filtrada direto nas colunas.
+"""
+
+import math
+import numpy as np
+from sqlalchemy import and_, or_, select, text, table, column
+from sqlalchemy.exc import OperationalError
+from src.models.user import db
+from src.models.portal import Portal
+
+EARTH_RADIUS_KM = 6371.0088
+
+GEO_TABLE = 'portals_geo'
+
+_geo = table(GEO_TABLE, column('id'), column('min_lat'), column('max_lat'), column('min_lng'), column('max_lng'))
+
+_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {GEO_TABLE} USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    f"CREATE TRIGGER IF NOT EXISTS {GEO_TABLE}_ai AFTER INSERT ON portals "
+    f"WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+    f"INSERT INTO {GEO_TABLE} VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude); END",
+    f"CREATE TRIGGER IF NOT EXISTS {GEO_TABLE}_ad AFTER DELETE ON portals BEGIN "
+    f"DELETE FROM {GEO_TABLE} WHERE id = old.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS {GEO_TABLE}_au AFTER UPDATE OF latitude, longitude ON portals BEGIN "
+    f"DELETE FROM {GEO_TABLE} WHERE id = old.id; "
+    f"INSERT INTO {GEO_TABLE} SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude "
+    f"WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END",
+]
+
+_state = {'available': None}
+
+
+def ensure_geo_index():
+    """
+    Cria o R*Tree e os triggers, se ainda não existirem, e indexa os portais
+    já existentes. Deve ser chamado dentro de um app context.
+    Retorna True se o índice está disponível.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        _state['available'] = False
+        return False
+
+    with db.engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': GEO_TABLE}
+        ).first()
+        if not exists:
+            try:
+                for statement in _DDL:
+                    conn.execute(text(statement))
+            except OperationalError:
+                # SQLite compilado sem R*Tree
+                _state['available'] = False
+                return False
+            _populate(conn)
+
+    _state['available'] = True
+    return True
+
+
+def _populate(conn):
+    conn.execute(text(
+        f"INSERT INTO {GEO_TABLE} SELECT id, latitude, latitude, longitude, longitude FROM portals "
+        f"WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    ))
+
+
+def rebuild_geo_index():
+    """
+    Reconstrói o índice a partir da tabela de portais
+    """
+    with db.engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {GEO_TABLE}"))
+        _populate(conn)
+
+
+def is_available():
+    return bool(_state['available'])
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Caixa (em graus) que contém o círculo de raio ``radius_km``.
+    Retorna (min_lat, max_lat, faixas de longitude); a faixa é dividida em duas
+    quando cruza o antimeridiano e cobre todas as longitudes perto dos polos.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    lat_rad = math.radians(lat)
+    min_lat = lat_rad - angular
+    max_lat = lat_rad + angular
+
+    if min_lat <= -math.pi / 2 or max_lat >= math.pi / 2:
+        return math.degrees(max(min_lat, -math.pi / 2)), math.degrees(min(max_lat, math.pi / 2)), [(-180.0, 180.0)]
+
+    delta_lng = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(lat_rad))))
+    min_lng = lng - delta_lng
+    max_lng = lng + delta_lng
+    if delta_lng >= 180:
+        ranges = [(-180.0, 180.0)]
+    elif min_lng < -180:
+        ranges = [(min_lng + 360, 180.0), (-180.0, max_lng)]
+    elif max_lng > 180:
+        ranges = [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    else:
+        ranges = [(min_lng, max_lng)]
+    return math.degrees(min_lat), math.degrees(max_lat), ranges
+
+
+def haversine_km(lat, lng, latitudes, longitudes):
+    """
+    Distância (km) de um ponto a vários pontos, vetorizada
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    delta_lat = lat2 - lat1
+    delta_lng = np.radians(np.asarray(longitudes, dtype=np.float64) - lng)
+    a = np.sin(delta_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(delta_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def within_box(portals, min_lat, max_lat, lng_ranges):
+    """
+    Condição "portal dentro da caixa" para ``portals`` (o modelo ou a tabela),
+    resolvida pelo R*Tree quando disponível
+    """
+    if is_available():
+        return portals.id.in_(select(_geo.c.id).where(
+            _geo.c.max_lat >= min_lat, _geo.c.min_lat <= max_lat,
+            or_(*[and_(_geo.c.max_lng >= low, _geo.c.min_lng <= high) for low, high in lng_ranges])
+        ))
+    return and_(
+        portals.latitude.between(min_lat, max_lat),
+        or_(*[portals.longitude.between(low, high) for low, high in lng_ranges])
+    )
+
+
+def _candidates(query, lat, lng, radius_km):
+    """(id, latitude, longitude) dos portais dentro da caixa do círculo"""
+    min_lat, max_lat, lng_ranges = bounding_box(lat, lng, radius_km)
+    return query.with_entities(Portal.id, Portal.latitude, Portal.longitude).filter(
+        within_box(Portal, min_lat, max_lat, lng_ranges)
+    ).all()
+
+
+def nearby(query, lat, lng, radius_km, limit):
+    """
+    Os ``limit`` portais de ``query`` mais próximos, até ``radius_km``.
+    Retorna uma lista de (portal_id, distância em km), do mais próximo ao mais distante.
+    """
+    rows = _candidates(query, lat, lng, radius_km)
+    if not rows:
+        return []
+
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    distances = haversine_km(lat, lng, [row[1] for row in rows], [row[2] for row in rows])
+
+    inside = distances <= radius_km
+    ids, distances = ids[inside], distances[inside]
+    if len(ids) > limit:
+        # Só os mais próximos precisam ser ordenados
+        nearest = np.argpartition(distances, limit - 1)[:limit]
+        ids, distances = ids[nearest], distances[nearest]
+    order = np.lexsort((ids, distances))
+    return [(int(ids[i]), float(distances[i])) for i in order]
@@ -1,6 +1,16 @@
 import re
-from datetime import datetime
-from flask import jsonify
+import json
+import base64
+import binascii
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_
+from src.utils.negotiation import make_response
+
+
+class InvalidCursorError(ValueError):
+    """
+    Cursor de paginação malformado ou adulterado
+    """
 
 def create_slug(text):
     """
@@ -16,7 +26,8 @@ def create_slug(text):
 
 def success_response(data=None, message=None, status_code=200):
     """
-    Cria uma resposta de sucesso padronizada
+    Cria uma resposta de sucesso padronizada (JSON, ou MessagePack se o
+    cliente pedir com o cabeçalho Accept)
     """
     response = {'success': True}
     
@@ -29,11 +40,11 @@ def success_response(data=None, message=None, status_code=200):
     if message:
         response['message'] = message
     
-    return jsonify(response), status_code
+    return make_response(response), status_code
 
 def error_response(error_message, error_code=None, details=None, status_code=400):
     """
-    Cria uma resposta de erro padronizada
+    Cria uma resposta de erro padronizada (no mesmo formato negociado)
     """
     response = {
         'success': False,
@@ -47,7 +58,7 @@ def error_response(error_message, error_code=None, details=None, status_code=400
     if details:
         response['details'] = details
     
-    return jsonify(response), status_code
+    return make_response(response), status_code
 
 def validate_required_fields(data, required_fields):
     """
@@ -61,29 +72,153 @@ def validate_required_fields(data, required_fields):
     
     return missing_fields
 
-def paginate_query(query, page=1, per_page=20, max_per_page=100):
+def parse_timestamp(value):
+    """
+    Converte um horário ISO 8601 enviado pelo cliente em datetime UTC sem fuso
+    (o formato das colunas DateTime). Levanta ValueError se for inválido.
+    """
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def encode_cursor(values, direction='next'):
+    """
+    Codifica a posição (created_at, id) de um item em um cursor opaco
+    """
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps({'v': payload, 'd': direction}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decodifica um cursor gerado por encode_cursor
+    Retorna ((created_at, id), direction)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        created_at, item_id = data['v']
+        direction = data['d']
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return (datetime.fromisoformat(created_at), item_id), direction
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError('Cursor de paginação inválido') from e
+
+def _count_total(query, count_key, count_mode):
+    """
+    Retorna (total, is_estimate), usando o cache de totais quando há count_key
+    """
+    if count_key is None:
+        return query.order_by(None).count(), False
+    
+    from src.utils.count_cache import count_query, COUNT_MODES
+    entity, signature = count_key
+    if count_mode not in COUNT_MODES:
+        count_mode = 'cached'
+    return count_query(query, entity, signature, mode=count_mode)
+
+def _paginate_keyset(query, keyset, cursor, per_page, include_total, count_key, count_mode):
+    """
+    Paginação por cursor (keyset) em ordem decrescente de (created_at, id)
+    """
+    created_col, id_col = keyset
+    total, total_is_estimate = _count_total(query, count_key, count_mode) if include_total else (None, False)
+    
+    direction = 'next'
+    position = None
+    if cursor:
+        position, direction = decode_cursor(cursor)
+    
+    query = query.order_by(None)
+    if position is not None:
+        created_at, item_id = position
+        if direction == 'next':
+            query = query.filter(or_(
+                created_col < created_at,
+                and_(created_col == created_at, id_col < item_id)
+            ))
+        else:
+            query = query.filter(or_(
+                created_col > created_at,
+                and_(created_col == created_at, id_col > item_id)
+            ))
+    
+    if direction == 'next':
+        query = query.order_by(created_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(created_col.asc(), id_col.asc())
+    
+    # Busca um item a mais para saber se existe outra página
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    
+    if direction == 'next':
+        has_next, has_prev = has_more, position is not None
+    else:
+        items.reverse()
+        has_next, has_prev = True, has_more
+    
+    def position_of(item):
+        return (getattr(item, created_col.key), getattr(item, id_col.key))
+    
+    pagination = {
+        'mode': 'cursor',
+        'per_page': per_page,
+        'has_next': has_next and bool(items),
+        'has_prev': has_prev and bool(items),
+        'next_cursor': encode_cursor(position_of(items[-1]), 'next') if has_next and items else None,
+        'prev_cursor': encode_cursor(position_of(items[0]), 'prev') if has_prev and items else None
+    }
+    if include_total:
+        pagination['total'] = total
+        if total_is_estimate:
+            pagination['total_is_estimate'] = True
+    
+    return {'items': items, 'pagination': pagination}
+
+def paginate_query(query, page=1, per_page=20, max_per_page=100, cursor=None, keyset=None, include_total=False,
+                   count_key=None, count_mode='cached'):
     """
     Aplica paginação a uma query SQLAlchemy
+    
+    Com ``cursor`` (string vazia para a primeira página) e ``keyset`` com as
+    colunas (created_at, id), usa paginação por cursor: sem OFFSET e sem
+    COUNT(*), a menos que ``include_total`` seja pedido.
+    
+    ``count_key`` = (entidade, assinatura de filtro) ativa o cache de totais;
+    ``count_mode`` pode ser 'cached', 'exact' ou 'estimate'.
     """
     # Limitar per_page ao máximo permitido
     per_page = min(per_page, max_per_page)
     
-    # Executar a paginação
+    if cursor is not None and keyset is not None:
+        return _paginate_keyset(query, keyset, cursor, max(per_page, 1), include_total, count_key, count_mode)
+    
+    # Executar a paginação (o total é calculado à parte, possivelmente em cache)
     paginated = query.paginate(
         page=page,
         per_page=per_page,
-        error_out=False
+        error_out=False,
+        count=False
     )
+    paginated.total, total_is_estimate = _count_total(query, count_key, count_mode)
+    
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'total': paginated.total,
+        'pages': paginated.pages,
+        'has_next': paginated.has_next,
+        'has_prev': paginated.has_prev
+    }
+    if total_is_estimate:
+        pagination['total_is_estimate'] = True
     
     return {
         'items': paginated.items,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': paginated.total,
-            'pages': paginated.pages,
-            'has_next': paginated.has_next,
-            'has_prev': paginated.has_prev
-        }
+        'pagination': pagination
     }
 
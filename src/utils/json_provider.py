@@ -0,0 +1,150 @@
+"""
+Provedor JSON do Flask (``app.json``), usado por ``jsonify`` e portanto por
+``success_response``/``error_response``.
+
+Usa o orjson quando está instalado (serialização em C, bytes direto para o
+corpo da resposta) e, sem ele, o ``json`` da biblioteca padrão em modo
+compacto, sem ordenar as chaves e sem escapar caracteres não ASCII. Datas
+continuam no formato do Flask (RFC 822) nos dois casos.
+
+Trechos já serializados entram na resposta sem serem decodificados de novo
+quando embrulhados em ``RawJSON`` (ver ``src/utils/fragments.py``).
+
+Configuração por variáveis de ambiente:
+    JSON_BACKEND   auto (padrão: orjson se disponível), orjson ou stdlib
+"""
+
+import os
+import re
+import json
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+
+# Marcador dos trechos RawJSON na saída do encoder da biblioteca padrão:
+# a string "\u0000<nonce>:<índice>" (o nonce evita colisão com dados reais)
+_PLACEHOLDER_NONCE = os.urandom(8).hex()
+_PLACEHOLDER = re.compile(rb'"\\u0000' + _PLACEHOLDER_NONCE.encode() + rb':(\d+)"')
+
+
+class RawJSON:
+    """
+    JSON já serializado (bytes UTF-8), inserido como está na saída
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return f'RawJSON({self.data!r})'
+
+
+def _backend(name=JSON_BACKEND):
+    if name == 'orjson' or (name == 'auto' and orjson is not None):
+        if orjson is None:
+            raise RuntimeError('JSON_BACKEND=orjson, mas o pacote orjson não está instalado')
+        return 'orjson'
+    return 'stdlib'
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Provedor JSON com backend plugável (orjson ou biblioteca padrão) e
+    suporte a ``RawJSON``
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+
+    def __init__(self, app, backend=JSON_BACKEND):
+        super().__init__(app)
+        self.backend = _backend(backend)
+        if self.backend == 'orjson':
+            self._orjson_option = (
+                orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+            )
+            # orjson >= 3.10 aceita trechos prontos (Fragment)
+            self._fragment = getattr(orjson, 'Fragment', None)
+
+    def dumps_bytes(self, obj, indent=False):
+        """Serializa ``obj`` para bytes UTF-8"""
+        if self.backend == 'orjson' and (self._fragment is not None or not _contains_raw(obj)):
+            option = self._orjson_option | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, default=self._orjson_default, option=option)
+        return self._stdlib_dumps(obj, indent)
+
+    def _orjson_default(self, obj):
+        if isinstance(obj, RawJSON):
+            return self._fragment(obj.data)
+        return self.default(obj)
+
+    def _stdlib_dumps(self, obj, indent):
+        raw = []
+
+        def default(value):
+            if isinstance(value, RawJSON):
+                raw.append(value.data)
+                return f'\x00{_PLACEHOLDER_NONCE}:{len(raw) - 1}'
+            return self.default(value)
+
+        if indent:
+            kwargs = {'indent': 2}
+        else:
+            kwargs = {'separators': (',', ':')}
+        data = json.dumps(
+            obj, default=default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys, **kwargs
+        ).encode()
+        if raw:
+            data = _PLACEHOLDER.sub(lambda match: raw[int(match.group(1))], data)
+        return data
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Argumentos específicos do módulo json: mantém o comportamento padrão
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def _contains_raw(obj):
+    """Se há algum RawJSON em ``obj`` (orjson sem suporte a Fragment)"""
+    if isinstance(obj, RawJSON):
+        return True
+    if isinstance(obj, dict):
+        return any(_contains_raw(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_contains_raw(value) for value in obj)
+    return False
+
+
+def init_json(app, backend=JSON_BACKEND):
+    """Instala o provedor no app"""
+    app.json = FastJSONProvider(app, backend)
+    return app.json
+
+
+def dumps_bytes(obj):
+    """Serializa com o provedor do app atual (bytes UTF-8, compacto)"""
+    provider = current_app.json
+    if isinstance(provider, FastJSONProvider):
+        return provider.dumps_bytes(obj)
+    return provider.dumps(obj, separators=(',', ':')).encode()
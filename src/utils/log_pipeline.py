@@ -0,0 +1,317 @@
+"""
+Logging estruturado sem I/O na thread da requisição.
+
+O handler instalado por ``configure_logging`` só faz o trabalho barato na
+thread que loga: amostragem, cópia do contexto da requisição (request_id,
+user_id e rota, lidos de ``g``/``request``) e a interpolação da mensagem.
+O registro vai para uma fila limitada e uma thread em segundo plano formata
+em JSON (``JsonFormatter``) e escreve em lote no stderr.
+
+Amostragem: registros abaixo de WARNING podem ser amostrados por nível
+(LOG_SAMPLE_RATES) e por rota (LOG_ROUTE_SAMPLE_RATES, pelo endpoint do
+Flask, que tem prioridade sobre a taxa do nível). Avisos e erros nunca são
+amostrados.
+
+Memória limitada: com a fila cheia o registro é descartado na hora (a
+requisição nunca espera pelo log) e o descarte é contado por nível, em
+``/api/health/logging``.
+
+Configuração por variáveis de ambiente:
+    LOG_LEVEL               nível mínimo (padrão INFO)
+    LOG_QUEUE_SIZE          capacidade da fila (padrão 10000)
+    LOG_BATCH_SIZE          registros por escrita (padrão 500)
+    LOG_SAMPLE_RATES        taxas por nível, ex.: "DEBUG=0.01,INFO=0.5" (padrão: tudo)
+    LOG_ROUTE_SAMPLE_RATES  taxas por endpoint, ex.: "health.health_check=0,portals.get_portals=0.1"
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from flask import g, request, has_request_context
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 500))
+LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+LOG_ROUTE_SAMPLE_RATES = os.environ.get('LOG_ROUTE_SAMPLE_RATES', '')
+
+# Espera máxima da thread de escrita por novos registros
+LOG_FLUSH_INTERVAL = 0.5
+
+SERVICE_NAME = 'portales-api'
+
+
+def parse_rates(value, key=str):
+    """"NOME=taxa,NOME=taxa" -> {NOME: taxa entre 0 e 1}"""
+    rates = {}
+    for item in value.split(','):
+        name, sep, rate = item.partition('=')
+        if not sep or not name.strip():
+            continue
+        rates[key(name.strip())] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def _level_number(name):
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(f'Nível de log desconhecido: {name}')
+    return level
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        log_record = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat().replace('+00:00', 'Z'),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "service": SERVICE_NAME,
+            "module": record.name,
+            "function": record.funcName,
+        }
+        if getattr(record, 'request_id', None):
+            log_record['request_id'] = record.request_id
+        if getattr(record, 'user_id', None):
+            log_record['user_id'] = record.user_id
+        if getattr(record, 'route', None):
+            log_record['route'] = record.route
+        if record.exc_info:
+            log_record['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_record['exc_info'] = record.exc_text
+        if record.stack_info:
+            log_record['stack_info'] = self.formatStack(record.stack_info)
+        if hasattr(record, 'details'):
+            log_record['details'] = record.details
+
+        return json.dumps(log_record, ensure_ascii=False, default=str)
+
+
+class LogPipeline:
+    """
+    Fila limitada + thread que formata e escreve os registros em lote
+    """
+
+    def __init__(self, queue_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                 level_rates=None, route_rates=None, stream=None, formatter=None):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.level_rates = parse_rates(LOG_SAMPLE_RATES, _level_number) if level_rates is None else level_rates
+        self.route_rates = parse_rates(LOG_ROUTE_SAMPLE_RATES) if route_rates is None else route_rates
+        self.stream = stream
+        self.formatter = formatter or JsonFormatter()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self._atexit = False
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # O mestre do servidor loga antes do fork: a thread de escrita pode
+        # estar com um dos locks no momento do fork, e no filho ele nunca
+        # seria liberado
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset()
+        self._pid = None
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.sampled_out = 0
+        self.dropped = {}
+
+    def _ensure_started(self):
+        # Uma thread por processo (servidores que fazem fork depois do import)
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+                self._pid = os.getpid()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+            if not self._atexit:
+                atexit.register(self.shutdown)
+                self._atexit = True
+
+    def sampled(self, record):
+        """Se o registro deve ser mantido, pela taxa da rota ou do nível"""
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.route_rates.get(getattr(record, 'route', None))
+        if rate is None:
+            rate = self.level_rates.get(record.levelno, 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        with self._stats_lock:
+            self.sampled_out += 1
+        return False
+
+    def submit(self, record):
+        """Coloca o registro na fila sem esperar. Retorna False se foi descartado."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+            return False
+        with self._stats_lock:
+            self.enqueued += 1
+        return True
+
+    def _drain(self, first_timeout):
+        try:
+            batch = [self._queue.get(timeout=first_timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                lines.append(json.dumps({
+                    'level': 'ERROR', 'service': SERVICE_NAME, 'message': 'Registro de log não formatável',
+                    'module': record.name,
+                }))
+        stream = self.stream or sys.stderr
+        try:
+            stream.write('\n'.join(lines) + '\n')
+            stream.flush()
+        except Exception:
+            with self._stats_lock:
+                self.failed += len(batch)
+            return
+        with self._stats_lock:
+            self.written += len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(LOG_FLUSH_INTERVAL)
+            if batch:
+                self._write(batch)
+        while True:
+            batch = self._drain(0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def flush(self, timeout=5):
+        """Espera a fila ser escrita. Retorna True se esvaziou dentro do prazo."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._stats_lock:
+                if self.written + self.failed >= self.enqueued:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def shutdown(self, timeout=5):
+        """Para a thread depois de escrever os registros pendentes"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_size': self._queue.qsize(),
+                'queue_capacity': self.queue_size,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'failed': self.failed,
+                'sampled_out': self.sampled_out,
+                'dropped': dict(self.dropped),
+                'level_sample_rates': {logging.getLevelName(level): rate for level, rate in self.level_rates.items()},
+                'route_sample_rates': dict(self.route_rates),
+            }
+
+
+class PipelineHandler(logging.Handler):
+    """
+    Handler que entrega os registros ao ``LogPipeline``
+    """
+
+    def __init__(self, pipeline, level=logging.NOTSET):
+        super().__init__(level)
+        self.pipeline = pipeline
+
+    def handle(self, record):
+        # Sem o lock do Handler: a fila já é thread-safe
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def emit(self, record):
+        try:
+            record = self.prepare(record)
+            if self.pipeline.sampled(record):
+                self.pipeline.submit(record)
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record):
+        """
+        Copia o registro com o contexto da requisição e a mensagem já
+        interpolada (os argumentos podem mudar depois que a thread seguir)
+        """
+        record = copy.copy(record)
+        if has_request_context():
+            if getattr(record, 'request_id', None) is None:
+                record.request_id = g.get('request_id')
+            if getattr(record, 'user_id', None) is None:
+                record.user_id = g.get('current_user_id')
+            if getattr(record, 'route', None) is None:
+                record.route = request.endpoint
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # O traceback mantém os frames vivos; é formatado aqui
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+log_pipeline = LogPipeline()
+
+
+def configure_logging(app, logger_names=('src',), level=LOG_LEVEL):
+    """
+    Envia os logs do app e dos módulos (``src.*``) pelo pipeline
+    """
+    handler = PipelineHandler(log_pipeline)
+    for logger in [app.logger] + [logging.getLogger(name) for name in logger_names]:
+        # Substitui os handlers padrão (escrita síncrona) pelo pipeline
+        for existing in list(logger.handlers):
+            logger.removeHandler(existing)
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+    return handler
@@ -0,0 +1,364 @@
+"""
+Métricas de requisições no formato texto do Prometheus (``GET /api/metrics``).
+
+Por requisição são registrados, por endpoint do Flask:
+    http_requests_total                  contador por método e status
+    http_request_duration_seconds        histograma de latência
+    http_response_size_bytes             histograma do tamanho do corpo
+    db_statements_per_request            histograma de comandos SQL executados
+    db_time_per_request_seconds          histograma do tempo gasto no banco
+    db_statements_total                  contador de comandos SQL
+
+Os comandos SQL são contados pelos eventos ``before/after_cursor_execute``
+dos engines (escrita e leitura) e somados à requisição em andamento; o que
+as threads de segundo plano executam não entra na conta de nenhuma rota.
+
+Vários processos: cada worker acumula as próprias métricas em memória e
+grava periodicamente um retrato em ``METRICS_DIR`` (um arquivo por PID).
+``/api/metrics`` soma os arquivos de todos os workers com o estado atual do
+próprio processo. Quando um worker termina, o mestre incorpora o retrato
+dele a um arquivo acumulado, para que os contadores nunca diminuam com a
+reciclagem; ``src.serve`` limpa o diretório ao iniciar.
+Sem ``METRICS_DIR``, as métricas são só do processo atual.
+
+Configuração por variáveis de ambiente:
+    METRICS_DIR              diretório compartilhado pelos workers (padrão: nenhum)
+    METRICS_FLUSH_INTERVAL   segundos entre retratos gravados (padrão 5)
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import tempfile
+import threading
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# nome: (tipo, descrição, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requisições atendidas', None),
+    'http_request_duration_seconds': ('histogram', 'Latência das requisições', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Tamanho do corpo das respostas', SIZE_BUCKETS),
+    'db_statements_per_request': ('histogram', 'Comandos SQL por requisição', STATEMENT_BUCKETS),
+    'db_time_per_request_seconds': ('histogram', 'Tempo no banco por requisição', DB_TIME_BUCKETS),
+    'db_statements_total': ('counter', 'Comandos SQL executados por requisições', None),
+}
+
+SNAPSHOT_PREFIX = 'metrics-'
+# Soma dos retratos dos workers que já terminaram
+ARCHIVE_NAME = 'archive'
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas em memória, com retratos em arquivo para
+    agregar vários processos
+    """
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._atexit = False
+        self._reset()
+
+    def _reset(self):
+        self._counters = {}
+        self._histograms = {}
+        self._dirty = False
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _check_pid(self):
+        # Depois de um fork o filho começa do zero (o mestre não soma duas vezes)
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+                    self._pid = os.getpid()
+        if self.directory and self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+                    self._thread.start()
+                    if not self._atexit:
+                        atexit.register(self.shutdown)
+                        self._atexit = True
+
+    def inc(self, name, labels, amount=1):
+        self._check_pid()
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+
+    def observe(self, name, labels, value):
+        self._check_pid()
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+            self._dirty = True
+
+    def snapshot(self):
+        """Estado do processo em formato serializável"""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [
+                    [name, list(labels), list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self._histograms.items()
+                ],
+            }
+
+    # --- Retratos em arquivo ---------------------------------------------------
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f'{SNAPSHOT_PREFIX}{pid}.json')
+
+    def flush(self):
+        """Grava o retrato do processo (escrita atômica)"""
+        if not self.directory or self._pid != os.getpid():
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        data = json.dumps(self.snapshot())
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self._snapshot_path(os.getpid()))
+        except OSError:
+            logger.exception('Falha ao gravar retrato de métricas')
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self.flush()
+
+    def _snapshots(self):
+        """Retratos dos outros processos (o atual entra com o estado em memória)"""
+        snapshots = [self.snapshot()]
+        if not self.directory or not os.path.isdir(self.directory):
+            return snapshots
+        archived = self._load(self._snapshot_path(ARCHIVE_NAME))
+        if archived is not None:
+            snapshots.append(archived)
+        # Workers já somados ao acumulado (o arquivo deles está sendo removido)
+        skip = {f'{SNAPSHOT_PREFIX}{pid}.json' for pid in (archived or {}).get('pids', [])}
+        skip.add(f'{SNAPSHOT_PREFIX}{os.getpid()}.json')
+        skip.add(f'{SNAPSHOT_PREFIX}{ARCHIVE_NAME}.json')
+        for filename in os.listdir(self.directory):
+            if filename.startswith(SNAPSHOT_PREFIX) and filename not in skip:
+                snapshot = self._load(os.path.join(self.directory, filename))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return snapshots
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def aggregate(self):
+        """Soma os retratos de todos os processos: (contadores, histogramas)"""
+        self._check_pid()
+        counters, histograms = {}, {}
+        for snapshot in self._snapshots():
+            _merge(counters, histograms, snapshot)
+        return counters, histograms
+
+    def archive(self, pid):
+        """
+        Incorpora o retrato de um worker que terminou ao arquivo acumulado
+        (chamado pelo mestre, que é o único a escrever nele), para que o
+        número de arquivos não cresça com a reciclagem dos workers
+        """
+        if not self.directory:
+            return
+        path = self._snapshot_path(pid)
+        archive_path = self._snapshot_path(ARCHIVE_NAME)
+        snapshot = self._load(path)
+        if snapshot is None:
+            return
+        archived = self._load(archive_path) or {'counters': [], 'histograms': [], 'pids': []}
+        counters, histograms = {}, {}
+        _merge(counters, histograms, archived)
+        _merge(counters, histograms, snapshot)
+        # Os leitores ignoram o arquivo destes PIDs, já incluídos no acumulado
+        pids = [p for p in archived.get('pids', []) if os.path.exists(self._snapshot_path(p))] + [pid]
+        data = json.dumps({
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), *values] for (name, labels), values in histograms.items()],
+            'pids': pids,
+        })
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp, archive_path)
+        os.unlink(path)
+
+    def clear_directory(self):
+        """Remove os retratos gravados (início do servidor)"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.startswith((SNAPSHOT_PREFIX, '.tmp-')):
+                try:
+                    os.unlink(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    # --- Formato do Prometheus -------------------------------------------------
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (todos os processos)"""
+        counters, histograms = self.aggregate()
+        lines = []
+        for name, (kind, description, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge(counters, histograms, snapshot):
+    """Soma um retrato aos dicionários de contadores e histogramas"""
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, counts, total, count in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        current = histograms.get(key)
+        if current is None:
+            histograms[key] = [list(counts), total, count]
+        else:
+            current[0] = [a + b for a, b in zip(current[0], counts)]
+            current[1] += total
+            current[2] += count
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry()
+
+
+# --- Instrumentação -------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None or not has_request_context():
+        return
+    g.db_statements = g.get('db_statements', 0) + 1
+    g.db_time = g.get('db_time', 0.0) + time.perf_counter() - started
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.db_statements = 0
+    g.db_time = 0.0
+
+
+def _after_request(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    labels = (('endpoint', endpoint),)
+    metrics.inc('http_requests_total', (
+        ('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))
+    ))
+    metrics.observe('http_request_duration_seconds', labels, time.perf_counter() - started)
+    if not response.direct_passthrough and not response.is_streamed:
+        metrics.observe('http_response_size_bytes', labels, response.calculate_content_length() or 0)
+    statements = g.get('db_statements', 0)
+    metrics.observe('db_statements_per_request', labels, statements)
+    metrics.observe('db_time_per_request_seconds', labels, g.get('db_time', 0.0))
+    if statements:
+        metrics.inc('db_statements_total', labels, statements)
+    return response
+
+
+def init_metrics(app, db):
+    """
+    Registra os hooks de requisição e os eventos de SQL em todos os engines
+    (chamar depois de ``configure_database``)
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
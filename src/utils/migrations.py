@@ -0,0 +1,93 @@
+"""
+Migrações versionadas do schema.
+
+``db.create_all()`` cria as tabelas que ainda não existem; o resto da
+evolução do schema (colunas novas, índices) fica aqui, em migrações
+numeradas aplicadas em ordem. A tabela ``schema_migrations`` registra as que
+já rodaram, então cada uma é aplicada uma única vez por banco, sem recriá-lo.
+
+Cada passo é um comando SQL ou uma função sem argumentos. Os passos devem ser
+idempotentes (``IF NOT EXISTS``/``IF EXISTS``): se o processo cair no meio de
+uma migração, ela roda de novo por inteiro na próxima inicialização.
+
+Para mudar um índice, crie uma migração nova que remova o antigo e crie o
+novo; migrações já aplicadas não devem ser editadas.
+"""
+
+from datetime import datetime
+from sqlalchemy import text
+from src.models.user import db
+from src.utils.schema import upgrade_schema
+
+MIGRATIONS_TABLE = 'schema_migrations'
+
+# Condição dos índices parciais: a mesma que as listagens públicas usam
+# (SQLAlchemy gera "is_public = 1 AND is_active = 1" para filter_by(...=True))
+PUBLIC_PORTALS = 'is_public = 1 AND is_active = 1'
+
+# (versão, descrição, passos)
+MIGRATIONS = [
+    (1, 'colunas de contadores e visualizações', [
+        upgrade_schema,
+    ]),
+    (2, 'índices das rotas de leitura', [
+        # Listagem pública (ordem por data com keyset created_at, id), com e sem categoria
+        f'CREATE INDEX IF NOT EXISTS ix_portals_public_created ON portals (created_at, id) WHERE {PUBLIC_PORTALS}',
+        f'CREATE INDEX IF NOT EXISTS ix_portals_public_category ON portals (category_id, created_at, id) '
+        f'WHERE {PUBLIC_PORTALS}',
+        # Portais de um criador e contagens por categoria (inclui privados)
+        'CREATE INDEX IF NOT EXISTS ix_portals_creator ON portals (creator_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_portals_category ON portals (category_id)',
+        'CREATE INDEX IF NOT EXISTS ix_reviews_portal_created ON reviews (portal_id, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_reviews_user ON reviews (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_explorations_user_created ON explorations (user_id, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_explorations_portal ON explorations (portal_id, created_at)',
+        # Lado inverso das tabelas de associação (a chave primária começa por user_id)
+        'CREATE INDEX IF NOT EXISTS ix_user_portal_likes_portal ON user_portal_likes (portal_id, user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_user_portal_favorites_portal ON user_portal_favorites (portal_id, user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_user_follows_followed ON user_follows (followed_id, follower_id)',
+    ]),
+]
+
+
+def _applied_versions(conn):
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ('
+        f'version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at DATETIME NOT NULL)'
+    ))
+    return {row[0] for row in conn.execute(text(f'SELECT version FROM {MIGRATIONS_TABLE}'))}
+
+
+def run_migrations():
+    """
+    Aplica as migrações pendentes, em ordem. Retorna as versões aplicadas.
+    Deve ser chamado dentro de um app context, após ``db.create_all()``.
+    """
+    with db.engine.begin() as conn:
+        applied = _applied_versions(conn)
+
+    ran = []
+    for version, name, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        for step in steps:
+            if callable(step):
+                step()
+            else:
+                with db.engine.begin() as conn:
+                    conn.execute(text(step))
+        with db.engine.begin() as conn:
+            conn.execute(
+                text(f'INSERT OR IGNORE INTO {MIGRATIONS_TABLE} (version, name, applied_at) VALUES (:v, :n, :at)'),
+                {'v': version, 'n': name, 'at': datetime.utcnow()}
+            )
+        ran.append(version)
+    return ran
+
+
+def migration_status():
+    """[(versão, descrição, aplicada em ou None)]"""
+    with db.engine.begin() as conn:
+        _applied_versions(conn)
+        applied = dict(conn.execute(text(f'SELECT version, applied_at FROM {MIGRATIONS_TABLE}')).all())
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
@@ -0,0 +1,85 @@
+"""
+Negociação de conteúdo: JSON ou MessagePack.
+
+Respostas: ``success_response``/``error_response`` devolvem MessagePack
+quando o cliente prefere esse formato no cabeçalho ``Accept``
+(``application/msgpack``); o schema é o mesmo do JSON. Sem preferência
+explícita (``*/*`` ou sem cabeçalho), a resposta continua em JSON.
+
+Requisições: corpos com ``Content-Type: application/msgpack`` são aceitos
+por ``request.get_json()``, que devolve os mesmos dicts/listas do JSON, então
+as rotas não precisam saber o formato.
+"""
+
+import msgpack
+from flask import Request, current_app, request, has_request_context
+from werkzeug.exceptions import BadRequest
+from src.utils.json_provider import RawJSON
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Nomes usados por outros clientes para o mesmo formato
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+def response_mimetype():
+    """Formato da resposta para a requisição atual (JSON por padrão)"""
+    if not has_request_context() or not request.accept_mimetypes:
+        return JSON_MIMETYPE
+    best = request.accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    # Em empate (ex.: */*), best_match fica com o primeiro da lista: JSON
+    return MSGPACK_MIMETYPE if best in MSGPACK_MIMETYPES else JSON_MIMETYPE
+
+
+def _default(value):
+    if isinstance(value, RawJSON):
+        # Trecho pré-serializado em JSON (cache de portais): volta a ser objeto
+        return current_app.json.loads(value.data)
+    return current_app.json.default(value)
+
+
+def packb(obj):
+    """Serializa em MessagePack com as mesmas conversões do JSON (datas, UUIDs...)"""
+    return msgpack.packb(obj, default=_default, use_bin_type=True, datetime=False)
+
+
+def make_response(payload):
+    """
+    Resposta com ``payload`` no formato preferido pelo cliente
+    (equivalente a ``jsonify``)
+    """
+    if response_mimetype() == MSGPACK_MIMETYPE:
+        response = current_app.response_class(packb(payload), mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = current_app.json.response(payload)
+    response.vary.add('Accept')
+    return response
+
+
+class NegotiatingRequest(Request):
+    """
+    Request que também decodifica corpos MessagePack em ``get_json``
+    """
+
+    @property
+    def is_msgpack(self):
+        return self.mimetype in MSGPACK_MIMETYPES
+
+    def get_json(self, force=False, silent=False, cache=True):
+        if not self.is_msgpack:
+            return super().get_json(force=force, silent=silent, cache=cache)
+
+        cached = getattr(self, '_cached_msgpack', None)
+        if cached is not None:
+            return cached
+
+        try:
+            data = msgpack.unpackb(self.get_data(cache=cache), raw=False, strict_map_key=False)
+        except (ValueError, TypeError) as e:
+            if silent:
+                return None
+            raise BadRequest(f'Corpo MessagePack inválido: {e}') from e
+
+        if cache:
+            self._cached_msgpack = data
+        return data
@@ -0,0 +1,138 @@
+"""
+Série temporal diária de engajamento por portal.
+
+A tabela ``portal_daily_stats`` tem uma linha por (portal, dia) com
+visualizações, curtidas, favoritos, reviews, explorações e ativações de AR.
+Como nos agregados do dashboard (``src.utils.rollups``), triggers no banco
+somam +1/-1 no dia do ``created_at`` de cada linha inserida ou removida; as
+visualizações entram quando os contadores de ``src.utils.views`` são gravados.
+
+Um período de 30, 90 ou 365 dias de um portal é uma única leitura por faixa
+da chave primária.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from src.models.user import db
+from src.models.portal_stats import PortalDailyStats
+
+SERIES_METRICS = ('views', 'likes', 'favorites', 'reviews', 'explorations', 'ar_activations')
+
+# métrica -> (tabela de origem, condição SQL extra sobre a linha ``{row}`` ou None)
+# As visualizações não têm tabela de origem: vêm do flush de src.utils.views
+TRIGGERED_METRICS = {
+    'likes': ('user_portal_likes', None),
+    'favorites': ('user_portal_favorites', None),
+    'reviews': ('reviews', None),
+    'explorations': ('explorations', None),
+    'ar_activations': ('explorations', '{row}.ar_activated = 1'),
+}
+
+# Colunas extras que, se alteradas, movem a linha de métrica
+_CONDITION_COLUMNS = {
+    'ar_activations': ('ar_activated',),
+}
+
+
+def _condition(metric, alias):
+    condition = f'{alias}.portal_id IS NOT NULL AND {alias}.created_at IS NOT NULL'
+    extra = TRIGGERED_METRICS[metric][1]
+    if extra:
+        condition += f' AND {extra.format(row=alias)}'
+    return condition
+
+
+def _upsert(metric, alias, delta):
+    return (
+        f"INSERT INTO portal_daily_stats (portal_id, day, {metric}) "
+        f"SELECT {alias}.portal_id, date({alias}.created_at), {delta} WHERE {_condition(metric, alias)} "
+        f"ON CONFLICT(portal_id, day) DO UPDATE SET {metric} = {metric} + excluded.{metric};"
+    )
+
+
+def _ddl(metric):
+    source = TRIGGERED_METRICS[metric][0]
+    columns = ', '.join(('portal_id', 'created_at') + _CONDITION_COLUMNS.get(metric, ()))
+    name = f'series_{metric}'
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {source} BEGIN {_upsert(metric, 'new', 1)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {source} BEGIN {_upsert(metric, 'old', -1)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {columns} ON {source} BEGIN "
+        f"{_upsert(metric, 'old', -1)} {_upsert(metric, 'new', 1)} END",
+    ]
+
+
+def ensure_portal_series():
+    """
+    Cria os triggers, se ainda não existirem, e faz o backfill na primeira vez.
+    Deve ser chamado dentro de um app context, após ``db.create_all()``.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+        }
+        missing = [metric for metric in TRIGGERED_METRICS if f'series_{metric}_ai' not in existing]
+        for metric in missing:
+            for statement in _ddl(metric):
+                conn.execute(text(statement))
+        if missing:
+            _backfill(conn, missing)
+    return True
+
+
+def _backfill(conn, metrics):
+    for metric in metrics:
+        source = TRIGGERED_METRICS[metric][0]
+        conn.execute(text(f"UPDATE portal_daily_stats SET {metric} = 0"))
+        conn.execute(text(
+            f"INSERT INTO portal_daily_stats (portal_id, day, {metric}) "
+            f"SELECT src.portal_id, date(src.created_at), COUNT(*) FROM {source} AS src "
+            f"WHERE {_condition(metric, 'src')} GROUP BY src.portal_id, date(src.created_at) "
+            f"ON CONFLICT(portal_id, day) DO UPDATE SET {metric} = excluded.{metric}"
+        ))
+
+
+def rebuild_portal_series():
+    """
+    Recalcula a série inteira a partir das tabelas de origem e das
+    visualizações diárias já gravadas. Retorna o número de linhas.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM portal_daily_stats"))
+        _backfill(conn, list(TRIGGERED_METRICS))
+        conn.execute(text(
+            "INSERT INTO portal_daily_stats (portal_id, day, views) "
+            "SELECT portal_id, period, views FROM portal_view_counts WHERE period != 'all' "
+            "ON CONFLICT(portal_id, day) DO UPDATE SET views = excluded.views"
+        ))
+        conn.execute(text(f"DELETE FROM portal_daily_stats WHERE {' AND '.join(f'{m} = 0' for m in SERIES_METRICS)}"))
+        return conn.execute(text("SELECT COUNT(*) FROM portal_daily_stats")).scalar()
+
+
+def get_portal_series(portal_id, days, end=None):
+    """
+    Série dos últimos ``days`` dias de um portal (até ``end``, padrão hoje em UTC),
+    em ordem cronológica, no formato de colunas:
+    {'days': ['AAAA-MM-DD', ...], 'views': [...], 'likes': [...], ...}
+    """
+    end = end or datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+
+    rows = PortalDailyStats.query.filter(
+        PortalDailyStats.portal_id == portal_id,
+        PortalDailyStats.day.between(start, end)
+    ).all()
+    by_day = {row.day: row for row in rows}
+
+    series = {'days': []}
+    series.update({metric: [] for metric in SERIES_METRICS})
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day)
+        series['days'].append(day.strftime('%Y-%m-%d'))
+        for metric in SERIES_METRICS:
+            series[metric].append(getattr(row, metric) if row else 0)
+    return series
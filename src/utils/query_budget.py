@@ -0,0 +1,205 @@
+"""
+Orçamento de queries por rota e detecção de N+1.
+
+``record_queries`` registra cada comando SQL executado enquanto o bloco roda,
+com a origem: o atributo do ORM que disparou o carregamento preguiçoso
+(ex.: ``Category.portals`` acessado dentro de ``to_dict``) ou, para as
+demais queries, a primeira linha do código do projeto na pilha.
+
+``query_budget`` usa isso como gerenciador de contexto ou decorador e falha
+(``QueryBudgetExceeded``) se o número de comandos passar do limite.
+``check_scaling`` executa a mesma chamada com tamanhos de página diferentes
+e falha se o número de comandos crescer com a página, apontando o comando
+que se repete e a origem dele.
+
+Usado por ``src/check_query_budget.py``; também serve em testes::
+
+    with query_budget(5):
+        client.get('/api/portals')
+
+    @query_budget(3)
+    def listar():
+        ...
+"""
+
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import ContextDecorator, contextmanager
+from sqlalchemy import event
+from src.models.user import db
+from src.utils.database import RoutingSession
+
+# Arquivos ignorados ao procurar a origem de uma query na pilha
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PROJECT_DIR = os.path.dirname(_SRC_DIR)
+_SKIP_FILES = {os.path.abspath(__file__)}
+
+# Literais e listas de parâmetros não distinguem um comando de outro
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(\s*,\s*\?)*\s*\)'), '(?...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Rota ou bloco que executou mais queries que o permitido, ou cujo número
+    de queries cresce com o tamanho da página
+    """
+
+
+def normalize(statement):
+    """Forma canônica de um comando, para agrupar repetições"""
+    for pattern, replacement in _NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+def _caller():
+    """Primeira linha do código do projeto na pilha (fora deste módulo)"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_SRC_DIR) and filename not in _SKIP_FILES:
+            return f'{os.path.relpath(filename, _PROJECT_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return None
+
+
+def _loader_attribute(orm_execute_state):
+    """Atributo do ORM de um carregamento preguiçoso (relacionamento ou coluna adiada)"""
+    if orm_execute_state.is_relationship_load:
+        path = orm_execute_state.loader_strategy_path
+        if path is not None and len(path):
+            prop = path[-1]
+            return f'{prop.parent.class_.__name__}.{prop.key}'
+    if orm_execute_state.is_column_load:
+        state = orm_execute_state.lazy_loaded_from
+        mapper = state.mapper if state is not None else orm_execute_state.bind_mapper
+        if mapper is not None:
+            return f'{mapper.class_.__name__} (colunas adiadas)'
+    return None
+
+
+class QueryLog:
+    """
+    Comandos registrados: (sql, origem), na ordem de execução
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._pending = threading.local()
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __iter__(self):
+        return iter(self.queries)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self):
+        """[(comando normalizado, vezes, origem)] dos que se repetem, do mais frequente"""
+        counts = Counter(normalize(statement) for statement, _ in self.queries)
+        sources = {}
+        for statement, source in self.queries:
+            sources.setdefault(normalize(statement), source)
+        return [
+            (statement, times, sources[statement])
+            for statement, times in counts.most_common() if times > 1
+        ]
+
+    def describe(self, limit=3):
+        """Resumo legível dos comandos mais repetidos"""
+        lines = []
+        for statement, times, source in self.repeated()[:limit]:
+            lines.append(f'{times}x {statement[:160]}' + (f'\n      origem: {source}' if source else ''))
+        return '\n'.join(lines)
+
+    # Eventos
+    def _on_orm_execute(self, orm_execute_state):
+        self._pending.attribute = _loader_attribute(orm_execute_state)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        source = getattr(self._pending, 'attribute', None)
+        self._pending.attribute = None
+        self.queries.append((statement, source or _caller()))
+
+
+@contextmanager
+def record_queries():
+    """
+    Registra os comandos executados no bloco, em todos os engines.
+    Deve ser usado dentro de um app context.
+    """
+    log = QueryLog()
+    engines = list(db.engines.values())
+    event.listen(RoutingSession, 'do_orm_execute', log._on_orm_execute)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', log._on_execute)
+    try:
+        yield log
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', log._on_execute)
+        event.remove(RoutingSession, 'do_orm_execute', log._on_orm_execute)
+
+
+class query_budget(ContextDecorator):
+    """
+    Falha se o bloco (ou a função decorada) executar mais de ``max_queries``
+    comandos SQL
+    """
+
+    def __init__(self, max_queries, name=None):
+        self.max_queries = max_queries
+        self.name = name
+        self.log = None
+        self._recorder = None
+
+    def __enter__(self):
+        self._recorder = record_queries()
+        self.log = self._recorder.__enter__()
+        return self.log
+
+    def __exit__(self, exc_type, exc, tb):
+        self._recorder.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.log.count > self.max_queries:
+            label = f'{self.name}: ' if self.name else ''
+            raise QueryBudgetExceeded(
+                f'{label}{self.log.count} queries (orçamento {self.max_queries})\n{self.log.describe()}'
+            )
+        return False
+
+
+def check_scaling(call, sizes=(2, 10), name=None):
+    """
+    Executa ``call(tamanho)`` para cada tamanho de página e compara o número
+    de comandos. Retorna {tamanho: QueryLog}; levanta QueryBudgetExceeded se
+    houver mais comandos na página maior (N+1).
+    """
+    logs = {}
+    for size in sizes:
+        with record_queries() as log:
+            call(size)
+        logs[size] = log
+
+    smallest, largest = logs[min(sizes)], logs[max(sizes)]
+    if largest.count > smallest.count:
+        grew = Counter(normalize(s) for s, _ in largest) - Counter(normalize(s) for s, _ in smallest)
+        statement = grew.most_common(1)[0][0] if grew else None
+        source = next((src for s, src in largest if normalize(s) == statement), None)
+        label = f'{name}: ' if name else ''
+        detail = f'\n    {statement[:160]}' + (f'\n      origem: {source}' if source else '') if statement else ''
+        raise QueryBudgetExceeded(
+            f'{label}queries crescem com a página '
+            f'({min(sizes)} itens: {smallest.count}, {max(sizes)} itens: {largest.count}){detail}'
+        )
+    return logs
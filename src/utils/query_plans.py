@@ -0,0 +1,62 @@
+"""
+Verificação dos planos de consulta (SQLite ``EXPLAIN QUERY PLAN``).
+
+``capture_queries`` registra os SELECTs executados enquanto o bloco roda, e
+``full_scans`` aponta as tabelas lidas por inteiro (``SCAN tabela`` sem
+índice) em cada plano. Usado por ``src/check_query_plans.py``.
+"""
+
+import re
+from contextlib import contextmanager
+from sqlalchemy import event
+from src.models.user import db
+
+# Tabelas pequenas de referência, que podem ser lidas por inteiro
+SCAN_ALLOWED_TABLES = {'categories', 'tags'}
+
+_SCAN = re.compile(r'^SCAN (\S+)(.*)$')
+
+
+@contextmanager
+def capture_queries():
+    """
+    Coleta (sql, parâmetros) de cada SELECT executado, em todos os engines.
+    Deve ser usado dentro de um app context.
+    """
+    queries = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')) and not executemany:
+            queries.append((statement, parameters))
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        yield queries
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+
+def explain(conn, statement, parameters=()):
+    """Linhas do plano de uma consulta (coluna 'detail')"""
+    return [row[3] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+
+
+def full_scans(plan, allowed=SCAN_ALLOWED_TABLES):
+    """
+    Passos do plano que percorrem uma tabela inteira sem índice
+    (subconsultas materializadas e tabelas virtuais não contam)
+    """
+    scans = []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if not match:
+            continue
+        table, rest = match.groups()
+        if table.startswith('(') or table == 'CONSTANT' or 'USING' in rest or 'VIRTUAL TABLE' in rest:
+            continue
+        if table not in allowed:
+            scans.append(detail)
+    return scans
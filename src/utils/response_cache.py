@@ -0,0 +1,324 @@
+"""
+Cache de respostas para os endpoints GET públicos mais acessados.
+
+As respostas ficam em um backend plugável (LRU em memória por padrão, ou em
+arquivos para compartilhar o cache entre processos). Cada resposta é marcada
+com tags (``portals``, ``portal:<id>``, ``categories``...). Em vez de procurar
+as chaves de uma tag para apagá-las, cada tag tem uma versão que faz parte da
+chave: invalidar uma tag é só incrementar a versão dela.
+
+Configuração por variáveis de ambiente:
+    RESPONSE_CACHE_BACKEND      memory (padrão), file ou none
+    RESPONSE_CACHE_TTL          segundos (padrão 60)
+    RESPONSE_CACHE_MAX_ENTRIES  limite de entradas (padrão 2048)
+    RESPONSE_CACHE_DIR          diretório do backend file
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, g, make_response
+from src.utils.negotiation import response_mimetype
+
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 60))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+RESPONSE_CACHE_DIR = os.environ.get(
+    'RESPONSE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'portales-response-cache')
+)
+
+
+class MemoryBackend:
+    """
+    LRU em memória, por processo.
+
+    As versões das tags também ficam em um LRU (uma tag ``portal:<id>`` por
+    portal editado cresceria sem limite). As versões vêm de um contador único,
+    e uma tag descartada passa a valer o contador no momento do descarte
+    (``_floor``): a versão nunca volta a um valor antigo e entradas velhas não
+    reaparecem.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_tags=None):
+        self.max_entries = max_entries
+        self.max_tags = max_tags or max_entries
+        self._entries = OrderedDict()
+        self._tags = OrderedDict()
+        self._version = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            versions = []
+            for tag in tags:
+                if tag in self._tags:
+                    self._tags.move_to_end(tag)
+                versions.append(self._tags.get(tag, self._floor))
+            return versions
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._version += 1
+                self._tags[tag] = self._version
+                self._tags.move_to_end(tag)
+            while len(self._tags) > self.max_tags:
+                self._tags.popitem(last=False)
+                self._floor = self._version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileBackend:
+    """
+    Cache em arquivos, compartilhado entre os processos da mesma máquina.
+    Cada entrada é um arquivo com uma linha JSON de metadados seguida do corpo.
+    """
+
+    name = 'file'
+    _CLEANUP_EVERY = 200
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries_dir = os.path.join(directory, 'entries')
+        self._tags_dir = os.path.join(directory, 'tags')
+        os.makedirs(self._entries_dir, exist_ok=True)
+        os.makedirs(self._tags_dir, exist_ok=True)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _filename(value):
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def get(self, key):
+        path = os.path.join(self._entries_dir, self._filename(key))
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                if meta['expires'] < time.time():
+                    return None
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta['status'], meta['mimetype'], body
+
+    def set(self, key, value, ttl):
+        status, mimetype, body = value
+        meta = json.dumps({'expires': time.time() + ttl, 'status': status, 'mimetype': mimetype})
+        self._write_atomic(os.path.join(self._entries_dir, self._filename(key)), meta.encode() + b'\n' + body)
+
+        with self._lock:
+            self._writes += 1
+            cleanup = self._writes % self._CLEANUP_EVERY == 0
+        if cleanup:
+            self._cleanup()
+
+    def _cleanup(self):
+        """Remove as entradas mais antigas acima do limite"""
+        try:
+            paths = [os.path.join(self._entries_dir, name) for name in os.listdir(self._entries_dir)]
+            paths.sort(key=lambda path: os.stat(path).st_mtime)
+        except OSError:
+            return
+        for path in paths[:max(0, len(paths) - self.max_entries)]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def tag_versions(self, tags):
+        versions = []
+        for tag in tags:
+            try:
+                with open(os.path.join(self._tags_dir, self._filename(tag)), 'rb') as f:
+                    versions.append(f.read().decode())
+            except OSError:
+                versions.append('0')
+        return versions
+
+    def bump_tags(self, tags):
+        # Versão única (tempo + pid) dispensa lock entre processos
+        version = f'{time.time_ns()}-{os.getpid()}'.encode()
+        for tag in tags:
+            self._write_atomic(os.path.join(self._tags_dir, self._filename(tag)), version)
+
+    def clear(self):
+        for directory in (self._entries_dir, self._tags_dir):
+            for name in os.listdir(directory):
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def __len__(self):
+        try:
+            return len(os.listdir(self._entries_dir))
+        except OSError:
+            return 0
+
+
+class ResponseCache:
+    """
+    Cache de respostas com invalidação por tags e estatísticas de hit/miss
+    """
+
+    def __init__(self, backend=None, ttl=RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.endpoints = {}
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _record(self, endpoint, hit):
+        with self._stats_lock:
+            stats = self.endpoints.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            if hit:
+                self.hits += 1
+                stats['hits'] += 1
+            else:
+                self.misses += 1
+                stats['misses'] += 1
+
+    def make_key(self, endpoint, tags, vary_on_auth):
+        args = sorted(request.args.items(multi=True))
+        parts = [
+            endpoint, request.path, json.dumps(args), ','.join(map(str, self.backend.tag_versions(tags))),
+            # JSON e MessagePack são respostas diferentes para a mesma URL
+            response_mimetype()
+        ]
+        if vary_on_auth:
+            parts.append(getattr(g, 'current_user_id', None) or '')
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    def invalidate(self, *tags):
+        """
+        Invalida todas as respostas marcadas com qualquer uma das tags
+        """
+        if not self.enabled or not tags:
+            return
+        self.backend.bump_tags(tags)
+        with self._stats_lock:
+            self.invalidations += 1
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+        with self._stats_lock:
+            self._reset_stats()
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend.name if self.enabled else 'none',
+                'entries': len(self.backend) if self.enabled else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'invalidations': self.invalidations,
+                'endpoints': {name: dict(values) for name, values in self.endpoints.items()}
+            }
+
+    def cached(self, tags, ttl=None, vary_on_auth=False):
+        """
+        Decorador para views GET. ``tags`` é uma lista ou uma função que
+        recebe os argumentos da view e retorna a lista de tags.
+        Use ``vary_on_auth=True`` quando a resposta depende do usuário.
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not self.enabled or request.method != 'GET':
+                    return f(*args, **kwargs)
+
+                view_tags = tags(**kwargs) if callable(tags) else tags
+                key = self.make_key(request.endpoint, view_tags, vary_on_auth)
+
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._record(request.endpoint, hit=True)
+                    status, mimetype, body = entry
+                    response = make_response(body, status)
+                    response.mimetype = mimetype
+                    response.vary.add('Accept')
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._record(request.endpoint, hit=False)
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self.backend.set(key, (response.status_code, response.mimetype, response.get_data()), ttl or self.ttl)
+                    with self._stats_lock:
+                        self.stores += 1
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+            return decorated_function
+        return decorator
+
+
+def create_backend(name=RESPONSE_CACHE_BACKEND):
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'file':
+        return FileBackend()
+    return None
+
+
+response_cache = ResponseCache(create_backend())
@@ -0,0 +1,136 @@
+"""
+Agregados diários para o dashboard de analytics.
+
+A tabela ``daily_rollups`` guarda uma linha por (dia, métrica) com quantas
+linhas criadas naquele dia existem em cada tabela de origem. Triggers no banco
+somam +1 a cada INSERT e -1 a cada DELETE (no dia do ``created_at`` da linha),
+então inserts em lote e toggles de curtida também são contabilizados. Métricas
+com condição (portais públicos) acompanham também as mudanças de visibilidade.
+
+``rebuild_rollups`` recalcula tudo a partir das tabelas de origem (backfill).
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func, text
+from src.models.user import db
+from src.models.rollup import DailyRollup
+
+# métrica -> (tabela de origem, condição SQL sobre a linha ``{row}`` ou None)
+ROLLUPS = {
+    'new_users': ('users', None),
+    'new_portals': ('portals', None),
+    'public_portals': ('portals', '{row}.is_public = 1 AND {row}.is_active = 1'),
+    'new_reviews': ('reviews', None),
+    'new_explorations': ('explorations', None),
+    'new_likes': ('user_portal_likes', None),
+}
+
+# Colunas que, se alteradas, mudam a contagem da métrica
+_CONDITION_COLUMNS = {
+    'public_portals': ('is_public', 'is_active'),
+}
+
+
+def _condition(metric, alias):
+    condition = ROLLUPS[metric][1]
+    base = f'{alias}.created_at IS NOT NULL'
+    if not condition:
+        return base
+    return f'{base} AND {condition.format(row=alias)}'
+
+
+def _upsert(metric, alias, delta):
+    return (
+        f"INSERT INTO daily_rollups (day, metric, count) "
+        f"SELECT date({alias}.created_at), '{metric}', {delta} WHERE {_condition(metric, alias)} "
+        f"ON CONFLICT(day, metric) DO UPDATE SET count = count + excluded.count;"
+    )
+
+
+def _ddl(metric):
+    source = ROLLUPS[metric][0]
+    columns = ', '.join(('created_at',) + _CONDITION_COLUMNS.get(metric, ()))
+    name = f'rollup_{metric}'
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {source} BEGIN {_upsert(metric, 'new', 1)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {source} BEGIN {_upsert(metric, 'old', -1)} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {columns} ON {source} BEGIN "
+        f"{_upsert(metric, 'old', -1)} {_upsert(metric, 'new', 1)} END",
+    ]
+
+
+def ensure_rollups():
+    """
+    Cria os triggers, se ainda não existirem, e faz o backfill na primeira vez.
+    Deve ser chamado dentro de um app context, após ``db.create_all()``.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+        }
+        missing = [metric for metric in ROLLUPS if f'rollup_{metric}_ai' not in existing]
+        for metric in missing:
+            for statement in _ddl(metric):
+                conn.execute(text(statement))
+        if missing:
+            _backfill(conn, missing)
+    return True
+
+
+def _backfill(conn, metrics):
+    for metric in metrics:
+        source = ROLLUPS[metric][0]
+        conn.execute(text("DELETE FROM daily_rollups WHERE metric = :metric"), {'metric': metric})
+        conn.execute(text(
+            f"INSERT INTO daily_rollups (day, metric, count) "
+            f"SELECT date(src.created_at), :metric, COUNT(*) FROM {source} AS src "
+            f"WHERE {_condition(metric, 'src')} GROUP BY date(src.created_at)"
+        ), {'metric': metric})
+
+
+def rebuild_rollups():
+    """
+    Recalcula todos os agregados a partir das tabelas de origem
+    Retorna o número de linhas (dia, métrica) geradas.
+    """
+    with db.engine.begin() as conn:
+        _backfill(conn, list(ROLLUPS))
+        return conn.execute(text("SELECT COUNT(*) FROM daily_rollups")).scalar()
+
+
+def get_totals(metrics=None):
+    """
+    Totais de todas as datas por métrica: {métrica: total}
+    """
+    metrics = list(metrics or ROLLUPS)
+    rows = db.session.query(DailyRollup.metric, func.sum(DailyRollup.count)).filter(
+        DailyRollup.metric.in_(metrics)
+    ).group_by(DailyRollup.metric).all()
+    totals = dict.fromkeys(metrics, 0)
+    totals.update({metric: int(total or 0) for metric, total in rows})
+    return totals
+
+
+def get_daily(days, metrics=None, end=None):
+    """
+    Série diária dos últimos ``days`` dias (até ``end``, padrão hoje em UTC),
+    do mais recente ao mais antigo: {'AAAA-MM-DD': {métrica: total}}
+    """
+    metrics = list(metrics or ROLLUPS)
+    end = end or datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+
+    series = {}
+    for offset in range(days):
+        day = end - timedelta(days=offset)
+        series[day.strftime('%Y-%m-%d')] = dict.fromkeys(metrics, 0)
+
+    rows = DailyRollup.query.filter(
+        DailyRollup.day.between(start, end), DailyRollup.metric.in_(metrics)
+    ).all()
+    for row in rows:
+        series[row.day.strftime('%Y-%m-%d')][row.metric] = row.count
+    return series
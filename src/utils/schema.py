@@ -0,0 +1,51 @@
+"""
+Ajustes de schema para bancos já existentes.
+
+``db.create_all()`` cria tabelas novas, mas não adiciona colunas a tabelas que
+já existem. ``upgrade_schema`` completa o que faltar de forma idempotente.
+É a migração 1 de ``src.utils.migrations``; colunas novas entram como
+migrações novas.
+"""
+
+from sqlalchemy import inspect, text
+from src.models.user import db
+
+# (tabela, coluna, definição SQL)
+ADDED_COLUMNS = [
+    ('portals', 'likes_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('portals', 'favorites_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('portals', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0'),
+    ('portals', 'rating_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('portals', 'views_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('portals', 'unique_viewers', 'INTEGER NOT NULL DEFAULT 0'),
+    ('users', 'portals_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('users', 'followers_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('users', 'following_count', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+
+def upgrade_schema():
+    """
+    Adiciona colunas ausentes. Retorna a lista de colunas criadas.
+    Deve ser chamado dentro de um app context, após ``db.create_all()``
+    (normalmente por ``run_migrations``).
+    """
+    inspector = inspect(db.engine)
+    existing = {}
+    added = []
+
+    with db.engine.begin() as conn:
+        for table, column, definition in ADDED_COLUMNS:
+            if table not in existing:
+                existing[table] = {col['name'] for col in inspector.get_columns(table)}
+            if column not in existing[table]:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+                existing[table].add(column)
+                added.append(f'{table}.{column}')
+
+    if added:
+        # Colunas de contadores recém-criadas começam zeradas
+        from src.utils.counters import reconcile_counters
+        reconcile_counters()
+
+    return added
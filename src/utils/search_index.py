@@ -0,0 +1,212 @@
+"""
+Índice de busca textual (SQLite FTS5) para portais, usuários, categorias e tags.
+
+Cada entidade tem uma tabela FTS5 de conteúdo externo, mantida em sincronia por
+triggers no banco. Assim qualquer INSERT, UPDATE ou DELETE atualiza o índice,
+venha ele do ORM ou de inserts em lote. O tokenizador ``unicode61`` com
+``remove_diacritics 2`` ignora acentos, então "musica" encontra "Música".
+Os resultados são ordenados por BM25 e podem trazer trechos destacados
+(HTML: o texto vem escapado, só as marcas de destaque são tags).
+
+Se o SQLite não tiver FTS5, as buscas voltam ao LIKE antigo.
+"""
+
+import re
+import html
+from sqlalchemy import or_, text, table, column, literal_column
+from sqlalchemy.exc import OperationalError
+from src.models.user import db, User
+
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+# nome -> (tabela de conteúdo, coluna de rowid, colunas indexadas, pesos BM25)
+INDEXES = {
+    'portals': ('portals', 'id', ('title', 'description'), (10.0, 1.0)),
+    'users': ('users', 'rowid', ('name', 'bio'), (10.0, 1.0)),
+    'categories': ('categories', 'id', ('name', 'description'), (10.0, 1.0)),
+    'tags': ('tags', 'id', ('name',), (1.0,)),
+}
+
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+# O FTS5 marca os termos com estes caracteres (uso privado do Unicode); o
+# texto é escapado como HTML e só depois as marcas viram SNIPPET_START/END
+_SNIPPET_START_SENTINEL = '\ue000'
+_SNIPPET_END_SENTINEL = '\ue001'
+SNIPPET_TOKENS = 12
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_state = {'available': None}
+
+
+def fts_table(name):
+    return f'{name}_fts'
+
+
+def _ddl(name):
+    content, rowid, columns, _ = INDEXES[name]
+    fts = fts_table(name)
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{col}' for col in columns)
+    old_values = ', '.join(f'old.{col}' for col in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{content}', content_rowid='{rowid}', tokenize='{TOKENIZER}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {content} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{rowid}, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {content} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{rowid}, {old_values}); END",
+        # Só reindexa quando as colunas de texto mudam (não em contadores)
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {content} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.{rowid}, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.{rowid}, {new_values}); END",
+    ]
+
+
+def ensure_search_index():
+    """
+    Cria as tabelas FTS5 e os triggers, se ainda não existirem, e indexa o
+    conteúdo já existente. Deve ser chamado dentro de um app context.
+    Retorna True se o índice está disponível.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        _state['available'] = False
+        return False
+
+    with db.engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        }
+        try:
+            for name in INDEXES:
+                if fts_table(name) in existing:
+                    continue
+                for statement in _ddl(name):
+                    conn.execute(text(statement))
+                conn.execute(text(f"INSERT INTO {fts_table(name)}({fts_table(name)}) VALUES ('rebuild')"))
+        except OperationalError:
+            # SQLite compilado sem FTS5
+            _state['available'] = False
+            return False
+
+    _state['available'] = True
+    return True
+
+
+def rebuild_search_index():
+    """
+    Reconstrói todos os índices a partir das tabelas de conteúdo
+    (necessário, por exemplo, depois de um VACUUM renumerar os rowids de users)
+    """
+    with db.engine.begin() as conn:
+        for name in INDEXES:
+            conn.execute(text(f"INSERT INTO {fts_table(name)}({fts_table(name)}) VALUES ('rebuild')"))
+
+
+def is_available():
+    return bool(_state['available'])
+
+
+def build_match_query(query):
+    """
+    Converte o texto digitado em uma expressão FTS5 segura: cada palavra vira
+    uma frase entre aspas (todas obrigatórias) e a última aceita prefixo.
+    Retorna None se não houver palavras.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _fts_join(model, name, match):
+    fts = fts_table(name)
+    content, rowid = INDEXES[name][:2]
+    fts_ref = table(fts, column('rowid'))
+    target = literal_column(f'{content}.{rowid}')
+    return fts_ref, target, text(f'{fts} MATCH :fts_match').bindparams(fts_match=match)
+
+
+def filter_by_search(query, model, name, search):
+    """
+    Restringe uma query aos resultados que casam com ``search``
+    (mantendo a ordenação da query)
+    """
+    if not is_available():
+        return _like_filter(query, model, name, search)
+
+    match = build_match_query(search)
+    if match is None:
+        return query.filter(db.false())
+
+    fts_ref, target, condition = _fts_join(model, name, match)
+    return query.join(fts_ref, fts_ref.c.rowid == target).filter(condition)
+
+
+def ranked_search(query, model, name, search):
+    """
+    Como ``filter_by_search``, mas ordenado por relevância (BM25)
+    """
+    if not is_available():
+        return _like_filter(query, model, name, search)
+    if build_match_query(search) is None:
+        return query.filter(db.false())
+
+    weights = ', '.join(str(weight) for weight in INDEXES[name][3])
+    return filter_by_search(query, model, name, search).order_by(None).order_by(
+        text(f'bm25({fts_table(name)}, {weights})')
+    )
+
+
+def snippets(name, ids, search):
+    """
+    Trechos destacados para os resultados de uma página, em uma única query
+    Retorna {rowid: trecho}
+    """
+    ids = list(ids)
+    match = build_match_query(search)
+    if not ids or match is None or not is_available():
+        return {}
+
+    fts = fts_table(name)
+    placeholders = ', '.join(f':id_{i}' for i in range(len(ids)))
+    params = {f'id_{i}': value for i, value in enumerate(ids)}
+    params['fts_match'] = match
+    rows = db.session.execute(text(
+        f"SELECT rowid, snippet({fts}, -1, :start, :end, '…', :tokens) FROM {fts} "
+        f"WHERE {fts} MATCH :fts_match AND rowid IN ({placeholders})"
+    ), {**params, 'start': _SNIPPET_START_SENTINEL, 'end': _SNIPPET_END_SENTINEL, 'tokens': SNIPPET_TOKENS})
+    return {rowid: _highlight(snippet) for rowid, snippet in rows.all()}
+
+
+def _highlight(snippet):
+    """Texto do usuário escapado como HTML, com os termos entre SNIPPET_START/END"""
+    if snippet is None:
+        return None
+    return (
+        html.escape(snippet)
+        .replace(_SNIPPET_START_SENTINEL, SNIPPET_START)
+        .replace(_SNIPPET_END_SENTINEL, SNIPPET_END)
+    )
+
+
+def user_rowids(user_ids):
+    """
+    Mapeia ids de usuário (string) para o rowid usado no índice
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    return dict(
+        db.session.query(User.id, literal_column('users.rowid')).filter(User.id.in_(user_ids)).all()
+    )
+
+
+def _like_filter(query, model, name, search):
+    """LIKE '%q%' nas mesmas colunas (sem FTS5)"""
+    columns = INDEXES[name][2]
+    return query.filter(or_(*[getattr(model, col).contains(search) for col in columns]))
+
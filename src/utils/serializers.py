@@ -0,0 +1,200 @@
+"""
+Serialização em lote dos modelos para os endpoints de listagem.
+
+Os métodos ``to_dict`` dos modelos acessam relacionamentos um objeto por vez,
+o que gera uma query por item (N+1). As funções abaixo recebem uma página
+inteira de objetos, carregam cada relacionamento e estatística com um número
+fixo de queries e devolvem exatamente o mesmo JSON que ``to_dict``.
+"""
+
+from collections import defaultdict
+from sqlalchemy import func
+from src.models.user import db, User
+from src.models.portal import Portal, portal_tags
+from src.models.category import Category
+from src.models.tag import Tag
+from src.utils.fragments import fragment_cache, join_fragment
+from src.utils.json_provider import dumps_bytes
+
+
+def _by_id(model, ids):
+    """Carrega instâncias de um modelo por id em uma única query"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+
+
+def _count_by(column, ids, *criteria):
+    """Conta linhas agrupadas por ``column`` para os ids informados"""
+    if not ids:
+        return {}
+    rows = db.session.query(column, func.count()).filter(
+        column.in_(ids), *criteria
+    ).group_by(column).all()
+    return dict(rows)
+
+
+def serialize_categories(categories, include_portal_count=True):
+    """
+    Serializa uma lista de categorias (equivalente a ``Category.to_dict``)
+    """
+    categories = list(categories)
+    result = [category.to_dict(include_portal_count=False) for category in categories]
+
+    if include_portal_count:
+        counts = _count_by(Portal.category_id, [category.id for category in categories])
+        for category_dict in result:
+            category_dict['portal_count'] = counts.get(category_dict['id'], 0)
+
+    return result
+
+
+def _portal_relations(portals, include_creator, include_category, include_tags):
+    """
+    Criadores, categorias e tags de uma página de portais, já no formato
+    de ``Portal.to_dict``: (criador por id, categoria por id, tags por portal)
+    """
+    creators, categories, tags_by_portal = {}, {}, defaultdict(list)
+
+    if include_creator:
+        creators = {
+            creator.id: {
+                'id': creator.id,
+                'name': creator.name,
+                'avatar_url': creator.avatar_url,
+                'is_verified': creator.is_verified
+            }
+            for creator in _by_id(User, [portal.creator_id for portal in portals]).values()
+        }
+
+    if include_category:
+        category_objs = _by_id(Category, [portal.category_id for portal in portals])
+        categories = {
+            category_dict['id']: category_dict
+            for category_dict in serialize_categories(category_objs.values())
+        }
+
+    if include_tags:
+        rows = db.session.query(portal_tags.c.portal_id, Tag).join(
+            Tag, Tag.id == portal_tags.c.tag_id
+        ).filter(portal_tags.c.portal_id.in_([portal.id for portal in portals])).all()
+        for portal_id, tag in rows:
+            tags_by_portal[portal_id].append(tag.to_dict())
+
+    return creators, categories, tags_by_portal
+
+
+def serialize_portals(portals, include_creator=True, include_category=True, include_tags=True, include_stats=True):
+    """
+    Serializa uma lista de portais (equivalente a ``Portal.to_dict``)
+    """
+    portals = list(portals)
+    if not portals:
+        return []
+
+    # As estatísticas vêm dos contadores desnormalizados, sem query extra
+    result = [
+        portal.to_dict(include_creator=False, include_category=False, include_tags=False, include_stats=include_stats)
+        for portal in portals
+    ]
+    creators, categories, tags_by_portal = _portal_relations(
+        portals, include_creator, include_category, include_tags
+    )
+
+    for portal, portal_dict in zip(portals, result):
+        if portal.creator_id in creators:
+            portal_dict['creator'] = creators[portal.creator_id]
+        if portal.category_id in categories:
+            portal_dict['category'] = dict(categories[portal.category_id])
+        if include_tags:
+            portal_dict['tags'] = tags_by_portal.get(portal.id, [])
+
+    return result
+
+
+def serialize_portal_fragments(portals, include_creator=True, include_category=True, include_tags=True,
+                               include_stats=True, extra=None):
+    """
+    Mesmo JSON de ``serialize_portals``, mas montado a partir dos trechos
+    em cache (``src/utils/fragments.py``): devolve uma lista de ``RawJSON``
+    para ir direto na resposta. ``extra`` (id do portal -> dict) acrescenta
+    campos a cada portal, como a distância ou a pontuação de tendência.
+    """
+    portals = list(portals)
+    if not portals:
+        return []
+
+    bodies = fragment_cache.portals(portals, include_stats=include_stats)
+    creators, categories, tags_by_portal = _portal_relations(
+        portals, include_creator, include_category, include_tags
+    )
+    # Criadores e categorias se repetem na página: cada um é serializado uma vez
+    creator_json = {creator_id: dumps_bytes(value) for creator_id, value in creators.items()}
+    category_json = {category_id: dumps_bytes(value) for category_id, value in categories.items()}
+
+    result = []
+    for portal, body in zip(portals, bodies):
+        fields = []
+        if portal.creator_id in creator_json:
+            fields.append((b'creator', creator_json[portal.creator_id]))
+        if portal.category_id in category_json:
+            fields.append((b'category', category_json[portal.category_id]))
+        if include_tags:
+            fields.append((b'tags', dumps_bytes(tags_by_portal.get(portal.id, []))))
+        if extra and portal.id in extra:
+            fields.extend((name.encode(), dumps_bytes(value)) for name, value in extra[portal.id].items())
+        result.append(join_fragment(body, fields))
+
+    return result
+
+
+def serialize_users(users, include_stats=True):
+    """
+    Serializa uma lista de usuários (equivalente a ``User.to_dict``)
+    """
+    # As estatísticas vêm dos contadores desnormalizados, sem query extra
+    return [user.to_dict(include_stats=include_stats) for user in users]
+
+
+def serialize_reviews(reviews, include_user=True):
+    """
+    Serializa uma lista de reviews (equivalente a ``Review.to_dict``)
+    """
+    reviews = list(reviews)
+    result = [review.to_dict(include_user=False) for review in reviews]
+
+    if include_user:
+        users = _by_id(User, [review.user_id for review in reviews])
+        for review, review_dict in zip(reviews, result):
+            user = users.get(review.user_id)
+            if user:
+                review_dict['user'] = {
+                    'id': user.id,
+                    'name': user.name,
+                    'avatar_url': user.avatar_url
+                }
+
+    return result
+
+
+def serialize_explorations(explorations, include_portal=True):
+    """
+    Serializa uma lista de explorações (equivalente a ``Exploration.to_dict``)
+    """
+    explorations = list(explorations)
+    result = [exploration.to_dict(include_portal=False) for exploration in explorations]
+
+    if include_portal:
+        portals = _by_id(Portal, [exploration.portal_id for exploration in explorations])
+        for exploration, exploration_dict in zip(explorations, result):
+            portal = portals.get(exploration.portal_id)
+            if portal:
+                exploration_dict['portal'] = {
+                    'id': portal.id,
+                    'title': portal.title,
+                    'image_url': portal.image_url,
+                    'thumbnail_url': portal.thumbnail_url
+                }
+
+    return result
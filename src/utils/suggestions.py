@@ -0,0 +1,413 @@
+"""
+Índice de prefixos em memória para /api/search/suggestions.
+
+Uma trie com títulos de portais, nomes de tags, de categorias e de criadores
+(normalizados sem acentos e em minúsculas). Cada nó guarda, de forma
+preguiçosa, os K melhores resultados da sua subárvore ordenados por
+popularidade, então uma busca por prefixo é só descer a trie e ler a lista.
+Erros de digitação são tolerados por uma busca com distância de edição
+limitada (Damerau-Levenshtein restrita, em que trocar duas letras vizinhas
+conta como um erro) percorrendo a própria trie. A primeira letra precisa
+estar certa, o que poda quase toda a árvore. Os resultados de cada consulta
+ficam memorizados até a próxima alteração do índice.
+
+O índice é construído na inicialização, atualizado a cada commit que altera
+essas entidades e reconstruído em segundo plano periodicamente, para
+acompanhar a popularidade e as escritas feitas por outros processos.
+"""
+
+import os
+import time
+import heapq
+import threading
+import unicodedata
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, object_session
+from src.models.user import db, User
+from src.models.portal import Portal, portal_tags
+from src.models.category import Category
+from src.models.tag import Tag
+
+SUGGESTIONS_REFRESH_SECONDS = float(os.environ.get('SUGGESTIONS_REFRESH_SECONDS', 300))
+# Profundidade máxima indexada e quantas palavras iniciais também viram prefixos
+MAX_TERM_LENGTH = 24
+MAX_WORD_STARTS = 4
+TOP_K = 20
+QUERY_CACHE_SIZE = 4096
+
+
+def normalize(value):
+    """Minúsculas, sem acentos e com espaços simples"""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(value.lower().split())
+
+
+def max_distance_for(query):
+    """Quantos erros de digitação aceitar para o tamanho do texto"""
+    if len(query) < 4:
+        return 0
+    if len(query) < 8:
+        return 1
+    return 2
+
+
+class _Node:
+    __slots__ = ('children', 'keys', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()
+        self.top = None
+
+
+class SuggestionIndex:
+    """
+    Trie de sugestões com top-K por nó e busca aproximada
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._entries = {}  # (tipo, id) -> (peso, texto)
+        self._terms = {}    # (tipo, id) -> termos indexados
+        self._lock = threading.RLock()
+        self.built_at = None
+        self._refreshing = False
+        self._results = {}  # memória de consultas, limpa a cada alteração
+
+    # --- Manutenção -------------------------------------------------------
+
+    @staticmethod
+    def _terms_for(text):
+        words = normalize(text).split()
+        terms = set()
+        for start in range(min(len(words), MAX_WORD_STARTS)):
+            term = ' '.join(words[start:])[:MAX_TERM_LENGTH]
+            if term:
+                terms.add(term)
+        return terms
+
+    def _path(self, term, create=False):
+        node = self._root
+        path = [node]
+        for ch in term:
+            child = node.children.get(ch)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[ch] = _Node()
+            node = child
+            path.append(node)
+        return path
+
+    def _invalidate(self, term):
+        path = self._path(term)
+        for node in path or ():
+            node.top = None
+
+    def upsert(self, kind, object_id, text, weight=None):
+        """
+        Adiciona ou atualiza uma sugestão. Sem ``weight``, mantém o peso atual.
+        """
+        key = (kind, object_id)
+        with self._lock:
+            if weight is None:
+                weight = self._entries.get(key, (0, None))[0]
+            self.remove(kind, object_id)
+            self._results.clear()
+            terms = self._terms_for(text)
+            if not terms:
+                return
+            self._entries[key] = (weight, text)
+            self._terms[key] = terms
+            for term in terms:
+                path = self._path(term, create=True)
+                path[-1].keys.add(key)
+                for node in path:
+                    node.top = None
+
+    def remove(self, kind, object_id):
+        key = (kind, object_id)
+        with self._lock:
+            terms = self._terms.pop(key, ())
+            self._entries.pop(key, None)
+            self._results.clear()
+            for term in terms:
+                path = self._path(term)
+                if path:
+                    path[-1].keys.discard(key)
+                    for node in path:
+                        node.top = None
+
+    def set_weight(self, kind, object_id, weight):
+        key = (kind, object_id)
+        with self._lock:
+            if key not in self._entries:
+                return
+            self._entries[key] = (weight, self._entries[key][1])
+            self._results.clear()
+            for term in self._terms[key]:
+                self._invalidate(term)
+
+    def replace_with(self, other):
+        """Troca o conteúdo por outro índice (reconstrução em segundo plano)"""
+        with self._lock:
+            self._root, self._entries, self._terms = other._root, other._entries, other._terms
+            self.built_at = other.built_at
+            self._results.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Consulta ---------------------------------------------------------
+
+    def _top(self, node):
+        if node.top is None:
+            candidates = [(-self._entries[key][0], self._entries[key][1], key) for key in node.keys]
+            for child in node.children.values():
+                candidates.extend(self._top(child))
+            # Sem duplicatas (um mesmo item pode estar em vários termos)
+            unique = {}
+            for item in candidates:
+                if item[2] not in unique or item < unique[item[2]]:
+                    unique[item[2]] = item
+            node.top = heapq.nsmallest(TOP_K, unique.values())
+        return node.top
+
+    def _fuzzy_nodes(self, query, max_distance):
+        """
+        Nós cujo prefixo está a no máximo ``max_distance`` edições da
+        consulta. Retorna {id(nó): (distância, nó)}.
+        """
+        found = {}
+        size = len(query)
+        outside = max_distance + 1
+        first_row = [i if i <= max_distance else outside for i in range(size + 1)]
+
+        def visit(node, ch, previous_ch, previous_row, before_previous_row, best, depth):
+            # Só as células a até max_distance da diagonal podem ficar abaixo do limite
+            row = [outside] * (size + 1)
+            row[0] = depth if depth <= max_distance else outside
+            for i in range(max(1, depth - max_distance), min(size, depth + max_distance) + 1):
+                cost = 0 if query[i - 1] == ch else 1
+                value = min(row[i - 1] + 1, previous_row[i] + 1, previous_row[i - 1] + cost)
+                # Transposição de letras vizinhas
+                if i > 1 and before_previous_row is not None and query[i - 1] == previous_ch and query[i - 2] == ch:
+                    value = min(value, before_previous_row[i - 2] + 1)
+                row[i] = min(value, outside)
+            if row[-1] < best:
+                # A subárvore inteira casa com este prefixo; descendentes só
+                # interessam se casarem com distância ainda menor
+                found[id(node)] = (row[-1], node)
+                best = row[-1]
+            if min(row) < best:
+                for next_ch, child in node.children.items():
+                    visit(child, next_ch, ch, row, previous_row, best, depth + 1)
+
+        # A primeira letra precisa estar certa
+        child = self._root.children.get(query[0])
+        if child is not None:
+            visit(child, query[0], None, first_row, None, outside, 1)
+        return found
+
+    def suggest(self, query, limit=10, fuzzy=True):
+        """
+        Retorna até ``limit`` sugestões: prefixos exatos primeiro, depois
+        aproximados, cada grupo ordenado por popularidade.
+        """
+        query = normalize(query)[:MAX_TERM_LENGTH]
+        if not query:
+            return []
+
+        cache_key = (query, limit, fuzzy)
+        cached = self._results.get(cache_key)
+        if cached is not None:
+            return cached
+
+        results = []
+        seen = set()
+
+        def collect(items, distance):
+            for negative_weight, text, key in items:
+                if key in seen or key not in self._entries:
+                    continue
+                seen.add(key)
+                results.append({
+                    'text': text,
+                    'type': key[0],
+                    'id': key[1],
+                    'weight': -negative_weight,
+                    'distance': distance
+                })
+
+        with self._lock:
+            path = self._path(query)
+            if path:
+                collect(self._top(path[-1]), 0)
+
+            max_distance = max_distance_for(query)
+            if fuzzy and max_distance and len(results) < limit:
+                matches = sorted(self._fuzzy_nodes(query, max_distance).values(), key=lambda m: m[0])
+                for distance, node in matches:
+                    if distance:
+                        collect(self._top(node), distance)
+
+        results.sort(key=lambda r: (r['distance'], -r['weight']))
+        results = results[:limit]
+
+        with self._lock:
+            if len(self._results) >= QUERY_CACHE_SIZE:
+                self._results.clear()
+            self._results[cache_key] = results
+        return results
+
+
+def _portal_weight(likes, favorites, ratings):
+    return 1 + (likes or 0) + 2 * (favorites or 0) + (ratings or 0)
+
+
+def build_index():
+    """
+    Carrega portais públicos, tags, categorias e criadores em um novo índice
+    (poucas queries agregadas). Deve ser chamado dentro de um app context.
+    """
+    index = SuggestionIndex()
+
+    for portal_id, title, likes, favorites, ratings in db.session.query(
+        Portal.id, Portal.title, Portal.likes_count, Portal.favorites_count, Portal.rating_count
+    ).filter(Portal.is_public == True, Portal.is_active == True):
+        index.upsert('portal', portal_id, title, _portal_weight(likes, favorites, ratings))
+
+    tag_counts = dict(
+        db.session.query(portal_tags.c.tag_id, func.count()).group_by(portal_tags.c.tag_id).all()
+    )
+    for tag_id, name in db.session.query(Tag.id, Tag.name):
+        index.upsert('tag', tag_id, name, tag_counts.get(tag_id, 0))
+
+    category_counts = dict(
+        db.session.query(Portal.category_id, func.count()).group_by(Portal.category_id).all()
+    )
+    for category_id, name in db.session.query(Category.id, Category.name):
+        index.upsert('category', category_id, name, category_counts.get(category_id, 0))
+
+    for user_id, name, portals_count, followers_count in db.session.query(
+        User.id, User.name, User.portals_count, User.followers_count
+    ).filter(User.portals_count > 0):
+        index.upsert('creator', user_id, name, (portals_count or 0) + (followers_count or 0))
+
+    index.built_at = time.monotonic()
+    return index
+
+
+suggestion_index = SuggestionIndex()
+
+
+def init_suggestions(app):
+    """
+    Constrói o índice na inicialização e guarda o app para as reconstruções
+    """
+    suggestion_index.app = app
+    with app.app_context():
+        suggestion_index.replace_with(build_index())
+
+
+def refresh_if_stale():
+    """
+    Dispara uma reconstrução em segundo plano se o índice estiver velho
+    """
+    index = suggestion_index
+    app = getattr(index, 'app', None)
+    if app is None or index.built_at is None:
+        return
+    if time.monotonic() - index.built_at < SUGGESTIONS_REFRESH_SECONDS:
+        return
+
+    with index._lock:
+        if index._refreshing:
+            return
+        index._refreshing = True
+
+    def rebuild():
+        try:
+            with app.app_context():
+                index.replace_with(build_index())
+        finally:
+            index._refreshing = False
+
+    threading.Thread(target=rebuild, name='suggestions-rebuild', daemon=True).start()
+
+
+# --- Atualização incremental após commit -------------------------------------
+
+def _queue(target, change):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('suggestions_pending', []).append(change)
+
+
+def _portal_change(mapper, connection, target):
+    if target.is_public and target.is_active:
+        weight = _portal_weight(target.likes_count, target.favorites_count, target.rating_count)
+        _queue(target, ('upsert', 'portal', target.id, target.title, weight))
+    else:
+        _queue(target, ('remove', 'portal', target.id))
+
+
+def _simple_change(kind):
+    def on_change(mapper, connection, target):
+        _queue(target, ('upsert', kind, target.id, target.name, None))
+    return on_change
+
+
+def _simple_remove(kind):
+    def on_remove(mapper, connection, target):
+        _queue(target, ('remove', kind, target.id))
+    return on_remove
+
+
+def _user_change(mapper, connection, target):
+    if target.portals_count:
+        _queue(target, ('upsert', 'creator', target.id, target.name, None))
+
+
+def queue_creator_change(session, user_id):
+    """
+    Entra com o criador no índice (ou o retira, sem portais) após o commit.
+    ``portals_count`` muda por UPDATE direto (``adjust_user_counters``), que
+    não dispara os eventos do mapper de User.
+    """
+    row = session.execute(
+        select(User.name, User.portals_count, User.followers_count).where(User.id == user_id)
+    ).first()
+    pending = session.info.setdefault('suggestions_pending', [])
+    if row is None or not row.portals_count:
+        pending.append(('remove', 'creator', user_id))
+    else:
+        pending.append(('upsert', 'creator', user_id, row.name, row.portals_count + (row.followers_count or 0)))
+
+
+event.listen(Portal, 'after_insert', _portal_change)
+event.listen(Portal, 'after_update', _portal_change)
+event.listen(Portal, 'after_delete', _simple_remove('portal'))
+for _model, _kind in ((Tag, 'tag'), (Category, 'category')):
+    event.listen(_model, 'after_insert', _simple_change(_kind))
+    event.listen(_model, 'after_update', _simple_change(_kind))
+    event.listen(_model, 'after_delete', _simple_remove(_kind))
+event.listen(User, 'after_update', _user_change)
+event.listen(User, 'after_delete', _simple_remove('creator'))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    for change in session.info.pop('suggestions_pending', []):
+        if change[0] == 'remove':
+            suggestion_index.remove(change[1], change[2])
+            continue
+
+        _, kind, object_id, text, weight = change
+        suggestion_index.upsert(kind, object_id, text, weight)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('suggestions_pending', None)
@@ -0,0 +1,359 @@
+"""
+Motor de tendências: pontuação com decaimento exponencial por portal.
+
+Cada engajamento (visualização, curtida, favorito, review, exploração) soma
+um peso à pontuação do portal, e a contribuição cai pela metade a cada
+TRENDING_HALF_LIFE_HOURS. Para não precisar decair todas as pontuações a cada
+evento, usamos "forward decay": o evento no instante t soma
+``peso * e^(λ·(t - t0))``, com t0 um marco fixo. A ordem entre portais é a
+mesma da pontuação decaída, então o top-K pode ser mantido diretamente. Quando
+o expoente fica grande demais o marco avança e tudo é reescalado (rebase),
+evitando overflow.
+
+O motor também mantém a pontuação total (sem decaimento), usada como
+popularidade de todos os tempos no dashboard.
+
+O estado fica em memória, é reconstruído do histórico na inicialização e a
+cada TRENDING_REFRESH_SECONDS (o que também alinha processos diferentes), e é
+atualizado a cada engajamento depois do commit. Os engajamentos registrados
+enquanto o histórico é lido são guardados e reaplicados sobre o novo estado.
+"""
+
+import os
+import math
+import time
+import heapq
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session, object_session
+from src.models.user import db
+from src.models.portal import Portal
+from src.models.review import Review
+from src.models.exploration import Exploration
+
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 48))
+TRENDING_TOP_K = int(os.environ.get('TRENDING_TOP_K', 200))
+TRENDING_REFRESH_SECONDS = float(os.environ.get('TRENDING_REFRESH_SECONDS', 600))
+
+# Peso de cada tipo de engajamento
+TRENDING_WEIGHTS = {
+    'view': 1.0,
+    'exploration': 3.0,
+    'like': 5.0,
+    'favorite': 8.0,
+    'review': 10.0,
+}
+
+# Rebase quando e^expoente passar de ~1e26 (bem abaixo do limite do float)
+_REBASE_EXPONENT = 60.0
+# Histórico considerado na reconstrução (contribuições menores que 2^-12 são ignoradas)
+_HISTORY_HALF_LIVES = 12
+
+
+class TopK:
+    """
+    Os maiores valores de um dicionário de pontuações, mantidos de forma
+    incremental: guarda até 2*k candidatos e só recalcula tudo quando um
+    candidato perde pontos
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._members = {}
+        self._floor = float('-inf')
+        self._stale = True
+
+    def update(self, item, score, decreased=False):
+        if item in self._members:
+            self._members[item] = score
+            if decreased:
+                # Alguém de fora pode ter passado à frente
+                self._stale = True
+        elif len(self._members) < self.k or score > self._floor:
+            self._members[item] = score
+            if len(self._members) > 2 * self.k:
+                self._trim()
+
+    def _trim(self):
+        kept = heapq.nlargest(self.k, self._members.items(), key=lambda entry: entry[1])
+        self._members = dict(kept)
+        self._floor = kept[-1][1] if len(kept) >= self.k else float('-inf')
+
+    def rebuild(self, scores):
+        self._members = scores
+        self._trim()
+        self._stale = False
+
+    def scale(self, factor):
+        self._members = {item: score * factor for item, score in self._members.items()}
+        self._floor *= factor
+
+    def top(self, limit, scores):
+        if self._stale:
+            self.rebuild(scores)
+        return heapq.nlargest(min(limit, self.k), self._members.items(), key=lambda entry: entry[1])
+
+
+class TrendingEngine:
+    """
+    Pontuações de tendência (decaídas) e de popularidade (totais) por portal
+    """
+
+    def __init__(self, half_life_hours=TRENDING_HALF_LIFE_HOURS, top_k=TRENDING_TOP_K):
+        self.decay_rate = math.log(2) / (half_life_hours * 3600)
+        self.app = None
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._landmark = time.time()
+        self._replay = None  # engajamentos durante uma reconstrução
+        self._scores = {}
+        self._totals = {}
+        self._trending_top = TopK(top_k)
+        self._popular_top = TopK(top_k)
+
+    def _weight_at(self, timestamp):
+        return math.exp(self.decay_rate * (timestamp - self._landmark))
+
+    def _rebase(self, now):
+        """Move o marco para ``now`` e reescala as pontuações"""
+        factor = math.exp(-self.decay_rate * (now - self._landmark))
+        self._landmark = now
+        # Contribuições desprezíveis são descartadas para limitar a memória
+        self._scores = {item: score * factor for item, score in self._scores.items() if score * factor > 1e-6}
+        self._trending_top.scale(factor)
+
+    def record(self, portal_id, kind, timestamp=None, delta=1):
+        """
+        Registra um engajamento (``delta=-1`` desfaz um engajamento feito em ``timestamp``)
+        """
+        timestamp = timestamp or time.time()
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((portal_id, kind, timestamp, delta))
+            self._apply(portal_id, kind, timestamp, delta)
+
+    def _apply(self, portal_id, kind, timestamp, delta):
+        # Chamado com self._lock
+        weight = TRENDING_WEIGHTS[kind] * delta
+        if self.decay_rate * (timestamp - self._landmark) > _REBASE_EXPONENT:
+            self._rebase(timestamp)
+        score = self._scores.get(portal_id, 0.0) + weight * self._weight_at(timestamp)
+        total = self._totals.get(portal_id, 0.0) + weight
+        self._scores[portal_id] = score
+        self._totals[portal_id] = total
+        self._trending_top.update(portal_id, score, decreased=delta < 0)
+        self._popular_top.update(portal_id, total, decreased=delta < 0)
+
+    def trending(self, limit):
+        """[(portal_id, pontuação decaída até agora)], da maior para a menor"""
+        with self._lock:
+            top = self._trending_top.top(limit, self._scores)
+            factor = math.exp(-self.decay_rate * (time.time() - self._landmark))
+        # Resíduos de ponto flutuante (engajamentos desfeitos) não entram no ranking
+        return [(portal_id, score * factor) for portal_id, score in top if score * factor > 1e-6]
+
+    def popular(self, limit):
+        """[(portal_id, pontuação total)], da maior para a menor"""
+        with self._lock:
+            top = self._popular_top.top(limit, self._totals)
+        return [(portal_id, score) for portal_id, score in top if score > 0]
+
+    def begin_rebuild(self):
+        """
+        Passa a guardar os engajamentos registrados a partir de agora, que o
+        histórico lido em seguida pode não conter; ``load`` os reaplica
+        """
+        with self._lock:
+            self._replay = []
+
+    def cancel_rebuild(self):
+        with self._lock:
+            self._replay = None
+
+    def load(self, events, totals, now):
+        """
+        Substitui o estado: ``events`` é uma lista de (portal_id, tipo, timestamp, quantidade)
+        e ``totals`` um dicionário {portal_id: pontuação total}. Os engajamentos
+        guardados desde ``begin_rebuild`` são reaplicados.
+        """
+        scores = {}
+        for portal_id, kind, timestamp, count in events:
+            contribution = TRENDING_WEIGHTS[kind] * count * math.exp(self.decay_rate * (timestamp - now))
+            scores[portal_id] = scores.get(portal_id, 0.0) + contribution
+        with self._lock:
+            self._landmark = now
+            self._scores = scores
+            self._totals = dict(totals)
+            self._trending_top.rebuild(self._scores)
+            self._popular_top.rebuild(self._totals)
+            replay, self._replay = self._replay or [], None
+            for event in replay:
+                self._apply(*event)
+            self.built_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'portals': len(self._scores),
+                'landmark': datetime.utcfromtimestamp(self._landmark).isoformat() + 'Z',
+                'half_life_hours': math.log(2) / self.decay_rate / 3600,
+            }
+
+
+trending_engine = TrendingEngine()
+
+
+# --- Reconstrução a partir do histórico -------------------------------------
+
+def _epoch(value):
+    """datetime UTC sem fuso (ou texto do SQLite) -> segundos desde 1970"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def load_history(engine=trending_engine, now=None):
+    """
+    Reconstrói o estado do motor a partir das tabelas (curtidas, favoritos,
+    reviews e explorações agregadas por hora; visualizações por dia).
+    Deve ser chamado dentro de um app context. Retorna o número de portais.
+    """
+    # Import local: views.py importa este módulo
+    from src.utils.views import view_counter
+
+    now = now or time.time()
+    cutoff = datetime.utcfromtimestamp(now) - timedelta(hours=TRENDING_HALF_LIFE_HOURS * _HISTORY_HALF_LIVES)
+
+    # Engajamentos a partir daqui são reaplicados sobre o histórico; as
+    # visualizações já contadas em memória vão para portal_daily_stats antes da leitura
+    engine.begin_rebuild()
+    try:
+        view_counter.flush()
+        events, totals = _read_history(now, cutoff)
+    except Exception:
+        engine.cancel_rebuild()
+        raise
+
+    engine.load(events, totals, now)
+    return len(set(engine._scores) | set(totals))
+
+
+def _read_history(now, cutoff):
+    """(eventos, totais) para ``TrendingEngine.load``"""
+    events = []
+    sources = [
+        ('like', 'user_portal_likes'),
+        ('favorite', 'user_portal_favorites'),
+        ('review', 'reviews'),
+        ('exploration', 'explorations'),
+    ]
+    for kind, table in sources:
+        rows = db.session.execute(text(
+            f"SELECT portal_id, strftime('%Y-%m-%d %H:30:00', created_at) AS hour, COUNT(*) FROM {table} "
+            f"WHERE portal_id IS NOT NULL AND created_at >= :cutoff GROUP BY portal_id, hour"
+        ), {'cutoff': cutoff})
+        events.extend((portal_id, kind, min(_epoch(hour), now), count) for portal_id, hour, count in rows)
+
+    rows = db.session.execute(text(
+        "SELECT portal_id, day, views FROM portal_daily_stats WHERE views > 0 AND day >= :cutoff"
+    ), {'cutoff': cutoff.date()})
+    events.extend(
+        (portal_id, 'view', min(_epoch(f'{day} 12:00:00'), now), views) for portal_id, day, views in rows
+    )
+
+    # Popularidade de todos os tempos: contadores desnormalizados + explorações
+    explorations = dict(db.session.query(Exploration.portal_id, func.count()).filter(
+        Exploration.portal_id.isnot(None)
+    ).group_by(Exploration.portal_id).all())
+    totals = {}
+    for portal_id, likes, favorites, reviews, views in db.session.query(
+        Portal.id, Portal.likes_count, Portal.favorites_count, Portal.rating_count, Portal.views_count
+    ):
+        total = (
+            TRENDING_WEIGHTS['like'] * (likes or 0) + TRENDING_WEIGHTS['favorite'] * (favorites or 0)
+            + TRENDING_WEIGHTS['review'] * (reviews or 0) + TRENDING_WEIGHTS['view'] * (views or 0)
+            + TRENDING_WEIGHTS['exploration'] * explorations.get(portal_id, 0)
+        )
+        if total:
+            totals[portal_id] = total
+    return events, totals
+
+
+def init_trending(app):
+    """
+    Carrega o motor na inicialização e guarda o app para as reconstruções
+    """
+    trending_engine.app = app
+    with app.app_context():
+        load_history()
+
+
+def refresh_if_stale():
+    """
+    Dispara uma reconstrução em segundo plano se o estado estiver velho
+    """
+    engine = trending_engine
+    app = engine.app
+    if app is None or engine.built_at is None:
+        return
+    if time.monotonic() - engine.built_at < TRENDING_REFRESH_SECONDS:
+        return
+
+    with engine._lock:
+        if engine._refreshing:
+            return
+        engine._refreshing = True
+
+    def rebuild():
+        try:
+            with app.app_context():
+                load_history(engine)
+        finally:
+            engine._refreshing = False
+
+    threading.Thread(target=rebuild, name='trending-rebuild', daemon=True).start()
+
+
+# --- Engajamentos registrados após o commit ----------------------------------
+
+def record_engagement(portal_id, kind, timestamp=None, delta=1, session=None):
+    """
+    Registra um engajamento no motor quando a transação atual for confirmada
+    (descartado em rollback). ``timestamp`` é um datetime UTC sem fuso.
+    """
+    if portal_id is None:
+        return
+    session = session or db.session()
+    epoch = _epoch(timestamp) if timestamp else None
+    session.info.setdefault('trending_pending', []).append((portal_id, kind, epoch, delta))
+
+
+def _on_review(delta):
+    def listener(mapper, connection, target):
+        record_engagement(target.portal_id, 'review', target.created_at, delta, object_session(target))
+    return listener
+
+
+def _on_exploration(delta):
+    def listener(mapper, connection, target):
+        record_engagement(target.portal_id, 'exploration', target.created_at, delta, object_session(target))
+    return listener
+
+
+event.listen(Review, 'after_insert', _on_review(1))
+event.listen(Review, 'after_delete', _on_review(-1))
+event.listen(Exploration, 'after_insert', _on_exploration(1))
+event.listen(Exploration, 'after_delete', _on_exploration(-1))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    for portal_id, kind, timestamp, delta in session.info.pop('trending_pending', []):
+        trending_engine.record(portal_id, kind, timestamp, delta)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('trending_pending', None)
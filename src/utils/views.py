@@ -0,0 +1,318 @@
+"""
+Contagem de visualizações de portais.
+
+Cada leitura de ``GET /api/portals/<id>`` incrementa um contador em memória.
+Os contadores ficam divididos em faixas (lock striping): o portal escolhe a
+faixa e só o lock dela é usado, então leituras de portais diferentes não
+disputam o mesmo lock. Junto com o contador, cada (portal, dia) mantém um
+sketch HyperLogLog dos visitantes, que estima visitantes únicos com poucos
+bytes e pode ser mesclado entre dias e processos.
+
+Uma thread grava periodicamente o que acumulou na tabela
+``portal_view_counts`` (uma linha por portal e dia, mais o total 'all'), na
+série diária ``portal_daily_stats`` e em ``Portal.views_count`` e
+``Portal.unique_viewers``, em uma única transação. No encerramento do processo o que estiver pendente é gravado.
+
+Configuração por variáveis de ambiente:
+    VIEWS_FLUSH_INTERVAL   segundos entre gravações (padrão 10)
+    VIEWS_STRIPES          número de faixas de contadores (padrão 16)
+"""
+
+import os
+import math
+import atexit
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from functools import wraps
+import numpy as np
+from flask import request, g, make_response
+from sqlalchemy import update, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import db
+from src.models.portal import Portal
+from src.models.view import PortalViewCount
+from src.models.portal_stats import PortalDailyStats
+from src.utils.trending import trending_engine
+
+VIEWS_FLUSH_INTERVAL = float(os.environ.get('VIEWS_FLUSH_INTERVAL', 10))
+VIEWS_STRIPES = int(os.environ.get('VIEWS_STRIPES', 16))
+
+# 2^10 registradores de 1 byte: ~1 KB por portal e dia, erro padrão ~3,3%
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+_HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+_HLL_VALUE_BITS = 64 - HLL_PRECISION
+
+ALL_TIME = 'all'
+
+logger = logging.getLogger(__name__)
+
+
+# --- HyperLogLog -------------------------------------------------------------
+
+def hll_position(key):
+    """(registrador, posto) de um visitante"""
+    value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+    index = value >> _HLL_VALUE_BITS
+    remainder = value & ((1 << _HLL_VALUE_BITS) - 1)
+    return index, _HLL_VALUE_BITS - remainder.bit_length() + 1
+
+
+def hll_registers(data=None):
+    """Registradores densos (numpy) a partir dos bytes gravados"""
+    if not data:
+        return np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    return np.frombuffer(data, dtype=np.uint8).copy()
+
+
+def hll_update(registers, sparse):
+    """Aplica registradores esparsos {índice: posto} aos densos"""
+    if sparse:
+        indexes = np.fromiter(sparse.keys(), dtype=np.int64, count=len(sparse))
+        ranks = np.fromiter(sparse.values(), dtype=np.uint8, count=len(sparse))
+        np.maximum.at(registers, indexes, ranks)
+    return registers
+
+
+def hll_estimate(registers):
+    """Estimativa de elementos distintos"""
+    estimate = _HLL_ALPHA * HLL_REGISTERS ** 2 / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * HLL_REGISTERS and zeros:
+        # Correção para cardinalidades pequenas (linear counting)
+        estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+    return int(round(estimate))
+
+
+# --- Contadores --------------------------------------------------------------
+
+class ViewCounter:
+    """
+    Contadores de visualização em memória, por (portal, dia), com gravação periódica
+    """
+
+    def __init__(self, stripes=VIEWS_STRIPES, flush_interval=VIEWS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.app = None
+        self._stripes = [[threading.Lock(), {}] for _ in range(stripes)]
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flushed = 0
+        self.flushes = 0
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        # Uma thread por processo, criada no primeiro uso (seguro após fork)
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            for stripe in self._stripes:
+                stripe[0] = threading.Lock()
+                stripe[1] = {}
+            self._stop = threading.Event()
+            self._pid = os.getpid()
+            if self.app is not None and self.flush_interval > 0:
+                self._thread = threading.Thread(target=self._run, name='portal-views', daemon=True)
+                self._thread.start()
+
+    def record(self, portal_id, viewer_key, day=None):
+        """Conta uma visualização de ``portal_id`` pelo visitante ``viewer_key``"""
+        self._ensure_started()
+        day = day or datetime.utcnow().strftime('%Y-%m-%d')
+        index, rank = hll_position(viewer_key)
+        stripe = self._stripes[portal_id % len(self._stripes)]
+        with stripe[0]:
+            # O dicionário é lido dentro do lock porque o flush o substitui
+            pending = stripe[1]
+            entry = pending.get((portal_id, day))
+            if entry is None:
+                entry = pending[(portal_id, day)] = [0, {}]
+            entry[0] += 1
+            if entry[1].get(index, 0) < rank:
+                entry[1][index] = rank
+
+    def _take(self):
+        taken = {}
+        for stripe in self._stripes:
+            with stripe[0]:
+                pending, stripe[1] = stripe[1], {}
+            taken.update(pending)
+        return taken
+
+    def _restore(self, taken):
+        """Devolve contadores não gravados para a memória"""
+        for (portal_id, day), (views, sparse) in taken.items():
+            stripe = self._stripes[portal_id % len(self._stripes)]
+            with stripe[0]:
+                entry = stripe[1].setdefault((portal_id, day), [0, {}])
+                entry[0] += views
+                for index, rank in sparse.items():
+                    if entry[1].get(index, 0) < rank:
+                        entry[1][index] = rank
+
+    def flush(self):
+        """
+        Grava os contadores acumulados. Retorna o número de visualizações gravadas.
+        """
+        with self._flush_lock:
+            taken = self._take()
+            if not taken:
+                return 0
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        views = _write(connection, taken)
+            except Exception:
+                logger.exception('Falha ao gravar visualizações; nova tentativa no próximo ciclo')
+                self._restore(taken)
+                return 0
+            self.flushed += views
+            self.flushes += 1
+            return views
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        pending = 0
+        for stripe in self._stripes:
+            with stripe[0]:
+                pending += sum(views for views, _ in stripe[1].values())
+        return {
+            'flushed': self.flushed,
+            'pending': pending,
+            'flushes': self.flushes
+        }
+
+
+def _write(connection, taken):
+    portals = Portal.__table__
+    counts = PortalViewCount.__table__
+
+    # Totais por portal e sketches a mesclar por (portal, período)
+    portal_views = {}
+    sparse_by_key = {}
+    for (portal_id, day), (views, sparse) in taken.items():
+        portal_views[portal_id] = portal_views.get(portal_id, 0) + views
+        for period in (day, ALL_TIME):
+            merged = sparse_by_key.setdefault((portal_id, period), [0, {}])
+            merged[0] += views
+            for index, rank in sparse.items():
+                if merged[1].get(index, 0) < rank:
+                    merged[1][index] = rank
+
+    # O UPDATE vem primeiro para pegar o lock de escrita antes de ler os
+    # sketches: outro processo não consegue gravar entre a leitura e a escrita
+    connection.execute(
+        update(portals).where(portals.c.id == bindparam('b_id')).values(
+            views_count=portals.c.views_count + bindparam('b_views'),
+            updated_at=portals.c.updated_at
+        ),
+        [{'b_id': portal_id, 'b_views': views} for portal_id, views in portal_views.items()]
+    )
+
+    existing = {
+        (row.portal_id, row.period): row
+        for row in connection.execute(counts.select().where(
+            counts.c.portal_id.in_(list(portal_views)),
+            counts.c.period.in_({period for _, period in sparse_by_key})
+        ))
+    }
+
+    rows = []
+    unique = {}
+    for (portal_id, period), (views, sparse) in sparse_by_key.items():
+        row = existing.get((portal_id, period))
+        registers = hll_update(hll_registers(row.registers if row else None), sparse)
+        rows.append({
+            'portal_id': portal_id,
+            'period': period,
+            'views': (row.views if row else 0) + views,
+            'registers': registers.tobytes()
+        })
+        if period == ALL_TIME:
+            unique[portal_id] = hll_estimate(registers)
+
+    statement = insert(counts)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['portal_id', 'period'],
+        set_={'views': statement.excluded.views, 'registers': statement.excluded.registers}
+    ), rows)
+
+    connection.execute(
+        update(portals).where(portals.c.id == bindparam('b_id')).values(
+            unique_viewers=bindparam('b_unique'),
+            updated_at=portals.c.updated_at
+        ),
+        [{'b_id': portal_id, 'b_unique': value} for portal_id, value in unique.items()]
+    )
+
+    # Série diária de engajamento (src.utils.portal_series)
+    daily = insert(PortalDailyStats.__table__)
+    connection.execute(daily.on_conflict_do_update(
+        index_elements=['portal_id', 'day'],
+        set_={'views': PortalDailyStats.__table__.c.views + daily.excluded.views}
+    ), [
+        {'portal_id': portal_id, 'day': datetime.strptime(day, '%Y-%m-%d').date(), 'views': views}
+        for (portal_id, day), (views, _) in taken.items()
+    ])
+    return sum(portal_views.values())
+
+
+def unique_viewers(portal_id, periods):
+    """
+    Visitantes únicos estimados de um portal em um conjunto de períodos
+    (mescla os sketches diários)
+    """
+    registers = hll_registers()
+    for (data,) in db.session.query(PortalViewCount.registers).filter(
+        PortalViewCount.portal_id == portal_id, PortalViewCount.period.in_(list(periods))
+    ):
+        if data:
+            np.maximum(registers, hll_registers(data), out=registers)
+    return hll_estimate(registers)
+
+
+def viewer_key():
+    """Identifica o visitante: usuário autenticado ou IP + user agent"""
+    user_id = getattr(g, 'current_user_id', None)
+    if user_id:
+        return f'user:{user_id}'
+    # remote_addr já vem corrigido pelo ProxyFix (TRUSTED_PROXY_HOPS em main.py);
+    # o X-Forwarded-For cru é escrito pelo cliente e inflaria os visitantes únicos
+    return f'anon:{request.remote_addr or ""}:{request.headers.get("User-Agent", "")}'
+
+
+view_counter = ViewCounter()
+
+
+def count_portal_view(f):
+    """
+    Decorador para a view de detalhe do portal: conta a visualização quando a
+    resposta é 200, inclusive quando ela vem do cache de respostas
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            view_counter.record(kwargs['portal_id'], viewer_key())
+            trending_engine.record(kwargs['portal_id'], 'view')
+        return response
+    return decorated_function